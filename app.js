@@ -15,11 +15,12 @@ let availableYears = []; // 添加availableYears变量声明
 let regionWeatherData = {}; // 存储按区域聚合的天气数据
 let hoveredProvinceId = null; // 悬停的省份ID
 let chinaProvincesGeoData = null; // 存储中国省份边界数据
-let stationProvinceCache = {}; // 缓存站点省份映射
-let isProvincePreprocessed = false; // 标记是否已完成省份预处理
+let stationProvinceCache = {}; // 缓存站点省份映射 (数据没有 province 字段时使用)
 
 // Tween.js 平滑过渡相关变量
 let isTransitioning = false; // 是否正在过渡
+let isLoadingMonth = false; // 是否正在加载目标月份所在的分片
+let requestedMonth = null; // 分片加载期间最新请求的月份 (加载完成后切换到该月份)
 let nextMonthData = null; // 预计算的下一个月数据
 let currentTween = null; // 当前的Tween动画实例
 let interpolatedRegionData = {}; // 插值后的区域数据
@@ -237,7 +238,7 @@ function setupMapInteractions() {
             // 添加坐标信息
             station.lng = lng;
             station.lat = lat;
-            station.provinceName = getProvinceByGeoData(lat, lng);
+            station.provinceName = getStationProvince(station);
             
             // 统一调用showStationDetails
             showStationDetails(station);
@@ -319,11 +320,6 @@ async function loadWeatherData() {
             
             updateMonthSelector();
             
-            // 在省份边界数据加载完成后预处理省份信息
-            if (chinaProvincesGeoData) {
-                preprocessProvinceData();
-            }
-            
             updateMapVisualization();
             updateUI();
             
@@ -397,7 +393,7 @@ function updateMapVisualization() {
         }
     }
       // 聚合数据并更新省份填充图层
-    regionWeatherData = aggregateDataByRegion(monthData, currentDataType);
+    regionWeatherData = aggregateDataByRegion(monthData, currentDataType, currentMonth);
     updateProvinceFillLayer(regionWeatherData);
     
     // 预计算下一个月的数据以备平滑过渡
@@ -420,7 +416,7 @@ function startAnimation() {
     let currentIndex = availableMonths.indexOf(currentMonth);
     if (currentIndex === -1) currentIndex = 0;
       animationInterval = setInterval(() => {
-        if (isTransitioning) return; // 如果正在过渡，跳过这次更新
+        if (isTransitioning || isLoadingMonth) return; // 如果正在过渡或加载分片，跳过这次更新
         
         currentIndex = (currentIndex + 1) % availableMonths.length;
         const targetMonth = availableMonths[currentIndex];
@@ -615,14 +611,20 @@ function initApp() {
 document.addEventListener('DOMContentLoaded', initApp);
 
 // 聚合气象数据到行政区域
-function aggregateDataByRegion(monthData, dataType) {
+// 有预先生成的省份汇总时直接使用，否则按站点现场统计
+function aggregateDataByRegion(monthData, dataType, month) {
+    const rollup = month && dataLoader ? dataLoader.getProvinceRollup(month, dataType) : null;
+    if (rollup) {
+        return rollup;
+    }
+
     const regionData = {};
     
     monthData.forEach(station => {
         const value = dataType === 'temperature' ? station.temperature : station.precipitation;
         if (value === null || value === undefined) return;
         
-        const province = getProvinceByGeoData(station.lat, station.lng);
+        const province = getStationProvince(station);
         
         if (!regionData[province]) {
             regionData[province] = {
@@ -670,6 +672,22 @@ function aggregateDataByRegion(monthData, dataType) {
     return aggregatedData;
 }
 
+// 省份内的站点列表 (只在打开省份详情时计算)
+function getProvinceStations(province, month, dataType) {
+    return dataLoader.getDataForMonth(month)
+        .filter(station => {
+            const value = dataType === 'temperature' ? station.temperature : station.precipitation;
+            return value !== null && value !== undefined && getStationProvince(station) === province;
+        })
+        .map(station => ({
+            name: station.name,
+            lat: station.lat,
+            lng: station.lng,
+            temperature: station.temperature,
+            precipitation: station.precipitation
+        }));
+}
+
 // 省份名称映射：阿里云数据 -> 我们的数据
 function mapAliyunToOurProvinceName(aliyunName) {
     const nameMapping = {
@@ -805,6 +823,15 @@ function getProvinceByGeoData(lat, lng) {
     return '未知';
 }
 
+// 站点省份归属：优先使用 process_weather_data.py 离线计算的 province 字段；
+// 没有该字段的数据 (--no-province 或旧版本生成) 在首次需要时按边界判断 (结果按坐标缓存)
+function getStationProvince(station) {
+    if (station.province) {
+        return station.province;
+    }
+    return getProvinceByGeoData(station.lat, station.lng);
+}
+
 // 加载中国省份边界数据
 async function loadChinaProvinceData() {
     try {
@@ -887,9 +914,9 @@ async function loadChinaProvinceData() {
           // 设置省份交互
         setupProvinceInteractions();
         
-        // 在省份边界数据加载完成后，如果天气数据也已加载完成，则触发预处理
-        if (dataLoader && availableMonths.length > 0) {
-            preprocessProvinceData();
+        // 数据没有 province 字段时省份归属依赖边界数据，边界加载完成后重新绘制
+        if (dataLoader && currentMonth && dataLoader.getDataForMonth(currentMonth).some(station => !station.province)) {
+            updateMapVisualization();
         }
         
     } catch (error) {
@@ -921,7 +948,6 @@ function updateProvinceFillLayer(regionData) {
             feature.properties.avgPrecipitation = data.avgPrecipitation;
             feature.properties.maxPrecipitation = data.maxPrecipitation;
             feature.properties.minPrecipitation = data.minPrecipitation;
-            feature.properties.stations = JSON.stringify(data.stations);
             
             // 设置过渡状态相关属性
             feature.properties.isTransitioningOut = data.isTransitioningOut || false;
@@ -1175,7 +1201,7 @@ function showProvinceDetails(provinceProps) {
     const avgPrecip = provinceProps.avgPrecipitation;
     const maxPrecip = provinceProps.maxPrecipitation;
     const minPrecip = provinceProps.minPrecipitation;    const stationCount = provinceProps.stationCount;
-    const stations = provinceProps.stations ? JSON.parse(provinceProps.stations) : [];
+    const stations = getProvinceStations(mappedProvinceName, currentMonth, currentDataType);
     
     // 打开左侧面板
     const panel = document.getElementById('sidePanel');
@@ -1269,7 +1295,7 @@ function flyToStation(lng, lat, stationName) {
     const station = monthData.find(s => s.name === stationName);
     
     if (station) {        // 添加省份信息
-        station.provinceName = getProvinceByGeoData(lat, lng);
+        station.provinceName = getStationProvince(station);
         
         // 显示气象站详细信息
         setTimeout(() => {
@@ -1292,7 +1318,7 @@ function showStationDetails(station) {
      // 更新面板内容
     document.getElementById('stationName').innerHTML = `
         <span style="font-size:18px;font-weight:600;letter-spacing:1px;color:#222;">${stationName}</span>
-        <button onclick="returnToProvinceView('${station.provinceName || getProvinceByGeoData(lat, lng)}')" 
+        <button onclick="returnToProvinceView('${station.provinceName || getStationProvince(station)}')" 
             class="back-province-btn"
             title="返回省份">
             <svg viewBox="0 0 16 16" fill="none" style="width:14px;height:14px;margin-right:4px;">
@@ -1433,8 +1459,7 @@ function returnToProvinceView(provinceName) {
             avgPrecipitation: provinceData.avgPrecipitation,
             maxPrecipitation: provinceData.maxPrecipitation,
             minPrecipitation: provinceData.minPrecipitation,
-            stationCount: provinceData.stationCount,
-            stations: JSON.stringify(provinceData.stations)
+            stationCount: provinceData.stationCount
         };
         
         // 延迟显示省份详情，等待地图动画完成
@@ -1513,59 +1538,6 @@ function updateLegend() {
     }
 }
 
-// 预处理省份数据，为所有站点计算省份信息
-function preprocessProvinceData() {
-    if (!chinaProvincesGeoData || !dataLoader || isProvincePreprocessed) {
-        return;
-    }
-    
-    console.log('开始预处理省份数据...');
-    const startTime = Date.now();
-    
-    // 收集所有唯一的站点位置
-    const uniqueStations = new Map();
-    const allMonths = dataLoader.getAvailableMonths();
-    
-    allMonths.forEach(month => {
-        const monthData = dataLoader.getDataForMonth(month);
-        monthData.forEach(station => {
-            const key = `${station.lat.toFixed(6)},${station.lng.toFixed(6)}`;
-            if (!uniqueStations.has(key)) {
-                uniqueStations.set(key, {
-                    lat: station.lat,
-                    lng: station.lng,
-                    name: station.name
-                });
-            }
-        });
-    });
-    
-    console.log(`发现 ${uniqueStations.size} 个唯一站点位置，开始计算省份归属...`);
-    
-    // 批量计算省份归属
-    let processed = 0;
-    uniqueStations.forEach((station, key) => {
-        const province = getProvinceByGeoData(station.lat, station.lng);
-        processed++;
-        
-        if (processed % 100 === 0) {
-            const progress = (processed / uniqueStations.size * 100).toFixed(1);
-            console.log(`省份归属计算进度: ${progress}% (${processed}/${uniqueStations.size})`);
-        }
-    });
-    
-    const endTime = Date.now();
-    console.log(`省份数据预处理完成，用时 ${(endTime - startTime) / 1000} 秒`);
-    console.log(`缓存了 ${Object.keys(stationProvinceCache).length} 个站点的省份信息`);
-    
-    isProvincePreprocessed = true;
-    
-    // 预处理完成后更新地图
-    if (currentMonth) {
-        updateMapVisualization();
-    }
-}
-
 // Tween.js 平滑过渡函数
 // 预计算下一个月的数据
 function preCalculateNextMonth() {
@@ -1575,11 +1547,19 @@ function preCalculateNextMonth() {
     const nextIndex = (currentIndex + 1) % availableMonths.length;
     const nextMonth = availableMonths[nextIndex];
     
+    // 分片尚未加载时先在后台加载，完成后再预计算
+    if (!dataLoader.isMonthLoaded(nextMonth)) {
+        dataLoader.ensureMonthLoaded(nextMonth)
+            .then(() => preCalculateNextMonth())
+            .catch(error => console.warn('预加载下一个月的数据失败:', error));
+        return;
+    }
+    
     const nextMonthRawData = dataLoader.getDataForMonth(nextMonth);
     if (nextMonthRawData && nextMonthRawData.length > 0) {
         nextMonthData = {
             month: nextMonth,
-            regionData: aggregateDataByRegion(nextMonthRawData, currentDataType),
+            regionData: aggregateDataByRegion(nextMonthRawData, currentDataType, nextMonth),
             pointData: nextMonthRawData
         };
     }
@@ -1666,6 +1646,30 @@ function interpolateRegionData(fromData, toData, progress) {
 
 // 执行平滑过渡
 function performSmoothTransition(targetMonth) {
+    // 分片加载期间只记录最新请求的月份，加载完成后切换到该月份 (之前的请求被取代)
+    if (isLoadingMonth) {
+        requestedMonth = targetMonth;
+        return;
+    }
+    
+    // 目标月份所在的分片尚未加载：加载期间暂停动画，加载完成后再切换
+    if (!dataLoader.isMonthLoaded(targetMonth)) {
+        isLoadingMonth = true;
+        requestedMonth = targetMonth;
+        dataLoader.ensureMonthLoaded(targetMonth)
+            .catch(error => console.error('加载月份数据失败:', error))
+            .finally(() => {
+                isLoadingMonth = false;
+                const latestMonth = requestedMonth;
+                requestedMonth = null;
+                // 加载失败时不重复请求同一个月份
+                if (latestMonth !== targetMonth || dataLoader.isMonthLoaded(targetMonth)) {
+                    performSmoothTransition(latestMonth);
+                }
+            });
+        return;
+    }
+    
     if (isTransitioning || !nextMonthData || nextMonthData.month !== targetMonth) {
         // 如果没有预计算数据，直接切换
         currentMonth = targetMonth;
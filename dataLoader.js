@@ -3,6 +3,49 @@ class WeatherDataLoader {
         this.weatherData = {};
         this.metadata = {};
         this.loadingProgress = 0;
+        this.provinceRollup = null; // 省份×月份汇总 (process_weather_data.py 生成)
+        this.rollupCache = {};
+        this.stations = null; // v2 格式的站点表
+        this.monthCache = {}; // 按需展开 (v2/binary) 或隐藏不完整数值后的月份数据
+        this.shardIndex = null; // 分片索引 (weather_data_index.json)，单文件输出时为 null
+        this.shardByMonth = {}; // 年月 -> 分片序号
+        this.shardPromises = {}; // 分片序号 -> 加载中/已完成的 Promise
+        this.loadedShards = new Set();
+        this.matrices = null; // binary 格式: {变量: 月份×站点 Float32Array}
+        this.monthRows = {}; // binary 格式: 年月 -> 矩阵行号
+        this.skipIncomplete = true; // 不显示被标记为有效天数不足的数值 (incomplete 位掩码)
+    }
+
+    // 数据是否带有 incomplete 位掩码 (process_weather_data.py 以 mark 方式设置了有效天数阈值)
+    hasIncompleteMarks() {
+        const completeness = this.metadata && this.metadata.completeness;
+        return Boolean(this.skipIncomplete && completeness && completeness.policy === 'mark' &&
+            (completeness.min_temperature_days > 0 || completeness.min_precipitation_days > 0));
+    }
+
+    // 按 incomplete 位掩码 (1: 温度，2: 降水) 将有效天数不足的数值置为 null，并去掉两个数值都不可用的记录
+    applyCompleteness(records) {
+        if (!this.hasIncompleteMarks()) {
+            return records;
+        }
+        const result = [];
+        records.forEach(record => {
+            if (!record.incomplete) {
+                result.push(record);
+                return;
+            }
+            const masked = { ...record };
+            if (record.incomplete & 1) {
+                masked.temperature = null;
+            }
+            if (record.incomplete & 2) {
+                masked.precipitation = null;
+            }
+            if (masked.temperature !== null || masked.precipitation !== null) {
+                result.push(masked);
+            }
+        });
+        return result;
     }
 
     // 加载预处理的JSON数据
@@ -18,13 +61,45 @@ class WeatherDataLoader {
             }
 
             if (onProgress) {
-                onProgress(0.5, 1, '正在解析数据...', null);
+                onProgress(0.3, 1, '正在解析数据...', null);
             }
 
             const jsonData = await response.json();
-            
-            this.metadata = jsonData.metadata;
-            this.weatherData = jsonData.data;
+
+            // 分片输出: weather_data.json 只声明索引文件，只需索引和起始月份所在的分片即可开始绘制
+            if (jsonData.metadata && jsonData.metadata.index) {
+                if (onProgress) {
+                    onProgress(0.4, 1, '正在加载数据索引...', null);
+                }
+                const indexResponse = await fetch(`./${jsonData.metadata.index}`);
+                if (!indexResponse.ok) {
+                    throw new Error(`HTTP错误: ${indexResponse.status}`);
+                }
+                this.setShardIndex(await indexResponse.json());
+                if (onProgress) {
+                    onProgress(0.6, 1, '正在加载起始月份数据...', null);
+                }
+                await this.ensureMonthLoaded(this.shardIndex.months[0]);
+            } else {
+                this.metadata = jsonData.metadata;
+                this.weatherData = jsonData.data;
+                // v2 格式: 站点表 + 每月平行数组，月份数据在首次访问时展开
+                this.stations = jsonData.format_version >= 2 ? jsonData.stations : null;
+                this.monthCache = {};
+
+                // binary 格式: JSON 头只含站点表与月份列表，数值来自 Float32 矩阵文件
+                if (jsonData.format_version === 3) {
+                    if (onProgress) {
+                        onProgress(0.7, 1, '正在加载数值矩阵...', null);
+                    }
+                    await this.loadBinaryMatrices(jsonData);
+                }
+            }
+
+            // 汇总文件是可选的，加载失败时前端按站点数据现场统计
+            if (this.metadata && this.metadata.province_rollup) {
+                await this.loadProvinceRollup(this.metadata.province_rollup);
+            }
 
             if (onProgress) {
                 onProgress(1, 1, '数据加载完成', null);
@@ -42,13 +117,256 @@ class WeatherDataLoader {
         }
     }
 
+    // 加载 binary 格式的矩阵文件，直接包装为 Float32Array (不逐条解析)
+    async loadBinaryMatrices(header) {
+        const { shape, files } = header.binary;
+        const matrices = {};
+        await Promise.all(Object.entries(files).map(async ([variable, file]) => {
+            const response = await fetch(`./${file}`);
+            if (!response.ok) {
+                throw new Error(`HTTP错误: ${response.status}`);
+            }
+            const matrix = WeatherDataLoader.float32ArrayFromLittleEndian(await response.arrayBuffer());
+            if (matrix.length !== shape[0] * shape[1]) {
+                throw new Error(`矩阵文件 ${file} 大小与形状 ${shape.join('×')} 不符`);
+            }
+            matrices[variable] = matrix;
+        }));
+
+        this.weatherData = {};
+        this.matrices = matrices;
+        this.monthRows = {};
+        header.months.forEach((month, row) => {
+            this.monthRows[month] = row;
+        });
+    }
+
+    // 文件为 little-endian；在大端平台上逐个转换
+    static float32ArrayFromLittleEndian(buffer) {
+        const isLittleEndian = new Uint8Array(new Uint16Array([1]).buffer)[0] === 1;
+        if (isLittleEndian) {
+            return new Float32Array(buffer);
+        }
+        const view = new DataView(buffer);
+        const values = new Float32Array(buffer.byteLength / 4);
+        for (let i = 0; i < values.length; i++) {
+            values[i] = view.getFloat32(i * 4, true);
+        }
+        return values;
+    }
+
+    // binary 格式下某月某变量所有站点的数值 (矩阵的一行，Float32Array 视图，NaN 为缺失)；其他格式返回 null
+    getMonthValues(yearMonth, variable) {
+        const row = this.monthRows[yearMonth];
+        if (!this.matrices || row === undefined || !this.matrices[variable]) {
+            return null;
+        }
+        const stationCount = this.stations.station_id.length;
+        return this.matrices[variable].subarray(row * stationCount, (row + 1) * stationCount);
+    }
+
+    // 将 binary 格式的一个月展开为站点对象列表 (只包含该月有数据的站点)
+    expandBinaryMonth(yearMonth) {
+        const temperatures = this.getMonthValues(yearMonth, 'temperature');
+        const precipitations = this.getMonthValues(yearMonth, 'precipitation');
+        if (!temperatures || !precipitations) {
+            return [];
+        }
+        const stations = this.stations;
+        // 有效天数、incomplete 位掩码与扩展变量 (如 dewp_mean) 的矩阵
+        const extraFields = Object.keys(this.matrices).filter(variable => !WeatherDataLoader.VALUE_FIELDS.includes(variable));
+        const rows = Object.fromEntries(extraFields.map(variable => [variable, this.getMonthValues(yearMonth, variable)]));
+        const records = [];
+        for (let index = 0; index < temperatures.length; index++) {
+            const temperature = temperatures[index];
+            const precipitation = precipitations[index];
+            if (Number.isNaN(temperature) && Number.isNaN(precipitation)) {
+                continue;
+            }
+            const record = {
+                station_id: stations.station_id[index],
+                lat: stations.lat[index],
+                lng: stations.lng[index],
+                name: stations.name[index],
+                temperature: Number.isNaN(temperature) ? null : temperature,
+                precipitation: Number.isNaN(precipitation) ? null : precipitation
+            };
+            extraFields.forEach(variable => {
+                const value = rows[variable][index];
+                record[variable] = Number.isNaN(value) ? null : value;
+            });
+            if (stations.province) {
+                record.province = stations.province[index];
+            }
+            records.push(record);
+        }
+        return this.applyCompleteness(records);
+    }
+
+    // 使用分片索引：元数据和站点表来自索引，月份数据按分片加载
+    setShardIndex(index) {
+        this.shardIndex = index;
+        this.metadata = index.metadata;
+        this.stations = index.format_version === 2 ? index.stations : null;
+        this.weatherData = {};
+        this.monthCache = {};
+        this.shardByMonth = {};
+        this.shardPromises = {};
+        this.loadedShards = new Set();
+        index.shards.forEach((shard, shardIndex) => {
+            shard.months.forEach(month => {
+                this.shardByMonth[month] = shardIndex;
+            });
+        });
+    }
+
+    // 加载一个分片 (同一分片只请求一次；失败后允许重试)
+    loadShard(shardIndex) {
+        if (!this.shardIndex || shardIndex >= this.shardIndex.shards.length) {
+            return Promise.resolve();
+        }
+        if (!this.shardPromises[shardIndex]) {
+            const shard = this.shardIndex.shards[shardIndex];
+            this.shardPromises[shardIndex] = fetch(`./${shard.file}`)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP错误: ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(shardData => {
+                    Object.assign(this.weatherData, shardData.data);
+                    this.loadedShards.add(shardIndex);
+                })
+                .catch(error => {
+                    delete this.shardPromises[shardIndex];
+                    throw error;
+                });
+        }
+        return this.shardPromises[shardIndex];
+    }
+
+    // 指定月份的数据是否已可用 (单文件输出时总是可用)
+    isMonthLoaded(yearMonth) {
+        if (!this.shardIndex) {
+            return true;
+        }
+        const shardIndex = this.shardByMonth[yearMonth];
+        return shardIndex === undefined || this.loadedShards.has(shardIndex);
+    }
+
+    // 确保指定月份所在的分片已加载，并在后台预取下一个分片
+    async ensureMonthLoaded(yearMonth) {
+        const shardIndex = this.shardByMonth[yearMonth];
+        if (!this.shardIndex || shardIndex === undefined) {
+            return;
+        }
+        await this.loadShard(shardIndex);
+        this.loadShard(shardIndex + 1).catch(error => console.warn('预取数据分片失败:', error));
+    }
+
+    // 确保指定年份的所有月份已加载
+    async ensureYearLoaded(year) {
+        const yearStr = year.toString();
+        const months = this.getAvailableMonths().filter(month => month.startsWith(yearStr));
+        await Promise.all(months.map(month => this.ensureMonthLoaded(month)));
+    }
+
+    // 加载省份×月份汇总文件
+    async loadProvinceRollup(url) {
+        try {
+            const response = await fetch(`./${url}`);
+            if (!response.ok) {
+                throw new Error(`HTTP错误: ${response.status}`);
+            }
+            this.provinceRollup = await response.json();
+            this.rollupCache = {};
+        } catch (error) {
+            console.warn('省份汇总文件加载失败，改为现场统计:', error);
+            this.provinceRollup = null;
+        }
+    }
+
+    // 获取指定年月、数据类型的省份统计 {省份: {stationCount, avgTemperature, ...}}，无汇总文件时返回 null
+    getProvinceRollup(yearMonth, dataType) {
+        if (!this.provinceRollup) {
+            return null;
+        }
+        const cacheKey = `${dataType}|${yearMonth}`;
+        if (this.rollupCache[cacheKey]) {
+            return this.rollupCache[cacheKey];
+        }
+
+        const { provinces, fields } = this.provinceRollup;
+        const rows = (this.provinceRollup.data[dataType] || {})[yearMonth] || [];
+        const result = {};
+        rows.forEach(row => {
+            const stats = {};
+            fields.forEach((field, i) => {
+                stats[field] = row[i + 1];
+            });
+            result[provinces[row[0]]] = stats;
+        });
+        this.rollupCache[cacheKey] = result;
+        return result;
+    }
+
     // 获取指定年月的数据
     getDataForMonth(yearMonth) {
-        return this.weatherData[yearMonth] || [];
+        if (this.matrices) {
+            if (!this.monthCache[yearMonth]) {
+                this.monthCache[yearMonth] = this.expandBinaryMonth(yearMonth);
+            }
+            return this.monthCache[yearMonth];
+        }
+
+        const monthData = this.weatherData[yearMonth];
+        if (!monthData) {
+            return [];
+        }
+        if (!this.stations && !this.hasIncompleteMarks()) {
+            return monthData;
+        }
+        if (!this.monthCache[yearMonth]) {
+            this.monthCache[yearMonth] = this.stations
+                ? this.expandCompactMonth(monthData)
+                : this.applyCompleteness(monthData);
+        }
+        return this.monthCache[yearMonth];
+    }
+
+    // 将 v2 格式的一个月 (站点下标与数值的平行数组) 展开为与 v1 相同的站点对象列表
+    expandCompactMonth(monthData) {
+        const stations = this.stations;
+        // 有效天数、incomplete 位掩码与扩展变量 (如 dewp_mean) 的平行数组
+        const extraFields = Object.keys(monthData).filter(field => field !== 'station' && !WeatherDataLoader.VALUE_FIELDS.includes(field));
+        return this.applyCompleteness(monthData.station.map((index, i) => {
+            const record = {
+                station_id: stations.station_id[index],
+                lat: stations.lat[index],
+                lng: stations.lng[index],
+                name: stations.name[index],
+                temperature: monthData.temperature[i],
+                precipitation: monthData.precipitation[i]
+            };
+            extraFields.forEach(field => {
+                record[field] = monthData[field][i];
+            });
+            if (stations.province) {
+                record.province = stations.province[index];
+            }
+            return record;
+        }));
     }
 
-    // 获取所有可用的年月
+    // 获取所有可用的年月 (分片输出时包括尚未加载的月份)
     getAvailableMonths() {
+        if (this.shardIndex) {
+            return [...this.shardIndex.months];
+        }
+        if (this.matrices) {
+            return Object.keys(this.monthRows).sort();
+        }
         return Object.keys(this.weatherData).sort();
     }
 
@@ -59,14 +377,14 @@ class WeatherDataLoader {
         return years.sort((a, b) => a - b);
     }
 
-    // 获取指定年份的所有月份数据
+    // 获取指定年份的所有月份数据 (分片输出时只包含已加载的月份，可先调用 ensureYearLoaded)
     getDataForYear(year) {
         const yearStr = year.toString();
         const yearData = [];
         
-        Object.keys(this.weatherData).forEach(month => {
+        this.getAvailableMonths().forEach(month => {
             if (month.startsWith(yearStr)) {
-                yearData.push(...this.weatherData[month]);
+                yearData.push(...this.getDataForMonth(month));
             }
         });
         
@@ -75,7 +393,7 @@ class WeatherDataLoader {
 
     // 获取数据统计信息
     getDataStats() {
-        if (!this.metadata || Object.keys(this.weatherData).length === 0) {
+        if (!this.metadata || this.getAvailableMonths().length === 0) {
             return null;
         }
 
@@ -85,19 +403,31 @@ class WeatherDataLoader {
         let tempRange = { min: Infinity, max: -Infinity };
         let precipRange = { min: Infinity, max: -Infinity };
         
-        // 计算温度和降水范围
-        Object.values(this.weatherData).forEach(monthData => {
-            monthData.forEach(record => {
-                if (record.temperature !== null && !isNaN(record.temperature)) {
-                    tempRange.min = Math.min(tempRange.min, record.temperature);
-                    tempRange.max = Math.max(tempRange.max, record.temperature);
-                }
-                if (record.precipitation !== null && !isNaN(record.precipitation)) {
-                    precipRange.min = Math.min(precipRange.min, record.precipitation);
-                    precipRange.max = Math.max(precipRange.max, record.precipitation);
+        // 计算温度和降水范围 (binary 格式直接扫描矩阵，不展开站点对象)
+        if (this.matrices) {
+            const scan = (values, range) => {
+                for (let i = 0; i < values.length; i++) {
+                    const value = values[i];
+                    if (value < range.min) range.min = value;
+                    if (value > range.max) range.max = value;
                 }
+            };
+            scan(this.matrices.temperature, tempRange);
+            scan(this.matrices.precipitation, precipRange);
+        } else {
+            months.forEach(month => {
+                this.getDataForMonth(month).forEach(record => {
+                    if (record.temperature !== null && !isNaN(record.temperature)) {
+                        tempRange.min = Math.min(tempRange.min, record.temperature);
+                        tempRange.max = Math.max(tempRange.max, record.temperature);
+                    }
+                    if (record.precipitation !== null && !isNaN(record.precipitation)) {
+                        precipRange.min = Math.min(precipRange.min, record.precipitation);
+                        precipRange.max = Math.max(precipRange.max, record.precipitation);
+                    }
+                });
             });
-        });
+        }
         
         return {
             totalRecords: this.metadata.total_records,
@@ -116,5 +446,8 @@ class WeatherDataLoader {
     }
 }
 
+// 每条记录的主要数值字段 (其余月份数组/矩阵原样附加到记录上)
+WeatherDataLoader.VALUE_FIELDS = ['temperature', 'precipitation'];
+
 // 导出数据加载器
 window.WeatherDataLoader = WeatherDataLoader;
\ No newline at end of file
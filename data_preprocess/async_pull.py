@@ -0,0 +1,241 @@
+import asyncio
+import argparse
+import os
+from urllib.parse import urljoin, urlparse
+
+import aiohttp
+
+from pull import (BASE_URL, DOWNLOAD_DIR, DOWNLOAD_HEADERS, PART_SUFFIX, extract_links, is_year_directory,
+                  is_csv_file, load_download_index, save_download_index, build_request_headers,
+                  response_index_entry, finalize_download, filter_year_directories,
+                  add_selection_arguments, selection_from_args, filter_links, load_listing_cache,
+                  save_listing_cache, listing_is_fresh, listing_conditional_headers)
+
+# 默认参数：连接池大小、同时进行的请求数、每个主机每秒的最大请求数
+DEFAULT_POOL_SIZE = 16
+DEFAULT_CONCURRENCY = 16
+DEFAULT_RATE_LIMIT = 20.0
+CHUNK_SIZE = 64 * 1024
+
+
+class HostRateLimiter:
+    """按主机限速：同一主机的相邻两次请求之间至少间隔 1/max_per_second 秒"""
+
+    def __init__(self, max_per_second):
+        self.interval = 1.0 / max_per_second if max_per_second and max_per_second > 0 else 0.0
+        self._next_slot = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, url):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AsyncDownloader:
+    """
+    基于 asyncio/aiohttp 的下载器
+    所有请求共用一个会话和有界连接池，并同时受并发数上限和按主机限速约束
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, concurrency=DEFAULT_CONCURRENCY,
+                 rate_limit=DEFAULT_RATE_LIMIT, timeout=60, revalidate=True):
+        self.pool_size = pool_size
+        self.concurrency = concurrency
+        self.rate_limiter = HostRateLimiter(rate_limit)
+        self.revalidate = revalidate
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session = None
+        self._semaphore = None
+        self.stats = {'listed': 0, 'downloaded': 0, 'resumed': 0, 'not_modified': 0,
+                      'skipped': 0, 'failed': 0, 'bytes': 0}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size)
+        # 会话默认发送 Accept-Encoding: identity，写入 .part 的字节与服务器声明的长度一致
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout, headers=DOWNLOAD_HEADERS)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    async def get_links_from_url(self, url, content_type_check=None):
+        """列出目录索引页中的链接，与 pull.py 共用本地目录列表缓存 (缓存读写在线程池中执行)"""
+        entry = await asyncio.to_thread(load_listing_cache, url)
+        if entry is not None and listing_is_fresh(url, entry):
+            return filter_links(entry['links'], content_type_check)
+        async with self._semaphore:
+            await self.rate_limiter.wait(url)
+            try:
+                async with self.session.get(url, headers=listing_conditional_headers(entry)) as response:
+                    if response.status == 304 and entry is not None:
+                        await asyncio.to_thread(save_listing_cache, url, entry['links'], entry)
+                        return filter_links(entry['links'], content_type_check)
+                    response.raise_for_status()
+                    html = await response.read()
+                    headers = response.headers
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"获取链接时出错 {url}: {e}")
+                return []
+        self.stats['listed'] += 1
+        all_links = extract_links(html)
+        await asyncio.to_thread(save_listing_cache, url, all_links, headers)
+        return filter_links(all_links, content_type_check)
+
+    async def download_file(self, file_url, local_path):
+        """
+        下载文件并保存到本地路径：
+        先写入 .part 临时文件并原子重命名，.part 文件用 Range 续传，已有文件发送条件请求
+        所有文件系统操作 (目录、索引、临时文件) 都在线程池中执行，慢速磁盘不会阻塞其他下载的事件循环
+        """
+        await asyncio.to_thread(os.makedirs, os.path.dirname(local_path), exist_ok=True)
+
+        if not self.revalidate and await asyncio.to_thread(os.path.exists, local_path):
+            self.stats['skipped'] += 1
+            return
+
+        async with self._semaphore:
+            await self.rate_limiter.wait(file_url)
+            try:
+                entry = await asyncio.to_thread(load_download_index, local_path)
+                headers, offset = await asyncio.to_thread(build_request_headers, local_path, entry)
+                response = await self.session.get(file_url, headers=headers)
+                if response.status == 416 and offset:
+                    # 续传位置无效，丢弃临时文件重新下载
+                    response.release()
+                    await asyncio.to_thread(os.remove, local_path + PART_SUFFIX)
+                    headers, offset = await asyncio.to_thread(build_request_headers, local_path, entry)
+                    response = await self.session.get(file_url, headers=headers)
+
+                async with response:
+                    if response.status == 304:
+                        self.stats['not_modified'] += 1
+                        return
+                    response.raise_for_status()
+
+                    resumed = response.status == 206
+                    entry = response_index_entry(file_url, response.status, response.headers, entry)
+                    await asyncio.to_thread(save_download_index, local_path, entry)
+                    part = await asyncio.to_thread(open, local_path + PART_SUFFIX, 'ab' if resumed else 'wb')
+                    try:
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            await asyncio.to_thread(part.write, chunk)
+                            self.stats['bytes'] += len(chunk)
+                    finally:
+                        await asyncio.to_thread(part.close)
+                await asyncio.to_thread(finalize_download, local_path, entry)
+                self.stats['resumed' if resumed else 'downloaded'] += 1
+                print(f"成功下载到: {local_path}")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.stats['failed'] += 1
+                print(f"下载文件时出错 {file_url}: {e}")
+            except IOError as e:
+                self.stats['failed'] += 1
+                print(f"保存文件时出错 {local_path}: {e}")
+
+    async def collect_download_tasks(self, base_url, download_dir, start_year=None, end_year=None,
+                                     csv_filter=is_csv_file):
+        """
+        列出年份目录及其中的CSV文件，返回 (file_url, local_path) 列表
+        年份范围在列出年份目录之前过滤，站点筛选在生成下载任务之前过滤
+        """
+        year_directories = await self.get_links_from_url(base_url, is_year_directory)
+        if not year_directories:
+            print("未找到年份目录。")
+            return []
+        year_directories = filter_year_directories(year_directories, start_year, end_year)
+        print(f"找到年份目录: {len(year_directories)}")
+
+        year_urls = [urljoin(base_url, year_dir_name) for year_dir_name in year_directories]
+        listings = await asyncio.gather(*(self.get_links_from_url(year_url, csv_filter) for year_url in year_urls))
+
+        tasks = []
+        for year_dir_name, year_url, csv_files in zip(year_directories, year_urls, listings):
+            year_str = year_dir_name.strip('/')
+            if not csv_files:
+                print(f"年份 {year_str} 未找到 .csv 文件。")
+                continue
+            print(f"在年份 {year_str} 中找到 {len(csv_files)} 个 .csv 文件。")
+            for csv_file_name in csv_files:
+                file_download_url = urljoin(year_url, csv_file_name)
+                actual_file_name = os.path.basename(urlparse(csv_file_name).path)
+                tasks.append((file_download_url, os.path.join(download_dir, year_str, actual_file_name)))
+        return tasks
+
+    async def run(self, base_url=BASE_URL, download_dir=DOWNLOAD_DIR, start_year=None, end_year=None,
+                  csv_filter=is_csv_file):
+        """列出并下载 base_url 下选中年份与站点的CSV文件，返回统计信息"""
+        os.makedirs(download_dir, exist_ok=True)
+        print(f"开始从 {base_url} 获取年份目录...")
+        tasks = await self.collect_download_tasks(base_url, download_dir, start_year, end_year, csv_filter)
+        if not tasks:
+            print("未找到任何需要下载的文件。")
+            return self.stats
+
+        print(f"\n总共收集到 {len(tasks)} 个文件准备下载 "
+              f"(连接池 {self.pool_size}，并发 {self.concurrency})。")
+        # 固定数量的工作协程从队列中取任务，协程数量不随文件数增长
+        queue = asyncio.Queue()
+        for task in tasks:
+            queue.put_nowait(task)
+        workers = min(self.concurrency, len(tasks))
+        await asyncio.gather(*(self._download_worker(queue) for _ in range(workers)))
+        return self.stats
+
+    async def _download_worker(self, queue):
+        """依次下载队列中的 (file_url, local_path)，队列取空后退出"""
+        while True:
+            try:
+                file_url, local_path = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await self.download_file(file_url, local_path)
+
+
+async def download_all(base_url=BASE_URL, download_dir=DOWNLOAD_DIR, pool_size=DEFAULT_POOL_SIZE,
+                       concurrency=DEFAULT_CONCURRENCY, rate_limit=DEFAULT_RATE_LIMIT, revalidate=True,
+                       start_year=None, end_year=None, csv_filter=is_csv_file):
+    async with AsyncDownloader(pool_size=pool_size, concurrency=concurrency, rate_limit=rate_limit,
+                               revalidate=revalidate) as downloader:
+        return await downloader.run(base_url, download_dir, start_year, end_year, csv_filter)
+
+
+def format_stats(stats):
+    """download_all 返回的统计信息的一行摘要"""
+    return (f"列出目录 {stats['listed']} 个，下载 {stats['downloaded']} 个，续传 {stats['resumed']} 个，"
+            f"未变化 {stats['not_modified']} 个，跳过 {stats['skipped']} 个，失败 {stats['failed']} 个，"
+            f"共 {stats['bytes']} 字节。")
+
+
+def main():
+    """主执行函数"""
+    parser = argparse.ArgumentParser(description="异步并发下载NOAA GSOD数据 (pull.py/pull2.py 也使用此下载器)")
+    parser.add_argument("--base-url", default=BASE_URL, help="GSOD access/ 目录的URL (可指向本地测试服务器)")
+    parser.add_argument("--download-dir", default=DOWNLOAD_DIR, help="下载文件的保存目录")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="HTTP连接池大小")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="同时进行的请求数上限")
+    parser.add_argument("--rate-limit", type=float, default=DEFAULT_RATE_LIMIT,
+                        help="每个主机每秒的最大请求数 (0 表示不限速)")
+    parser.add_argument("--no-revalidate", action="store_true",
+                        help="已存在的文件直接跳过，不发送条件请求")
+    add_selection_arguments(parser)
+    args = parser.parse_args()
+    start_year, end_year, csv_filter = selection_from_args(args)
+
+    stats = asyncio.run(download_all(args.base_url, args.download_dir, args.pool_size,
+                                     args.concurrency, args.rate_limit, not args.no_revalidate,
+                                     start_year, end_year, csv_filter))
+    print(f"\n所有文件下载尝试完成。{format_stats(stats)}")
+
+
+if __name__ == "__main__":
+    main()
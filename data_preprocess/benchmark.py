@@ -0,0 +1,252 @@
+"""
+Benchmark of the preprocessing pipeline on synthetic GSOD data.
+
+Generates a synthetic cn_gsod/ tree (synthetic_gsod.py) in a work directory and
+runs the pipeline stages on it in order:
+
+    process     process.py: raw yearly CSV -> per-station CSV/JSON
+    checkrange  checkrange.py: name / coordinate checks of every station file
+    updateloss  updateloss.py: coordinate corrections of the (0, 0) stations
+    aggregate   process_weather_data.py: per-station CSV -> weather_data.json
+
+Each stage runs in a freshly spawned process, so its peak RSS is not inflated by
+earlier stages. The wall time, rows and files handled, rows/sec and peak memory
+of every stage are compared against a stored baseline; a stage that is slower
+or uses more memory than the baseline by more than the tolerance is reported as
+a regression and the run exits non-zero. --update-baseline stores the current
+results instead. Timings are machine dependent: refresh the baseline when the
+benchmark machine changes.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+import synthetic_gsod
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(SCRIPT_DIR)
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)  # process_weather_data.py lives in the project root
+
+BASELINE_FILE = os.path.join(SCRIPT_DIR, "benchmark_baseline.json")
+STAGES = ("process", "checkrange", "updateloss", "aggregate")
+COMPARED_METRICS = ("seconds", "peak_memory_mb")
+DEFAULT_TOLERANCE = 0.25
+CHECKRANGE_HEAD_ROWS = 5
+PROVINCE_GEOJSON = os.path.join(REPO_ROOT, "china_provinces.json")
+
+
+def prepare_workdir(workdir, stations, years, start_year, seed):
+    """Generates the synthetic input unless workdir already holds it for the same configuration."""
+    input_dir = os.path.join(workdir, "cn_gsod")
+    manifest_path = os.path.join(input_dir, synthetic_gsod.MANIFEST_FILE)
+    config = {"stations": stations, "years": years, "start_year": start_year, "seed": seed}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if all(manifest["config"].get(key) == value for key, value in config.items()):
+            return manifest
+        shutil.rmtree(input_dir)
+    print(f"Generating {stations} stations x {years} years of synthetic GSOD data in {input_dir} ...")
+    return synthetic_gsod.generate_gsod(input_dir, stations, years, start_year, seed)
+
+
+def _run_process(manifest, options):
+    import process
+    run = process.main_streaming if options["stream"] else process.main
+    run(workers=options["workers"], qc=options["qc"])
+    return manifest["rows"], manifest["files"]
+
+
+def _run_checkrange(manifest, options):
+    import checkrange
+    checkrange.process_files_in_directory(checkrange.DIRECTORY_PATH)
+    rows = sum(min(CHECKRANGE_HEAD_ROWS, count) for count in manifest["station_rows"].values())
+    return rows, len(manifest["station_rows"])
+
+
+def _run_updateloss(manifest, options):
+    import updateloss
+    corrections = manifest["zero_coordinates"]
+    updateloss.apply_corrections(
+        [{"filename": f"{entry['station']}.csv", "name": entry["name"],
+          "latitude": entry["latitude"], "longitude": entry["longitude"]} for entry in corrections],
+        updateloss.DIRECTORY_PATH, weather_data=None, workers=options["workers"])
+    rows = sum(manifest["station_rows"][entry["station"]] for entry in corrections)
+    return rows, 2 * len(corrections)  # CSV + JSON per station
+
+
+def _run_aggregate(manifest, options):
+    import process_weather_data
+    # process_weather_data.py reads ./csv, which holds the per-station CSV files of process.py
+    if not os.path.exists("csv"):
+        try:
+            os.symlink("processed_cn_gsod", "csv")
+        except OSError:  # no symlink permission (e.g. Windows)
+            shutil.copytree("processed_cn_gsod", "csv")
+    # a missing province file is reported by process_csv_files, which then skips the province stage
+    process_weather_data.process_csv_files(workers=options["workers"], province_geojson=options["province_geojson"],
+                                           data_format=options["data_format"])
+    return manifest["rows"], len(manifest["station_rows"])
+
+
+STAGE_RUNNERS = {
+    "process": _run_process,
+    "checkrange": _run_checkrange,
+    "updateloss": _run_updateloss,
+    "aggregate": _run_aggregate,
+}
+
+
+def run_stage(stage, workdir, manifest, options):
+    """Runs one stage in the current (fresh) process and returns its measurements."""
+    import process  # imported before timing, so module import time is not part of any stage
+    os.chdir(workdir)
+    output = contextlib.nullcontext() if options["verbose"] else open(os.devnull, "w", encoding="utf-8")
+    with output as sink, contextlib.redirect_stdout(sink or sys.stdout):
+        start = time.perf_counter()
+        rows, files = STAGE_RUNNERS[stage](manifest, options)
+        seconds = time.perf_counter() - start
+    peak_self = instrumentation.peak_memory_mb("self")
+    peak_children = instrumentation.peak_memory_mb("children")
+    return {
+        "seconds": round(seconds, 4),
+        "rows": rows,
+        "files": files,
+        "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None,
+        "peak_memory_mb": None if peak_self is None else round(max(peak_self, peak_children), 1),
+    }
+
+
+def run_benchmark(workdir, manifest, stages=STAGES, repeat=1, options=None):
+    """Runs the stages in order, each in its own spawned process; keeps the fastest of `repeat` runs."""
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for stage in stages:
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                runs.append(executor.submit(run_stage, stage, workdir, manifest, options).result())
+        results[stage] = min(runs, key=lambda run: run["seconds"])
+        result = results[stage]
+        print(f"  {stage:<12} {result['seconds']:>9.3f} s  {result['rows']:>10} rows  "
+              f"{result['rows_per_sec'] or 0:>12.0f} rows/s  peak {result['peak_memory_mb'] or 0:>8.1f} MB")
+    return results
+
+
+def compare_with_baseline(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Prints the change of every stage metric against the baseline and returns the regressions."""
+    if baseline["config"] != report["config"]:
+        print(f"\nBaseline configuration {baseline['config']} differs from this run; comparison skipped.")
+        return []
+
+    print(f"\nCompared with baseline (tolerance {tolerance:.0%}):")
+    regressions = []
+    for stage, result in report["stages"].items():
+        base = baseline["stages"].get(stage)
+        if base is None:
+            print(f"  {stage:<12} not in baseline")
+            continue
+        changes = []
+        for metric in COMPARED_METRICS:
+            current, previous = result.get(metric), base.get(metric)
+            if not current or not previous:
+                continue
+            change = current / previous - 1
+            changes.append(f"{metric} {previous:g} -> {current:g} ({change:+.1%})")
+            if change > tolerance:
+                regressions.append(f"{stage}: {metric} {previous:g} -> {current:g} ({change:+.1%})")
+        print(f"  {stage:<12} " + ", ".join(changes))
+
+    if regressions:
+        print("Regressions:")
+        for message in regressions:
+            print(f"  {message}")
+    else:
+        print("No regressions.")
+    return regressions
+
+
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the preprocessing pipeline on synthetic GSOD data.")
+    parser.add_argument("--stations", type=int, default=synthetic_gsod.DEFAULT_STATIONS, help="Number of stations")
+    parser.add_argument("--years", type=int, default=synthetic_gsod.DEFAULT_YEARS, help="Number of years")
+    parser.add_argument("--start-year", type=int, default=synthetic_gsod.DEFAULT_START_YEAR, help="First year")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help=f"Comma separated stages to run, in pipeline order (default: {','.join(STAGES)})")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes passed to process.py and process_weather_data.py")
+    parser.add_argument("--stream", action="store_true", help="Run process.py in streaming mode")
+    parser.add_argument("--no-qc", action="store_true",
+                        help="Run process.py without quality control (compare with a default run to measure its overhead)")
+    parser.add_argument("--data-format", default="v1", help="Output format of process_weather_data.py (default: v1)")
+    parser.add_argument("--province-geojson", default=PROVINCE_GEOJSON,
+                        help="Province boundaries for the aggregate stage (skipped with a warning when missing)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per stage; the fastest run is kept")
+    parser.add_argument("--workdir", default=None,
+                        help="Work directory; kept and reused between runs (default: a temporary directory)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline JSON file (default: benchmark_baseline.json)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown / memory growth before a stage counts as a regression (default: 0.25)")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--output", default=None, help="Also write the results of this run to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Show the output of the pipeline scripts")
+    args = parser.parse_args()
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    stages = [stage for stage in STAGES if stage in stages]
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="gsod_benchmark_"))
+    try:
+        manifest = prepare_workdir(workdir, args.stations, args.years, args.start_year, args.seed)
+        options = {"workers": args.workers, "stream": args.stream, "qc": not args.no_qc, "data_format": args.data_format,
+                   "province_geojson": args.province_geojson, "verbose": args.verbose}
+        print(f"Running {', '.join(stages)} on {manifest['rows']} rows in {manifest['files']} files "
+              f"({manifest['bytes'] / 1024 / 1024:.1f} MB):")
+        report = {
+            "config": {"stations": args.stations, "years": args.years, "start_year": args.start_year,
+                       "seed": args.seed, "workers": args.workers, "stream": args.stream,
+                       "qc": not args.no_qc, "data_format": args.data_format},
+            "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpu_count": os.cpu_count()},
+            "stages": run_benchmark(workdir, manifest, stages, args.repeat, options),
+        }
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        sys.exit(0)
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to create one.")
+    elif compare_with_baseline(report, baseline, args.tolerance):
+        sys.exit(1)
@@ -1,5 +1,13 @@
 import os
+import csv
+import json
+import shutil
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
+import columnar_store
 
 # --- 配置参数 ---
 DIRECTORY_PATH = "processed_cn_gsod"  # 目标目录
@@ -11,6 +19,34 @@ lat_col_candidates = ['LATITUDE', 'LAT', 'lat', '纬度', 'Latitude']
 lon_col_candidates = ['LONGITUDE', 'LON', 'lon', '经度', 'Longitude']
 name_col_candidates = ['NAME', 'STATION_NAME', 'Name', '名称', '站点名称']
 
+# 批量校验 (validate_directory) 的并发读取线程数与问题代码
+DEFAULT_VALIDATE_WORKERS = 16
+ISSUE_EMPTY_FILE = "empty_file"
+ISSUE_READ_ERROR = "read_error"
+ISSUE_BOGUS_NAME = "bogus_name"
+ISSUE_MISSING_COLUMNS = "missing_coordinate_columns"
+ISSUE_INVALID_COORDINATES = "invalid_coordinates"
+ISSUE_ZERO_COORDINATES = "zero_coordinates"
+ISSUE_OUT_OF_BOUNDS = "out_of_bounds"
+# 批量处理模式 (--batch) 的动作与默认策略：建议删除的问题删除，其余保留
+ACTION_DELETE = "delete"
+ACTION_QUARANTINE = "quarantine"
+ACTION_KEEP = "keep"
+ACTIONS = (ACTION_DELETE, ACTION_QUARANTINE, ACTION_KEEP)
+DEFAULT_QUARANTINE_DIR = "quarantine"
+# 每个站点CSV对应的其他文件 (process.py 的JSON及其预压缩文件)
+COMPANION_SUFFIXES = (".json", ".json.gz", ".json.br")
+# 与 check_station_head 相同的说明文字，以及是否建议删除
+ISSUE_DESCRIPTIONS = {
+    ISSUE_EMPTY_FILE: ("文件为空", False),
+    ISSUE_READ_ERROR: ("读取错误", False),
+    ISSUE_BOGUS_NAME: ("站点名包含 'BOGUS'", True),
+    ISSUE_MISSING_COLUMNS: ("经纬度列名未找到", True),
+    ISSUE_INVALID_COORDINATES: ("无效的经纬度值", True),
+    ISSUE_ZERO_COORDINATES: ("经纬度为 (0.0, 0.0)", False),
+    ISSUE_OUT_OF_BOUNDS: ("超出地理范围 (将保留)", False),
+}
+
 # --- 主逻辑 ---
 def find_column(df_columns, candidates):
     """在DataFrame的列中查找第一个匹配的候选列名"""
@@ -34,6 +70,108 @@ def get_station_name_from_df(df_head, name_col):
             return f"Error reading name: {e}"
     return "Name column not found or N/A"
 
+def check_station_head(filename, df_head, out_of_bounds_stations_info, general_problematic_files, special_coord_issue_stations):
+    """
+    Applies the BOGUS / coordinate / bounding-box checks to the first rows of one station
+    and appends any finding to the given result lists. Returns the station name found.
+    """
+    station_name_from_csv = "N/A" # Default
+    if df_head.empty:
+        print(f"  文件 {filename} 为空，跳过。")
+        general_problematic_files.append({
+            "filename": filename,
+            "station_name_csv": "N/A", # Name might not be readable
+            "issue": "文件为空"
+        })
+        return station_name_from_csv
+
+    name_col_actual = find_column(df_head.columns, name_col_candidates)
+    station_name_from_csv = get_station_name_from_df(df_head, name_col_actual)
+
+    # Check for "BOGUS" in station name first
+    if "bogus" in station_name_from_csv.lower():
+        print(f"  警告: 站点 {filename} (名称: \"{station_name_from_csv}\") 名称包含 'BOGUS'，建议删除。")
+        special_coord_issue_stations.append({
+            "filename": filename,
+            "station_name_csv": station_name_from_csv,
+            "latitude": "N/A", # Coordinates not checked yet for this specific path
+            "longitude": "N/A",
+            "issue": "站点名包含 'BOGUS'",
+            "propose_delete": True
+        })
+        return station_name_from_csv
+
+    lat_col = find_column(df_head.columns, lat_col_candidates)
+    lon_col = find_column(df_head.columns, lon_col_candidates)
+
+    if not lat_col or not lon_col:
+        msg = f"在文件 {filename} 中未找到预期的经纬度列。"
+        print(f"  警告: {msg}")
+        special_coord_issue_stations.append({
+            "filename": filename,
+            "station_name_csv": station_name_from_csv,
+            "latitude": "N/A",
+            "longitude": "N/A",
+            "issue": "经纬度列名未找到",
+            "propose_delete": True
+        })
+        return station_name_from_csv
+
+    raw_lat_val, raw_lon_val = "N/A", "N/A"
+    station_lat, station_lon = None, None # Initialize
+    try:
+        if not df_head[lat_col].dropna().empty:
+            raw_lat_val = df_head[lat_col].dropna().iloc[0]
+        if not df_head[lon_col].dropna().empty:
+            raw_lon_val = df_head[lon_col].dropna().iloc[0]
+
+        station_lat = float(raw_lat_val)
+        station_lon = float(raw_lon_val)
+
+    except (IndexError, ValueError) as e_val:
+        msg = f"无法从文件 {filename} 的列 '{lat_col}', '{lon_col}' 提取有效的经纬度值 (原始值 Lat: {raw_lat_val}, Lon: {raw_lon_val})。错误: {e_val}"
+        print(f"  警告: {msg}")
+        special_coord_issue_stations.append({
+            "filename": filename,
+            "station_name_csv": station_name_from_csv,
+            "latitude": str(raw_lat_val),
+            "longitude": str(raw_lon_val),
+            "issue": f"无效的经纬度值: {e_val}",
+            "propose_delete": True
+        })
+        return station_name_from_csv
+
+    # 之前的检查在发现问题时已返回，因此 (0,0) 是本站点唯一可能已记录的问题 (且不建议删除)
+    is_zero = station_lat == 0.0 and station_lon == 0.0
+    if is_zero:
+        print(f"  注意: 站点 {filename} (名称: \"{station_name_from_csv}\") 经纬度为 (0.0, 0.0)。")
+        special_coord_issue_stations.append({
+            "filename": filename,
+            "station_name_csv": station_name_from_csv,
+            "latitude": station_lat,
+            "longitude": station_lon,
+            "issue": "经纬度为 (0.0, 0.0)",
+            "propose_delete": False
+        })
+
+    is_within_bounds = (MIN_LAT <= station_lat <= MAX_LAT) and \
+                       (MIN_LON <= station_lon <= MAX_LON)
+
+    if not is_within_bounds:
+        print(f"  站点 {filename} (名称: \"{station_name_from_csv}\", Lat: {station_lat:.2f}, Lon: {station_lon:.2f}) 在范围之外 (将保留)。")
+        out_of_bounds_stations_info.append({
+            "filename": filename,
+            "station_name_csv": station_name_from_csv,
+            "latitude": station_lat,
+            "longitude": station_lon,
+            "reason": "超出地理范围 (将保留)"
+        })
+    else: 
+        if not is_zero:
+             print(f"  站点 {filename} (名称: \"{station_name_from_csv}\", Lat: {station_lat:.2f}, Lon: {station_lon:.2f}) 在范围内，数据有效，保留。")
+
+    return station_name_from_csv
+
 def process_files_in_directory(directory):
     out_of_bounds_stations_info = []
     general_problematic_files = [] # For general file processing issues (e.g., empty, read error)
@@ -57,105 +195,9 @@ def process_files_in_directory(directory):
             try:
                 df_head = pd.read_csv(file_path, nrows=5, encoding='utf-8', skipinitialspace=True)
 
-                if df_head.empty:
-                    print(f"  文件 {filename} 为空，跳过。")
-                    general_problematic_files.append({
-                        "filename": filename,
-                        "station_name_csv": "N/A", # Name might not be readable
-                        "issue": "文件为空"
-                    })
-                    continue
-
-                name_col_actual = find_column(df_head.columns, name_col_candidates)
-                station_name_from_csv = get_station_name_from_df(df_head, name_col_actual)
-
-                # Check for "BOGUS" in station name first
-                if "bogus" in station_name_from_csv.lower():
-                    print(f"  警告: 站点 {filename} (名称: \"{station_name_from_csv}\") 名称包含 'BOGUS'，建议删除。")
-                    special_coord_issue_stations.append({
-                        "filename": filename,
-                        "station_name_csv": station_name_from_csv,
-                        "latitude": "N/A", # Coordinates not checked yet for this specific path
-                        "longitude": "N/A",
-                        "issue": "站点名包含 'BOGUS'",
-                        "propose_delete": True
-                    })
-                    print("-" * 20)
-                    continue # Move to next file
-
-                lat_col = find_column(df_head.columns, lat_col_candidates)
-                lon_col = find_column(df_head.columns, lon_col_candidates)
-
-                if not lat_col or not lon_col:
-                    msg = f"在文件 {filename} 中未找到预期的经纬度列。"
-                    print(f"  警告: {msg}")
-                    special_coord_issue_stations.append({
-                        "filename": filename,
-                        "station_name_csv": station_name_from_csv,
-                        "latitude": "N/A",
-                        "longitude": "N/A",
-                        "issue": "经纬度列名未找到",
-                        "propose_delete": True
-                    })
-                    print("-" * 20)
-                    continue # Continue to next file after logging
-
-                raw_lat_val, raw_lon_val = "N/A", "N/A"
-                station_lat, station_lon = None, None # Initialize
-                try:
-                    if not df_head[lat_col].dropna().empty:
-                        raw_lat_val = df_head[lat_col].dropna().iloc[0]
-                    if not df_head[lon_col].dropna().empty:
-                        raw_lon_val = df_head[lon_col].dropna().iloc[0]
-                    
-                    station_lat = float(raw_lat_val)
-                    station_lon = float(raw_lon_val)
-
-                except (IndexError, ValueError) as e_val:
-                    msg = f"无法从文件 {filename} 的列 '{lat_col}', '{lon_col}' 提取有效的经纬度值 (原始值 Lat: {raw_lat_val}, Lon: {raw_lon_val})。错误: {e_val}"
-                    print(f"  警告: {msg}")
-                    special_coord_issue_stations.append({
-                        "filename": filename,
-                        "station_name_csv": station_name_from_csv,
-                        "latitude": str(raw_lat_val),
-                        "longitude": str(raw_lon_val),
-                        "issue": f"无效的经纬度值: {e_val}",
-                        "propose_delete": True
-                    })
-                    print("-" * 20)
-                    continue # Continue to next file
-
-                if station_lat == 0.0 and station_lon == 0.0:
-                    print(f"  注意: 站点 {filename} (名称: \"{station_name_from_csv}\") 经纬度为 (0.0, 0.0)。")
-                    existing_issue_entry = next((s for s in special_coord_issue_stations if s["filename"] == filename), None)
-                    if not existing_issue_entry: 
-                        special_coord_issue_stations.append({
-                            "filename": filename,
-                            "station_name_csv": station_name_from_csv,
-                            "latitude": station_lat,
-                            "longitude": station_lon,
-                            "issue": "经纬度为 (0.0, 0.0)",
-                            "propose_delete": False 
-                        })
-
-                is_within_bounds = (MIN_LAT <= station_lat <= MAX_LAT) and \
-                                   (MIN_LON <= station_lon <= MAX_LON)
-
-                if not is_within_bounds:
-                    is_already_proposed_for_delete = any(s["filename"] == filename and s.get("propose_delete") for s in special_coord_issue_stations)
-                    if not is_already_proposed_for_delete:
-                        print(f"  站点 {filename} (名称: \"{station_name_from_csv}\", Lat: {station_lat:.2f}, Lon: {station_lon:.2f}) 在范围之外 (将保留)。")
-                        out_of_bounds_stations_info.append({
-                            "filename": filename,
-                            "station_name_csv": station_name_from_csv,
-                            "latitude": station_lat,
-                            "longitude": station_lon,
-                            "reason": "超出地理范围 (将保留)"
-                        })
-                else: 
-                    is_problematic_or_zero = any(s["filename"] == filename for s in special_coord_issue_stations) # Check if any issue (incl. 0,0) was logged
-                    if not is_problematic_or_zero:
-                         print(f"  站点 {filename} (名称: \"{station_name_from_csv}\", Lat: {station_lat:.2f}, Lon: {station_lon:.2f}) 在范围内，数据有效，保留。")
+                station_name_from_csv = check_station_head(
+                    filename, df_head, out_of_bounds_stations_info,
+                    general_problematic_files, special_coord_issue_stations)
 
             except pd.errors.EmptyDataError: 
                 print(f"  文件 {filename} 为空或格式错误 (pandas EmptyDataError)，跳过。")
@@ -175,9 +217,421 @@ def process_files_in_directory(directory):
 
     return out_of_bounds_stations_info, general_problematic_files, special_coord_issue_stations
 
+def process_parquet_dataset(dataset_dir):
+    """
+    与 process_files_in_directory 相同的检查，但直接读取 process.py 输出的 Parquet 数据集：
+    每个站点只读取最早分区的前几行，不需要重新解析CSV。结果中的 filename 为 "<站点ID>.parquet"
+    """
+    out_of_bounds_stations_info = []
+    general_problematic_files = []
+    special_coord_issue_stations = []
+
+    if not os.path.isdir(dataset_dir):
+        print(f"错误：目录 '{dataset_dir}' 不存在。")
+        return [], [], []
+
+    print(f"开始处理 Parquet 数据集: {dataset_dir}")
+    print(f"有效地理范围: 纬度 {MIN_LAT}-{MAX_LAT}, 经度 {MIN_LON}-{MAX_LON}\n")
+
+    for station_id in columnar_store.list_stations(dataset_dir):
+        filename = f"{station_id}.parquet"
+        print(f"正在检查站点: {station_id} ...")
+        station_name_from_csv = "N/A"
+        try:
+            df_head = columnar_store.read_station_head(
+                dataset_dir, station_id, columns=["STATION", "DATE", "LATITUDE", "LONGITUDE", "NAME"])
+            station_name_from_csv = check_station_head(
+                filename, df_head, out_of_bounds_stations_info,
+                general_problematic_files, special_coord_issue_stations)
+        except Exception as e:
+            print(f"  处理站点 {station_id} 时发生未知错误: {e}")
+            general_problematic_files.append({
+                "filename": filename,
+                "station_name_csv": station_name_from_csv,
+                "issue": f"未知处理错误: {e}"
+            })
+        print("-" * 20)
+
+    return out_of_bounds_stations_info, general_problematic_files, special_coord_issue_stations
+
+# --- 批量校验 ---
+STATION_TABLE_COLUMNS = ["filename", "station_name_csv", "lat_raw", "lon_raw",
+                         "has_lat_col", "has_lon_col", "empty", "read_error"]
+
+def _name_from_row(header, row):
+    """与 get_station_name_from_df 相同的名称规则，只看第一行数据"""
+    name_col = find_column(header, name_col_candidates)
+    if name_col is None:
+        return "Name column not found or N/A"
+    value = row[header.index(name_col)].strip()
+    return value if value else "Name column present but no data"
+
+def read_station_header(directory, filename):
+    """
+    只读取一个站点CSV的表头和第一行数据，返回站点元数据表的一行 (见 STATION_TABLE_COLUMNS)
+    与 check_station_head 读取前5行不同，经纬度和名称只取第一行的值
+    """
+    try:
+        with open(os.path.join(directory, filename), "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f, skipinitialspace=True)
+            header = next(reader, None)
+            row = next(reader, None)
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        return (filename, "N/A", None, None, False, False, False, str(e))
+    if header is None or row is None:
+        return (filename, "N/A", None, None, False, False, True, None)
+
+    row = row + [""] * (len(header) - len(row))
+    lat_col = find_column(header, lat_col_candidates)
+    lon_col = find_column(header, lon_col_candidates)
+    return (filename, _name_from_row(header, row),
+            row[header.index(lat_col)].strip() if lat_col else None,
+            row[header.index(lon_col)].strip() if lon_col else None,
+            lat_col is not None, lon_col is not None, False, None)
+
+def read_parquet_station_header(dataset_dir, station_id):
+    """read_station_header 的 Parquet 版本：只读取站点最早分区的第一行"""
+    filename = f"{station_id}.parquet"
+    try:
+        df_head = columnar_store.read_station_head(dataset_dir, station_id,
+                                                   columns=["STATION", "LATITUDE", "LONGITUDE", "NAME"], nrows=1)
+    except Exception as e:
+        return (filename, "N/A", None, None, False, False, False, str(e))
+    if df_head.empty:
+        return (filename, "N/A", None, None, False, False, True, None)
+    row = df_head.iloc[0]
+    name = "Name column present but no data" if pd.isna(row["NAME"]) else str(row["NAME"])
+    return (filename, name, row["LATITUDE"], row["LONGITUDE"], True, True, False, None)
+
+def build_station_table(directory, workers=DEFAULT_VALIDATE_WORKERS, parquet=False):
+    """并发读取目录中每个站点的表头与第一行，组成一张站点元数据表 (按文件名排序)"""
+    if parquet:
+        sources = columnar_store.list_stations(directory)
+        reader = read_parquet_station_header
+    else:
+        sources = sorted(name for name in os.listdir(directory) if name.lower().endswith(".csv"))
+        reader = read_station_header
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        rows = list(executor.map(lambda source: reader(directory, source), sources))
+    return pd.DataFrame(rows, columns=STATION_TABLE_COLUMNS)
+
+def validate_station_table(table):
+    """
+    对站点元数据表一次性应用与 check_station_head 相同的规则 (按相同的优先级)，
+    返回增加了 latitude/longitude (数值)、issue (问题代码，无问题为 None) 和 propose_delete 列的新表
+    (0,0) 坐标同时超出地理范围，因此和逐个检查一样也会出现在范围外列表中，见 validation_lists
+    """
+    table = table.copy()
+    lat = pd.to_numeric(table["lat_raw"], errors="coerce")
+    lon = pd.to_numeric(table["lon_raw"], errors="coerce")
+    names = table["station_name_csv"].astype(str).str.lower()
+
+    unreadable = table["read_error"].notna().to_numpy()
+    empty = table["empty"].to_numpy(dtype=bool) & ~unreadable
+    checked = ~(unreadable | empty)
+    bogus = checked & names.str.contains("bogus", regex=False).to_numpy()
+    missing_columns = checked & ~bogus & ~(table["has_lat_col"] & table["has_lon_col"]).to_numpy(dtype=bool)
+    invalid = checked & ~bogus & ~missing_columns & (lat.isna() | lon.isna()).to_numpy()
+    valid = checked & ~bogus & ~missing_columns & ~invalid
+    zero = valid & ((lat == 0.0) & (lon == 0.0)).to_numpy()
+    outside = valid & ~(lat.between(MIN_LAT, MAX_LAT) & lon.between(MIN_LON, MAX_LON)).to_numpy()
+
+    codes = [ISSUE_READ_ERROR, ISSUE_EMPTY_FILE, ISSUE_BOGUS_NAME, ISSUE_MISSING_COLUMNS,
+             ISSUE_INVALID_COORDINATES, ISSUE_ZERO_COORDINATES, ISSUE_OUT_OF_BOUNDS]
+    issue = np.select([unreadable, empty, bogus, missing_columns, invalid, zero, outside], codes, default="")
+    table["latitude"] = lat
+    table["longitude"] = lon
+    table["issue"] = pd.Series(issue, index=table.index).replace("", None)
+    table["propose_delete"] = bogus | missing_columns | invalid
+    table["out_of_bounds"] = outside
+    return table
+
+def validation_lists(validated):
+    """
+    把校验结果转换为 process_files_in_directory 的三个列表
+    (范围外站点, 一般问题文件, 特殊坐标问题站点)，以便沿用后续的删除与报告流程
+    """
+    def coordinate(raw, value):
+        return value if pd.notna(value) else ("N/A" if raw is None or pd.isna(raw) else str(raw))
+
+    out_of_bounds, general, special = [], [], []
+    for row in validated[validated["issue"].notna()].itertuples(index=False):
+        if row.issue in (ISSUE_EMPTY_FILE, ISSUE_READ_ERROR):
+            issue = "文件为空" if row.issue == ISSUE_EMPTY_FILE else f"未知处理错误: {row.read_error}"
+            general.append({"filename": row.filename, "station_name_csv": row.station_name_csv, "issue": issue})
+            continue
+        if row.issue != ISSUE_OUT_OF_BOUNDS:
+            coordinates_checked = row.issue in (ISSUE_INVALID_COORDINATES, ISSUE_ZERO_COORDINATES)
+            special.append({
+                "filename": row.filename,
+                "station_name_csv": row.station_name_csv,
+                "latitude": coordinate(row.lat_raw, row.latitude) if coordinates_checked else "N/A",
+                "longitude": coordinate(row.lon_raw, row.longitude) if coordinates_checked else "N/A",
+                "issue": ISSUE_DESCRIPTIONS[row.issue][0],
+                "propose_delete": bool(row.propose_delete),
+            })
+        if row.out_of_bounds:
+            out_of_bounds.append({
+                "filename": row.filename,
+                "station_name_csv": row.station_name_csv,
+                "latitude": row.latitude,
+                "longitude": row.longitude,
+                "reason": ISSUE_DESCRIPTIONS[ISSUE_OUT_OF_BOUNDS][0],
+            })
+    return out_of_bounds, general, special
+
+def validation_report(validated, directory):
+    """机器可读的校验报告：各问题代码的数量，以及每个有问题站点的一条记录"""
+    flagged = validated[validated["issue"].notna()]
+    stations = []
+    for row in flagged.itertuples(index=False):
+        stations.append({
+            "filename": row.filename,
+            "station": os.path.splitext(row.filename)[0],
+            "name": row.station_name_csv,
+            "latitude": None if pd.isna(row.latitude) else float(row.latitude),
+            "longitude": None if pd.isna(row.longitude) else float(row.longitude),
+            "issue": row.issue,
+            "out_of_bounds": bool(row.out_of_bounds),
+            "propose_delete": bool(row.propose_delete),
+            "error": row.read_error if isinstance(row.read_error, str) else None,
+        })
+    return {
+        "directory": directory,
+        "bounds": {"lat": [MIN_LAT, MAX_LAT], "lon": [MIN_LON, MAX_LON]},
+        "checked": len(validated),
+        "valid": int(validated["issue"].isna().sum()),
+        "issues": {code: int(count) for code, count in flagged["issue"].value_counts().sort_index().items()},
+        "stations": stations,
+    }
+
+def validate_directory(directory, workers=DEFAULT_VALIDATE_WORKERS, parquet=False, report_path=None):
+    """
+    批量校验模式 (代替逐个文件检查的 process_files_in_directory / process_parquet_dataset)：
+    并发读取每个站点的表头和第一行，组成一张站点表后用向量化掩码一次性检查，
+    可选写出 JSON 报告。返回与 process_files_in_directory 相同的三个列表和报告
+    """
+    if not os.path.isdir(directory):
+        print(f"错误：目录 '{directory}' 不存在。")
+        return [], [], [], None
+
+    print(f"开始批量校验: {directory} ({workers} 个读取线程)")
+    print(f"有效地理范围: 纬度 {MIN_LAT}-{MAX_LAT}, 经度 {MIN_LON}-{MAX_LON}")
+    validated = validate_station_table(build_station_table(directory, workers, parquet))
+    report = validation_report(validated, directory)
+
+    print(f"已检查 {report['checked']} 个站点，{report['valid']} 个在范围内且无问题")
+    for code, count in report["issues"].items():
+        print(f"  {code} ({ISSUE_DESCRIPTIONS[code][0]}): {count}")
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"校验报告已写入 {report_path}")
+    return (*validation_lists(validated), report)
+
+# --- 批量处理 (删除 / 隔离 / 保留) ---
+def default_policy():
+    """默认策略：建议删除的问题 (BOGUS、缺少经纬度列、经纬度无效) 删除，其余保留"""
+    return {code: ACTION_DELETE if propose_delete else ACTION_KEEP
+            for code, (_, propose_delete) in ISSUE_DESCRIPTIONS.items()}
+
+def load_policy(path=None):
+    """
+    读取策略文件 (JSON，问题代码 -> delete/quarantine/keep，未列出的问题使用默认策略)，
+    例如 {"bogus_name": "delete", "invalid_coordinates": "quarantine", "empty_file": "quarantine"}
+    """
+    policy = default_policy()
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+        for code, action in overrides.items():
+            if code not in ISSUE_DESCRIPTIONS:
+                raise ValueError(f"策略文件中有未知的问题代码: {code}")
+            if action not in ACTIONS:
+                raise ValueError(f"问题 {code} 的动作无效: {action} (可选 {', '.join(ACTIONS)})")
+            policy[code] = action
+    return policy
+
+def station_files_for_action(directory, filename, parquet=False):
+    """一个站点的全部文件：CSV 及存在的 JSON/预压缩文件，或 Parquet 数据集中该站点的所有分区文件"""
+    station_id, _ = os.path.splitext(filename)
+    if parquet:
+        return columnar_store.station_files(directory, station_id)
+    paths = [os.path.join(directory, filename)]
+    paths += [os.path.join(directory, station_id + suffix) for suffix in COMPANION_SUFFIXES]
+    return [path for path in paths if os.path.exists(path)]
+
+def plan_batch_actions(report, policy, directory, quarantine_dir, parquet=False):
+    """
+    根据校验报告与策略生成文件操作列表，每个操作为
+    {station, issue, action, source, target}；隔离的目标路径保留相对 directory 的路径 (Parquet 分区目录)
+    """
+    operations = []
+    for station in report["stations"]:
+        action = policy[station["issue"]]
+        if action == ACTION_KEEP:
+            continue
+        for source in station_files_for_action(directory, station["filename"], parquet):
+            target = None
+            if action == ACTION_QUARANTINE:
+                target = os.path.join(quarantine_dir, os.path.relpath(source, directory))
+            operations.append({"station": station["station"], "issue": station["issue"],
+                               "action": action, "source": source, "target": target})
+    return operations
+
+def _apply_operation(operation):
+    """执行一个文件操作，返回带 status (done/failed) 与 error 的操作记录"""
+    result = dict(operation, status="done", error=None)
+    try:
+        if operation["action"] == ACTION_DELETE:
+            os.remove(operation["source"])
+        else:
+            os.makedirs(os.path.dirname(operation["target"]), exist_ok=True)
+            shutil.move(operation["source"], operation["target"])
+    except OSError as e:
+        result.update(status="failed", error=str(e))
+    return result
+
+def apply_batch_actions(operations, workers=DEFAULT_VALIDATE_WORKERS):
+    """并发执行全部文件操作，按原顺序返回结果"""
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(_apply_operation, operations))
+
+def write_undo_manifest(path, directory, quarantine_dir, results):
+    """
+    记录本次批量处理的全部操作。隔离的文件可用 --undo 移回原位置；
+    删除的文件无法恢复，只在清单中记录 (restorable: false)
+    """
+    manifest = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "directory": directory,
+        "quarantine_dir": quarantine_dir,
+        "operations": [dict(result, restorable=result["action"] == ACTION_QUARANTINE and result["status"] == "done")
+                       for result in results],
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+def run_batch(directory, policy, quarantine_dir=DEFAULT_QUARANTINE_DIR, parquet=False, dry_run=False,
+              workers=DEFAULT_VALIDATE_WORKERS, report_path=None, undo_manifest_path=None):
+    """
+    非交互的批量处理：批量校验目录后按策略删除、隔离或保留有问题的站点，
+    文件操作并发执行并写出撤销清单。dry_run 时只打印计划，不修改任何文件。
+    返回操作结果列表 (dry_run 时为计划的操作)
+    """
+    _, _, _, report = validate_directory(directory, workers, parquet=parquet, report_path=report_path)
+    if report is None:
+        return []
+    operations = plan_batch_actions(report, policy, directory, quarantine_dir, parquet)
+
+    counts = {}
+    for station in report["stations"]:
+        key = (station["issue"], policy[station["issue"]])
+        counts[key] = counts.get(key, 0) + 1
+    print("\n--- 批量处理策略 ---")
+    for (code, action), count in sorted(counts.items()):
+        print(f"  {code}: {count} 个站点 -> {action}")
+
+    if dry_run:
+        print(f"\n[dry-run] 计划执行 {len(operations)} 个文件操作，未修改任何文件:")
+        for operation in operations:
+            target = f" -> {operation['target']}" if operation["target"] else ""
+            print(f"  {operation['action']}: {operation['source']}{target}")
+        return operations
+
+    results = apply_batch_actions(operations, workers)
+    failed = [result for result in results if result["status"] == "failed"]
+    done = len(results) - len(failed)
+    print(f"\n已完成 {done} 个文件操作，失败 {len(failed)} 个")
+    for result in failed:
+        print(f"  错误: {result['action']} {result['source']} 失败: {result['error']}")
+
+    if results:
+        if undo_manifest_path is None:
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            undo_manifest_path = os.path.join(quarantine_dir, f"undo-{stamp}.json")
+        write_undo_manifest(undo_manifest_path, directory, quarantine_dir, results)
+        print(f"撤销清单已写入 {undo_manifest_path} (python checkrange.py --undo {undo_manifest_path})")
+    return results
+
+def undo_batch(manifest_path, dry_run=False, workers=DEFAULT_VALIDATE_WORKERS):
+    """把撤销清单中已隔离的文件移回原位置 (目标位置已有文件时跳过)，返回移回的文件数"""
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    restorable = [op for op in manifest["operations"] if op.get("restorable")]
+    skipped = len(manifest["operations"]) - len(restorable)
+    print(f"撤销清单 {manifest_path}: {len(restorable)} 个隔离文件可以移回，{skipped} 个操作无法撤销 (已删除或失败)")
+
+    moves = []
+    for operation in restorable:
+        if os.path.exists(operation["source"]):
+            print(f"  跳过: {operation['source']} 已存在")
+        elif not os.path.exists(operation["target"]):
+            print(f"  跳过: 隔离文件 {operation['target']} 不存在")
+        else:
+            moves.append({"action": ACTION_QUARANTINE, "source": operation["target"], "target": operation["source"]})
+    if dry_run:
+        for move in moves:
+            print(f"  [dry-run] {move['source']} -> {move['target']}")
+        return 0
+
+    results = apply_batch_actions(moves, workers)
+    restored = sum(result["status"] == "done" for result in results)
+    for result in results:
+        if result["status"] == "failed":
+            print(f"  错误: 移回 {result['target']} 失败: {result['error']}")
+    print(f"已移回 {restored} 个文件")
+    return restored
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检查站点文件的名称与经纬度，并确认删除有问题的站点")
+    parser.add_argument("--parquet", default=None,
+                        help="检查 process.py 输出的 Parquet 数据集目录，而不是 DIRECTORY_PATH 中的CSV文件")
+    parser.add_argument("--bulk", action="store_true",
+                        help="批量校验：并发读取每个站点的表头和第一行，用向量化规则一次性检查 (适合数万个站点)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_VALIDATE_WORKERS,
+                        help=f"批量校验的并发读取线程数 (默认 {DEFAULT_VALIDATE_WORKERS})")
+    parser.add_argument("--report", default=None,
+                        help="批量校验时把机器可读的 JSON 报告写入该文件")
+    parser.add_argument("--check-only", action="store_true",
+                        help="只检查并报告，不进入删除确认步骤")
+    parser.add_argument("--batch", action="store_true",
+                        help="非交互批量处理：批量校验后按策略删除、隔离或保留有问题的站点 (不询问确认)")
+    parser.add_argument("--policy", default=None,
+                        help="批量处理的策略文件 (JSON: 问题代码 -> delete/quarantine/keep)，未指定时建议删除的问题删除、其余保留")
+    parser.add_argument("--quarantine-dir", default=DEFAULT_QUARANTINE_DIR,
+                        help=f"隔离文件的目录，保留原相对路径 (默认 {DEFAULT_QUARANTINE_DIR})")
+    parser.add_argument("--undo-manifest", default=None,
+                        help="撤销清单的路径 (默认 <隔离目录>/undo-<时间>.json)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="只打印批量处理或撤销的计划，不修改任何文件")
+    parser.add_argument("--undo", default=None, metavar="MANIFEST",
+                        help="根据撤销清单把隔离的文件移回原位置")
+    args = parser.parse_args()
+    if args.report and not (args.bulk or args.batch):
+        parser.error("--report 需要与 --bulk 或 --batch 一起使用")
+
+    if args.undo:
+        undo_batch(args.undo, dry_run=args.dry_run, workers=args.workers)
+        raise SystemExit(0)
+    if args.batch:
+        results = run_batch(args.parquet or DIRECTORY_PATH, load_policy(args.policy), args.quarantine_dir,
+                            parquet=bool(args.parquet), dry_run=args.dry_run, workers=args.workers,
+                            report_path=args.report, undo_manifest_path=args.undo_manifest)
+        raise SystemExit(1 if any(result.get("status") == "failed" for result in results) else 0)
+
     # !! 再次提醒：运行前请备份数据 !!
-    out_of_bounds_stations, general_problem_files, special_coord_files = process_files_in_directory(DIRECTORY_PATH)
+    if args.bulk:
+        out_of_bounds_stations, general_problem_files, special_coord_files, _ = validate_directory(
+            args.parquet or DIRECTORY_PATH, args.workers, parquet=bool(args.parquet), report_path=args.report)
+    elif args.parquet:
+        out_of_bounds_stations, general_problem_files, special_coord_files = process_parquet_dataset(args.parquet)
+    else:
+        out_of_bounds_stations, general_problem_files, special_coord_files = process_files_in_directory(DIRECTORY_PATH)
+    if args.check_only:
+        raise SystemExit(0)
 
     deleted_csv_files = [] 
     deleted_json_files = [] 
@@ -197,6 +651,16 @@ if __name__ == "__main__":
             json_filename_to_delete = base_filename + ".json"
             json_file_path_to_delete = os.path.join(DIRECTORY_PATH, json_filename_to_delete)
 
+            if args.parquet:
+                confirm = input(f"    是否确认从数据集中删除站点 '{base_filename}' 的所有文件? (y/n): ").strip().lower()
+                if confirm == 'y':
+                    removed = columnar_store.delete_station(args.parquet, base_filename)
+                    print(f"    已删除 {len(removed)} 个 Parquet 文件。")
+                    deleted_csv_files.append(station_info['filename'])
+                else:
+                    print(f"    站点 '{base_filename}' 已保留。")
+                continue
+
             while True:
                 confirm = input(f"    是否确认删除 '{station_info['filename']}' 和 '{json_filename_to_delete}' (如果存在)? (y/n): ").strip().lower()
                 if confirm == 'y':
@@ -231,8 +695,9 @@ if __name__ == "__main__":
 
     if deleted_csv_files:
         print("\n以下CSV文件因有问题 (站点名含BOGUS、经纬度无效/缺失)并经用户确认后被删除：")
+        candidates_by_filename = {s['filename']: s for s in candidate_files_for_deletion}
         for filename in deleted_csv_files:
-            station_details = next((s for s in candidate_files_for_deletion if s['filename'] == filename), None)
+            station_details = candidates_by_filename.get(filename)
             if station_details:
                  print(f"- CSV 文件名: {filename}, CSV内站点名: \"{station_details['station_name_csv']}\", 问题: {station_details['issue']}")
             else:
@@ -245,8 +710,9 @@ if __name__ == "__main__":
     if not deleted_csv_files and not deleted_json_files:
         print("\n没有文件在此次运行中被删除。")
 
+    deleted_csv_set = set(deleted_csv_files)
     remaining_special_coord_files = [
-        s for s in special_coord_files if s['filename'] not in deleted_csv_files 
+        s for s in special_coord_files if s['filename'] not in deleted_csv_set
     ]
     if remaining_special_coord_files:
         print("\n以下站点存在特殊问题（如0,0坐标、或曾提议删除但用户选择保留），文件已保留：")
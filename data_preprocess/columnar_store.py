@@ -0,0 +1,207 @@
+"""
+Columnar (Parquet) storage for processed GSOD station data.
+
+A dataset directory holds one Parquet file per station and partition, in
+hive-style partition folders (year=YYYY/ or station=ID/). Every file is named
+after its station, so a station's files can be located, read or rewritten
+without scanning the rest of the dataset. Numeric columns are float32 and
+STATION/NAME are dictionary encoded.
+"""
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is only needed when the Parquet output is used
+    pa = None
+    pq = None
+
+PARQUET_OUTPUT_DIR = "processed_cn_gsod_parquet"
+METADATA_FILE = "_dataset.json"
+PARTITION_CHOICES = ("year", "station")
+
+FLOAT_COLUMNS = [
+    "LATITUDE", "LONGITUDE", "ELEVATION", "TEMP", "DEWP", "SLP", "STP",
+    "VISIB", "WDSP", "MAX", "MIN", "PRCP", "SNDP", "HMD"
+]
+DICTIONARY_COLUMNS = ["STATION", "NAME"]
+UINT32_COLUMNS = ["QC_FLAGS"]  # quality_control bitmask
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for the Parquet dataset (pip install pyarrow)")
+
+
+def _field_type(column):
+    if column in DICTIONARY_COLUMNS:
+        return pa.dictionary(pa.int32(), pa.string())
+    if column == "DATE":
+        return pa.date32()
+    if column in FLOAT_COLUMNS:
+        return pa.float32()
+    if column in UINT32_COLUMNS:
+        return pa.uint32()
+    return pa.string()
+
+
+def widen_float32(values):
+    """
+    Widens float32 values to the float64 nearest to their shortest round-trip
+    decimal (19.333334 rather than 19.33333396911621), i.e. the value a reader of
+    the CSV/JSON output gets. For 1 to 9 significant digits, every value not yet
+    resolved is rounded to that many digits and kept when it round-trips to the
+    same float32; a handful of whole-array passes, no per-value strings.
+    """
+    values = np.asarray(values, dtype=np.float32)
+    wide = values.astype(np.float64)
+    result = wide.copy()
+    pending = np.isfinite(wide) & (wide != 0)
+    exponent = np.floor(np.log10(np.abs(wide, out=np.ones_like(wide), where=pending)))
+    for digits in range(1, 10):
+        rows = np.flatnonzero(pending)
+        if not len(rows):
+            break
+        scale = digits - 1 - exponent[rows]
+        power = 10.0 ** np.abs(scale)
+        positive = scale >= 0
+        # n and 10**k are exact, so n / 10**k is the correctly rounded float64 of the decimal
+        rounded = np.rint(np.where(positive, wide[rows] * power, wide[rows] / power))
+        candidate = np.where(positive, rounded / power, rounded * power)
+        exact = candidate.astype(np.float32) == values[rows]
+        result[rows[exact]] = candidate[exact]
+        pending[rows[exact]] = False
+    return result
+
+
+def build_schema(columns):
+    """Returns the Arrow schema used for the given column order."""
+    _require_pyarrow()
+    return pa.schema([(column, _field_type(column)) for column in columns])
+
+
+def write_metadata(dataset_dir, partition_by):
+    """Records the partitioning of a dataset so readers know its layout."""
+    os.makedirs(dataset_dir, exist_ok=True)
+    with open(os.path.join(dataset_dir, METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump({"format_version": 1, "partition_by": partition_by}, f)
+
+
+def read_metadata(dataset_dir):
+    with open(os.path.join(dataset_dir, METADATA_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_table(table, file_path):
+    """Writes a Parquet file atomically (temp file + rename)."""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = file_path + ".tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, file_path)
+
+
+def _to_table(df):
+    frame = df.copy()
+    for column in DICTIONARY_COLUMNS:
+        if column in frame.columns:
+            frame[column] = frame[column].astype(str)
+    if "FRSHTT" in frame.columns:
+        frame["FRSHTT"] = frame["FRSHTT"].astype("string")
+    return pa.Table.from_pandas(frame, schema=build_schema(list(frame.columns)), preserve_index=False)
+
+
+def write_station(df, dataset_dir, station_id, partition_by="year"):
+    """
+    Writes one station's consolidated DataFrame (DATE as datetime) into the dataset.
+    Existing files for the station in the same partitions are overwritten.
+    """
+    _require_pyarrow()
+    if partition_by not in PARTITION_CHOICES:
+        raise ValueError(f"Unknown partitioning: {partition_by}")
+
+    if partition_by == "station":
+        _write_table(_to_table(df), os.path.join(dataset_dir, f"station={station_id}", f"{station_id}.parquet"))
+        return
+
+    for year, year_df in df.groupby(df["DATE"].dt.year, sort=True):
+        _write_table(_to_table(year_df), os.path.join(dataset_dir, f"year={year}", f"{station_id}.parquet"))
+
+
+def station_files(dataset_dir, station_id):
+    """Returns the station's Parquet files in partition (i.e. chronological for year partitions) order."""
+    filename = f"{station_id}.parquet"
+    return [
+        os.path.join(dataset_dir, partition, filename)
+        for partition in sorted(os.listdir(dataset_dir))
+        if os.path.isfile(os.path.join(dataset_dir, partition, filename))
+    ]
+
+
+def list_stations(dataset_dir):
+    """Returns the sorted station IDs present in the dataset."""
+    stations = set()
+    for partition in os.listdir(dataset_dir):
+        partition_path = os.path.join(dataset_dir, partition)
+        if os.path.isdir(partition_path):
+            stations.update(name[:-8] for name in os.listdir(partition_path) if name.endswith(".parquet"))
+    return sorted(stations)
+
+
+def _read_files(files, columns=None):
+    """Reads and concatenates files; requested columns a file does not have (e.g. QC_FLAGS) are skipped."""
+    if not files:
+        return pd.DataFrame(columns=columns)
+    tables = []
+    for path in files:
+        parquet_file = pq.ParquetFile(path)
+        names = parquet_file.schema_arrow.names
+        tables.append(parquet_file.read(columns=None if columns is None else [c for c in columns if c in names]))
+    table = pa.concat_tables(tables, promote_options="permissive") if len(tables) > 1 else tables[0]
+    return table.to_pandas(date_as_object=False)
+
+
+def read_station(dataset_dir, station_id, columns=None):
+    """Reads all rows of one station, sorted by DATE."""
+    _require_pyarrow()
+    df = _read_files(station_files(dataset_dir, station_id), columns)
+    if "DATE" in df.columns:
+        df = df.sort_values("DATE", kind="stable", ignore_index=True)
+    return df
+
+
+def read_station_head(dataset_dir, station_id, columns=None, nrows=5):
+    """Reads the first rows of a station from its earliest partition only."""
+    _require_pyarrow()
+    files = station_files(dataset_dir, station_id)
+    return _read_files(files[:1], columns).head(nrows)
+
+
+def delete_station(dataset_dir, station_id):
+    """Removes every file of a station from the dataset and returns the removed paths."""
+    removed = []
+    for path in station_files(dataset_dir, station_id):
+        os.remove(path)
+        removed.append(path)
+    return removed
+
+
+def update_first_row_coordinates(dataset_dir, station_id, new_lat, new_lon):
+    """
+    Sets LATITUDE/LONGITUDE of the station's first row (earliest DATE), mirroring
+    what updateloss.py does to row 0 of the CSV. Only the earliest file is rewritten.
+    Returns the previous (lat, lon).
+    """
+    _require_pyarrow()
+    files = station_files(dataset_dir, station_id)
+    if not files:
+        raise FileNotFoundError(f"Station {station_id} not found in {dataset_dir}")
+    df = _read_files(files[:1]).sort_values("DATE", kind="stable", ignore_index=True)
+    old_lat, old_lon = df.loc[0, "LATITUDE"], df.loc[0, "LONGITUDE"]
+    df.loc[0, "LATITUDE"] = float(new_lat)
+    df.loc[0, "LONGITUDE"] = float(new_lon)
+    _write_table(_to_table(df), files[0])
+    return old_lat, old_lon
@@ -0,0 +1,250 @@
+"""
+Stage-level metrics and profiling shared by the pipeline scripts.
+
+Scripts wrap their phases in stages and report what each one handled:
+
+    with instrumentation.stage("read") as stage:
+        ...
+        stage.add(files=1, rows=len(df), bytes=size, bad_rows=dropped)
+
+When a stage ends, its wall time, counters, rows/sec, the time spent in named
+parts (timed("json")) and the peak RSS of the process and of its finished
+worker processes are recorded. After configure(metrics_file=...) every record
+is appended to that file as one JSON line ("-" writes to stderr), followed by
+a "run" record when the script exits. Worker processes have no active stage:
+worker functions fill a new_counters() dict and return it, and the parent adds
+it to its stage.
+
+configure(profile=<stage name or "all">) runs cProfile (or pyinstrument, when
+installed) around the matching stages and writes one profile per stage to
+profile_dir: <script>-<stage>.prof (read with python -m pstats or snakeviz) or
+<script>-<stage>.html for pyinstrument.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import atexit
+import cProfile
+import contextlib
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak memory is then not reported
+    resource = None
+
+try:
+    import pyinstrument
+except ImportError:  # pyinstrument is optional; cProfile is always available
+    pyinstrument = None
+
+COUNTER_NAMES = ("files", "rows", "bytes", "bytes_written", "bad_rows", "errors", "qc_flagged")
+PROFILERS = ("cprofile", "pyinstrument")
+DEFAULT_PROFILE_DIR = "profiles"
+
+
+def peak_memory_mb(who="self"):
+    """Peak resident set size of this process ("self") or of its finished workers ("children"), in MB."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return usage.ru_maxrss / divisor
+
+
+def _round_mb(value):
+    return None if value is None else round(value, 1)
+
+
+def new_counters():
+    """Empty counters, for worker functions that report back to the parent's stage."""
+    return dict.fromkeys(COUNTER_NAMES, 0)
+
+
+class Stage:
+    """Counters and part timings of one running stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.counters = new_counters()
+        self.parts = {}
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+
+    def add(self, counters=None, **counts):
+        """Adds a counters dict and/or keyword counts (files=, rows=, bytes=, bytes_written=, bad_rows=, errors=, qc_flagged=)."""
+        for source in (counters or {}, counts):
+            for key, value in source.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    @contextlib.contextmanager
+    def timed(self, part):
+        """Accumulates the time spent in a named part of the stage (e.g. "parse", "json")."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.parts[part] = self.parts.get(part, 0.0) + time.perf_counter() - start
+
+    def record(self, status):
+        seconds = time.perf_counter() - self._start
+        rows = self.counters.get("rows", 0)
+        return {
+            "event": "stage",
+            "script": _state["script"],
+            "run_id": _state["run_id"],
+            "stage": self.name,
+            "status": status,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "seconds": round(seconds, 4),
+            **self.counters,
+            "rows_per_sec": round(rows / seconds, 1) if rows and seconds > 0 else None,
+            "parts": {part: round(value, 4) for part, value in self.parts.items()},
+            "peak_rss_mb": _round_mb(peak_memory_mb("self")),
+            "peak_children_rss_mb": _round_mb(peak_memory_mb("children")),
+            "pid": os.getpid(),
+        }
+
+
+_state = {
+    "script": os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0],
+    "run_id": uuid.uuid4().hex[:12],
+    "sink": None,
+    "profile": None,
+    "profiler": "cprofile",
+    "profile_dir": DEFAULT_PROFILE_DIR,
+    "started": time.perf_counter(),
+    "stages": 0,
+}
+_stack = []
+_records = []
+
+
+def configure(script, metrics_file=None, profile=None, profiler="cprofile", profile_dir=DEFAULT_PROFILE_DIR):
+    """
+    Sets the script name used in the records, where the JSON lines go (None
+    keeps them in memory only, "-" is stderr) and which stages are profiled.
+    """
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler: {profiler}")
+    if profiler == "pyinstrument" and pyinstrument is None:
+        print("Warning: pyinstrument is not installed (pip install pyinstrument); using cProfile", file=sys.stderr)
+        profiler = "cprofile"
+    if metrics_file == "-":
+        sink = sys.stderr
+    elif metrics_file:
+        sink = open(metrics_file, "a", encoding="utf-8")
+    else:
+        sink = None
+    first = _state["sink"] is None and sink is not None
+    _state.update(script=script, sink=sink, profile=profile, profiler=profiler, profile_dir=profile_dir)
+    if first:
+        atexit.register(_emit_run_record)
+
+
+def add_arguments(parser):
+    """Adds the --metrics / --profile options shared by the pipeline scripts."""
+    parser.add_argument("--metrics", default=None, metavar="FILE",
+                        help="Append per-stage metrics as JSON lines to FILE ('-' for stderr)")
+    parser.add_argument("--profile", default=None, metavar="STAGE",
+                        help="Profile the named stage ('all' for every stage) and write the profile to --profile-dir")
+    parser.add_argument("--profiler", choices=PROFILERS, default="cprofile",
+                        help="Profiler used by --profile (pyinstrument must be installed)")
+    parser.add_argument("--profile-dir", default=DEFAULT_PROFILE_DIR,
+                        help=f"Directory that receives the profiles (default: {DEFAULT_PROFILE_DIR})")
+
+
+def configure_from_args(script, args):
+    configure(script, args.metrics, args.profile, args.profiler, args.profile_dir)
+
+
+def _emit(record):
+    _records.append(record)
+    sink = _state["sink"]
+    if sink is not None:
+        sink.write(json.dumps(record, ensure_ascii=False) + "\n")
+        sink.flush()
+
+
+def _emit_run_record():
+    _emit({
+        "event": "run",
+        "script": _state["script"],
+        "run_id": _state["run_id"],
+        "seconds": round(time.perf_counter() - _state["started"], 4),
+        "stages": _state["stages"],
+        "peak_rss_mb": _round_mb(peak_memory_mb("self")),
+        "peak_children_rss_mb": _round_mb(peak_memory_mb("children")),
+        "argv": sys.argv[1:],
+    })
+
+
+def records():
+    """Records emitted so far in this process (also kept when no metrics file is configured)."""
+    return list(_records)
+
+
+def _start_profiler(name):
+    if _state["profile"] not in (name, "all") or any(getattr(s, "profiler", None) for s in _stack):
+        return None
+    if _state["profiler"] == "pyinstrument":
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler
+
+
+def _stop_profiler(profiler, name):
+    os.makedirs(_state["profile_dir"], exist_ok=True)
+    base = os.path.join(_state["profile_dir"], f"{_state['script']}-{name}")
+    if _state["profiler"] == "pyinstrument":
+        profiler.stop()
+        path = base + ".html"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(profiler.output_html())
+    else:
+        profiler.disable()
+        path = base + ".prof"
+        profiler.dump_stats(path)
+    print(f"Profile of stage '{name}' written to {path}", file=sys.stderr)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Measures a stage; yields the Stage so the caller can add counters and part timings."""
+    current = Stage(name)
+    current.profiler = _start_profiler(name)
+    _stack.append(current)
+    status = "error"
+    try:
+        yield current
+        status = "ok"
+    finally:
+        _stack.pop()
+        if current.profiler is not None:
+            _stop_profiler(current.profiler, name)
+        _state["stages"] += 1
+        _emit(current.record(status))
+
+
+def current_stage():
+    """The innermost running stage of this process, or None."""
+    return _stack[-1] if _stack else None
+
+
+def count(counters=None, **counts):
+    """Adds counts to the current stage; does nothing outside a stage (e.g. in worker processes)."""
+    if _stack:
+        _stack[-1].add(counters, **counts)
+
+
+def timed(part):
+    """Stage.timed() on the current stage; a no-op outside a stage."""
+    if _stack:
+        return _stack[-1].timed(part)
+    return contextlib.nullcontext()
@@ -2,174 +2,501 @@ import pandas as pd
 import numpy as np
 import os
 import json # Added for JSON output
+import argparse
+import glob
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import columnar_store
+import instrumentation
+import quality_control
+import static_compress
+import station_registry
 
 # --- Configuration ---
 INPUT_BASE_DIR = "cn_gsod"
 OUTPUT_BASE_DIR = "processed_cn_gsod"
+# Output formats: "text" writes CSV + JSON per station, "parquet" writes a columnar dataset, "both" writes all
+OUTPUT_FORMATS = ("text", "parquet", "both")
+PARQUET_OUTPUT_DIR = columnar_store.PARQUET_OUTPUT_DIR
+# Size budget shared with process_weather_data.py (repository root)
+SIZE_BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, static_compress.SIZE_BUDGET_FILE)
+# Station metadata registry (repository root), joined when each station is consolidated
+STATION_REGISTRY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, station_registry.REGISTRY_FILE)
+FINAL_COLUMNS_ORDER = [
+    "STATION", "DATE", "LATITUDE", "LONGITUDE", "ELEVATION", "NAME", 
+    "TEMP", "DEWP", "SLP", "STP", "VISIB", "WDSP", 
+    "MAX", "MIN", "PRCP", "SNDP", "FRSHTT", "HMD"
+]
 # Official GSOD missing value indicators by field type
 MISSING_VALUE_INDICATORS = ['99.99', '999.9', '9999.9', '9999.99']
 
+# Read schema: only the columns that are kept are parsed, with their final dtypes.
+# The *_ATTRIBUTES flags, MXSPD and GUST are never loaded.
+FLOAT_COLUMNS = [
+    "LATITUDE", "LONGITUDE", "ELEVATION", "TEMP", "DEWP", "SLP", "STP",
+    "VISIB", "WDSP", "MAX", "MIN", "PRCP", "SNDP"
+]
+CATEGORY_COLUMNS = ["STATION", "NAME"]
+READ_DTYPES = {
+    **{col: np.float32 for col in FLOAT_COLUMNS},
+    **{col: "category" for col in CATEGORY_COLUMNS},
+    "FRSHTT": str, # Keep FRSHTT as string
+}
+
 # --- Conversion Functions ---
-def fahrenheit_to_celsius(f_temp):
+# Each takes a numeric array (or Series) and returns a float32 array. The result
+# is computed in a single output buffer; pass out=values to convert in place.
+def _linear_convert(values, offset, scale, out=None):
+    values = np.asarray(values, dtype=np.float32)
+    if out is None:
+        out = np.empty_like(values)
+    # The ufunc loops run in float64 (buffered, no full-size temporaries) so each
+    # step rounds to float32 only once
+    np.subtract(values, offset, out=out, dtype=np.float64, casting='same_kind')
+    np.multiply(out, scale, out=out, dtype=np.float64, casting='same_kind')
+    return out
+
+def fahrenheit_to_celsius(f_temp, out=None):
     """Converts Fahrenheit to Celsius."""
-    return (pd.to_numeric(f_temp, errors='coerce') - 32.0) * 5.0 / 9.0
+    return _linear_convert(f_temp, 32.0, 5.0 / 9.0, out)
 
-def inches_to_mm(inches):
+def inches_to_mm(inches, out=None):
     """Converts inches to millimeters."""
-    return pd.to_numeric(inches, errors='coerce') * 25.4
+    return _linear_convert(inches, 0.0, 25.4, out)
 
-def miles_to_meters(miles):
+def miles_to_meters(miles, out=None):
     """Converts miles to meters. GSOD VISIB is typically in miles."""
-    return pd.to_numeric(miles, errors='coerce') * 1609.34
+    return _linear_convert(miles, 0.0, 1609.34, out)
 
-def knots_to_mps(knots):
+def knots_to_mps(knots, out=None):
     """Converts knots to meters per second."""
-    return pd.to_numeric(knots, errors='coerce') * 0.514444
+    return _linear_convert(knots, 0.0, 0.514444, out)
 
 def calculate_relative_humidity(temp_c_series, dewp_c_series):
     """
     Calculates relative humidity from temperature and dew point in Celsius.
     Uses the Magnus-Tetens formula approximation.
     """
-    # Ensure inputs are numeric
-    temp_c = pd.to_numeric(temp_c_series, errors='coerce')
-    dewp_c = pd.to_numeric(dewp_c_series, errors='coerce')
+    temp_c = np.asarray(temp_c_series, dtype=np.float32)
+    dewp_c = np.asarray(dewp_c_series, dtype=np.float32)
+
+    # e(dewp) / e(temp) = exp(17.625 * (dewp / (243.04 + dewp) - temp / (243.04 + temp))),
+    # evaluated in two buffers
+    with np.errstate(all='ignore'):
+        rh = np.add(dewp_c, np.float32(243.04))
+        np.divide(dewp_c, rh, out=rh)
+        tmp = np.add(temp_c, np.float32(243.04))
+        np.divide(temp_c, tmp, out=tmp)
+        np.subtract(rh, tmp, out=rh)
+        np.multiply(rh, np.float32(17.625), out=rh)
+        np.exp(rh, out=rh)
+        np.multiply(rh, np.float32(100), out=rh)
 
-    # Saturation vapor pressure at dew point
-    e_dewp = 0.61094 * np.exp((17.625 * dewp_c) / (243.04 + dewp_c))
-    # Saturation vapor pressure at air temperature
-    e_temp = 0.61094 * np.exp((17.625 * temp_c) / (243.04 + temp_c))
-    
-    rh = 100 * (e_dewp / e_temp)
-    
     # Clip values to the valid range [0, 100] and handle NaNs
-    rh = rh.replace([np.inf, -np.inf], np.nan)
-    return rh.clip(0, 100)
+    rh[np.isinf(rh)] = np.nan
+    return np.clip(rh, 0, 100, out=rh)
 
-def process_file(file_path):
-    """Reads and processes a single GSOD CSV file."""
+def _read_gsod_csv(file_path):
+    """
+    Reads the kept GSOD columns with their final dtypes and DATE parsed as datetime.
+    Files with stray non-numeric values fall back to string parsing + coercion.
+    """
+    read_kwargs = dict(skipinitialspace=True,
+                       na_values=MISSING_VALUE_INDICATORS,
+                       usecols=lambda col: col in READ_DTYPES or col == "DATE",
+                       parse_dates=["DATE"],
+                       date_format="%Y-%m-%d")
+    try:
+        return pd.read_csv(file_path, dtype=READ_DTYPES, **read_kwargs)
+    except ValueError:
+        df = pd.read_csv(file_path, dtype=str, **read_kwargs)
+        for col in FLOAT_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce').astype(np.float32)
+        for col in CATEGORY_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype("category")
+        return df
+
+def process_file(file_path, counters=None):
+    """
+    Reads and processes a single GSOD CSV file.
+    counters (see instrumentation.new_counters) receives the file, its bytes,
+    the rows read, the rows dropped for an unparseable DATE and read errors.
+    """
+    if counters is None:
+        counters = instrumentation.new_counters()
+    counters["files"] += 1
     try:
-        df = pd.read_csv(file_path, 
-                         skipinitialspace=True, 
-                         na_values=MISSING_VALUE_INDICATORS,
-                         dtype={'FRSHTT': str}) # Keep FRSHTT as string
+        counters["bytes"] += os.path.getsize(file_path)
+        df = _read_gsod_csv(file_path)
+        counters["rows"] += len(df)
         
         if df.empty:
             print(f"Warning: Empty file skipped: {file_path}")
             return None
 
-        # Unit Conversions
-        df['TEMP'] = fahrenheit_to_celsius(df.get('TEMP'))
-        df['DEWP'] = fahrenheit_to_celsius(df.get('DEWP'))
-        df['MAX'] = fahrenheit_to_celsius(df.get('MAX'))
-        df['MIN'] = fahrenheit_to_celsius(df.get('MIN'))
-        
-        df['PRCP'] = inches_to_mm(df.get('PRCP'))
-        df['SNDP'] = inches_to_mm(df.get('SNDP')) # Assuming SNDP is also in inches like PRCP
-        
-        df['VISIB'] = miles_to_meters(df.get('VISIB'))
-        df['WDSP'] = knots_to_mps(df.get('WDSP'))
+        # DATE is parsed by read_csv; rows whose date could not be parsed are dropped
+        if not pd.api.types.is_datetime64_any_dtype(df['DATE']):
+            df['DATE'] = pd.to_datetime(df['DATE'], errors='coerce')
+        if df['DATE'].isna().any():
+            counters["bad_rows"] += int(df['DATE'].isna().sum())
+            df = df[df['DATE'].notna()]
 
-        # Calculate Relative Humidity
-        if 'TEMP' in df.columns and 'DEWP' in df.columns:
-            df['HMD'] = calculate_relative_humidity(df['TEMP'], df['DEWP'])
-        else:
-            df['HMD'] = np.nan
-            
-        # Drop unwanted columns
-        cols_to_drop = [col for col in df.columns if col.endswith('_ATTRIBUTES')]
-        cols_to_drop.extend(['MXSPD', 'GUST'])
-        
-        existing_cols_to_drop = [col for col in cols_to_drop if col in df.columns]
-        df.drop(columns=existing_cols_to_drop, inplace=True)
+        columns = {col: df[col].to_numpy() for col in df.columns}
+        nan_column = np.full(len(df), np.nan, dtype=np.float32)
+        def numeric(col):
+            return columns.get(col, nan_column)
 
-        # Convert DATE column to datetime objects
-        df['DATE'] = pd.to_datetime(df['DATE'], errors='coerce')
-        df.dropna(subset=['DATE'], inplace=True) # Remove rows where date conversion failed
+        # Unit Conversions (one float32 buffer per converted column)
+        for col in ('TEMP', 'DEWP', 'MAX', 'MIN'):
+            columns[col] = fahrenheit_to_celsius(numeric(col))
+        for col in ('PRCP', 'SNDP'): # Assuming SNDP is also in inches like PRCP
+            columns[col] = inches_to_mm(numeric(col))
+        columns['VISIB'] = miles_to_meters(numeric('VISIB'))
+        columns['WDSP'] = knots_to_mps(numeric('WDSP'))
 
-        return df
+        # Calculate Relative Humidity
+        columns['HMD'] = calculate_relative_humidity(columns['TEMP'], columns['DEWP'])
+
+        return pd.DataFrame(columns, index=df.index, copy=False)
 
     except Exception as e:
+        counters["errors"] += 1
         print(f"Error processing file {file_path}: {e}")
         return None
 
-def main():
+def process_year_directory(year_path, counters=None):
+    """
+    Processes every CSV file in one cn_gsod/<year>/ directory.
+    Returns a dict mapping station_id to the list of processed DataFrames,
+    in sorted filename order.
+    """
+    year_station_data = {}
+    for filename in sorted(os.listdir(year_path)):
+        if filename.lower().endswith('.csv'):
+            file_path = os.path.join(year_path, filename)
+            # print(f"  Processing file: {filename}")
+            processed_df = process_file(file_path, counters)
+
+            if processed_df is not None and not processed_df.empty:
+                # Assuming 'STATION' column exists and is consistent
+                station_id = str(processed_df['STATION'].iloc[0]) # Ensure station_id is a string
+                if station_id not in year_station_data:
+                    year_station_data[station_id] = []
+                year_station_data[station_id].append(processed_df)
+    return year_station_data
+
+def _process_year_directory_counted(year_path):
+    """Worker variant of process_year_directory that also returns its counters."""
+    counters = instrumentation.new_counters()
+    return process_year_directory(year_path, counters), counters
+
+def group_files_by_station(input_dir=INPUT_BASE_DIR):
+    """
+    Returns {station_file_stem: [csv paths]} across all year directories.
+    GSOD files are named <STATIONID>.csv, so the stem identifies the station;
+    each list is in sorted year order and stations are returned in sorted order.
+    """
+    station_files = {}
+    for year_folder in sorted(os.listdir(input_dir)):
+        year_path = os.path.join(input_dir, year_folder)
+        if not os.path.isdir(year_path):
+            continue
+        for filename in sorted(os.listdir(year_path)):
+            if filename.lower().endswith('.csv'):
+                station_files.setdefault(filename[:-4], []).append(os.path.join(year_path, filename))
+    return dict(sorted(station_files.items()))
+
+def process_station_files(file_paths, output_format="text", parquet_dir=PARQUET_OUTPUT_DIR, partition_by="year",
+                          compress_encodings=(), registry_path=None, qc=True, counters=None):
+    """
+    Processes, consolidates and saves all year files of one station, then drops them.
+    registry_path is the station registry joined during consolidation (None: no join);
+    qc adds the quality control flags (see consolidate_station).
+    Returns (station_id, row_count, in-memory bytes of the consolidated frame),
+    or None when no file produced data.
+    """
+    df_list = []
+    for file_path in file_paths:
+        processed_df = process_file(file_path, counters)
+        if processed_df is not None and not processed_df.empty:
+            df_list.append(processed_df)
+    if not df_list:
+        return None
+
+    station_id = str(df_list[0]['STATION'].iloc[0]) # Same station ID as the in-memory mode
+    combined_df = consolidate_station(df_list, station_registry.load(registry_path), station_id, qc, counters)
+    del df_list
+    save_station(station_id, combined_df, output_format, parquet_dir, partition_by, compress_encodings)
+    return station_id, len(combined_df), int(combined_df.memory_usage(deep=True).sum())
+
+def _process_station_files_star(args):
+    """Returns (process_station_files result, counters) for one task tuple."""
+    counters = instrumentation.new_counters()
+    return process_station_files(*args, counters=counters), counters
+
+def report_output_sizes(output_format, size_budget=SIZE_BUDGET_FILE):
+    """Prints the size report of the per-station JSON files and returns the size budget violations."""
+    if output_format not in ("text", "both"):
+        return []
+    paths = sorted(glob.glob(os.path.join(OUTPUT_BASE_DIR, "*.json")))
+    with instrumentation.stage("size_report") as stage:
+        stage.add(files=len(paths))
+        return static_compress.size_report(paths, static_compress.load_budget(size_budget), "Station JSON sizes")
+
+def main_streaming(workers=1, output_format="text", parquet_dir=PARQUET_OUTPUT_DIR, partition_by="year",
+                   compress_encodings=(), size_budget=SIZE_BUDGET_FILE, registry_path=STATION_REGISTRY_FILE, qc=True):
+    """
+    Station-at-a-time variant of main(): the input files are grouped by station
+    across all years, and each station is processed, consolidated and written
+    before the next one is loaded. Peak memory is bounded by the largest station
+    (times the worker count) instead of the whole dataset.
+    """
     if not os.path.exists(INPUT_BASE_DIR):
         print(f"Input directory not found: {INPUT_BASE_DIR}")
         return
 
-    if not os.path.exists(OUTPUT_BASE_DIR):
+    if output_format in ("text", "both") and not os.path.exists(OUTPUT_BASE_DIR):
+        os.makedirs(OUTPUT_BASE_DIR)
+        print(f"Created output directory: {OUTPUT_BASE_DIR}")
+    if output_format in ("parquet", "both"):
+        columnar_store.write_metadata(parquet_dir, partition_by)
+
+    station_files = group_files_by_station(INPUT_BASE_DIR)
+    print(f"Starting streaming GSOD data processing for {len(station_files)} stations...")
+    report_registry(registry_path)
+    # Workers load the registry once per process (station_registry.load caches it)
+    tasks = [(file_paths, output_format, parquet_dir, partition_by, compress_encodings, registry_path, qc)
+             for file_paths in station_files.values()]
+
+    saved = 0
+    total_rows = 0
+    largest = None
+    if workers > 1:
+        print(f"Using {workers} worker processes")
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(_process_station_files_star, tasks, chunksize=4)
+    else:
+        executor = None
+        results = map(_process_station_files_star, tasks)
+    try:
+        with instrumentation.stage("stations") as stage:
+            for result, counters in results:
+                stage.add(counters)
+                if result is None:
+                    continue
+                station_id, rows, nbytes = result
+                print(f"  Saved data for station: {station_id} ({rows} rows)")
+                saved += 1
+                total_rows += rows
+                if largest is None or nbytes > largest[2]:
+                    largest = result
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    print("\nProcessing complete.")
+    print(f"Stations saved: {saved}, rows written: {total_rows}")
+    if largest is not None:
+        print(f"Largest station: {largest[0]} ({largest[1]} rows, {largest[2] / 1024 / 1024:.1f} MB in memory)")
+    peak = instrumentation.peak_memory_mb()
+    if peak is not None:
+        summary = f"Peak memory (RSS): {peak:.1f} MB"
+        if workers > 1:
+            summary += f", largest worker: {instrumentation.peak_memory_mb('children'):.1f} MB"
+        print(summary)
+    return report_output_sizes(output_format, size_budget)
+
+def main(workers=1, output_format="text", parquet_dir=PARQUET_OUTPUT_DIR, partition_by="year",
+         compress_encodings=(), size_budget=SIZE_BUDGET_FILE, registry_path=STATION_REGISTRY_FILE, qc=True):
+    """
+    Processes all years under INPUT_BASE_DIR and writes one CSV/JSON pair per station.
+    workers > 1 parses year directories in a process pool; the per-year results
+    are merged in sorted year order, so the output does not depend on the
+    worker count or on the order in which workers finish.
+    output_format "parquet"/"both" also writes a columnar dataset to parquet_dir,
+    partitioned by year or by station (see columnar_store).
+    compress_encodings ("gzip"/"brotli") writes pre-compressed siblings of every
+    station JSON file. registry_path is the station registry whose canonical
+    metadata replaces each registered station's coordinates, name and elevation
+    (None: no join). qc adds the QC_FLAGS column of quality_control to every
+    station. Returns the size budget violations (see static_compress).
+    """
+    if not os.path.exists(INPUT_BASE_DIR):
+        print(f"Input directory not found: {INPUT_BASE_DIR}")
+        return
+
+    if output_format in ("text", "both") and not os.path.exists(OUTPUT_BASE_DIR):
         os.makedirs(OUTPUT_BASE_DIR)
         print(f"Created output directory: {OUTPUT_BASE_DIR}")
 
     all_station_data = {} # Dictionary to hold DataFrames for each station
 
+    year_folders = [
+        year_folder for year_folder in sorted(os.listdir(INPUT_BASE_DIR))
+        if os.path.isdir(os.path.join(INPUT_BASE_DIR, year_folder))
+    ]
+    year_paths = [os.path.join(INPUT_BASE_DIR, year_folder) for year_folder in year_folders]
+
     print("Starting GSOD data processing...")
-    for year_folder in sorted(os.listdir(INPUT_BASE_DIR)):
-        year_path = os.path.join(INPUT_BASE_DIR, year_folder)
-        if os.path.isdir(year_path):
-            print(f"Processing year: {year_folder}")
-            for filename in os.listdir(year_path):
-                if filename.lower().endswith('.csv'):
-                    file_path = os.path.join(year_path, filename)
-                    # print(f"  Processing file: {filename}")
-                    processed_df = process_file(file_path)
-                    
-                    if processed_df is not None and not processed_df.empty:
-                        # Assuming 'STATION' column exists and is consistent
-                        station_id = str(processed_df['STATION'].iloc[0]) # Ensure station_id is a string
-                        if station_id not in all_station_data:
-                            all_station_data[station_id] = []
-                        all_station_data[station_id].append(processed_df)
+    with instrumentation.stage("read") as stage:
+        if workers > 1:
+            print(f"Using {workers} worker processes")
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                year_results = executor.map(_process_year_directory_counted, year_paths)
+                for year_folder, (year_station_data, counters) in zip(year_folders, year_results):
+                    print(f"Processed year: {year_folder}")
+                    stage.add(counters)
+                    for station_id, df_list in year_station_data.items():
+                        all_station_data.setdefault(station_id, []).extend(df_list)
+        else:
+            for year_folder, year_path in zip(year_folders, year_paths):
+                print(f"Processing year: {year_folder}")
+                for station_id, df_list in process_year_directory(year_path, stage.counters).items():
+                    all_station_data.setdefault(station_id, []).extend(df_list)
     
     print("\nConsolidating and saving data for each station...")
-    final_columns_order = [
-        "STATION", "DATE", "LATITUDE", "LONGITUDE", "ELEVATION", "NAME", 
-        "TEMP", "DEWP", "SLP", "STP", "VISIB", "WDSP", 
-        "MAX", "MIN", "PRCP", "SNDP", "FRSHTT", "HMD"
-    ]
+    registry = report_registry(registry_path)
+    if output_format in ("parquet", "both"):
+        columnar_store.write_metadata(parquet_dir, partition_by)
 
-    for station_id, df_list in all_station_data.items():
-        if not df_list:
-            continue
-        
-        print(f"  Saving data for station: {station_id}")
-        combined_df = pd.concat(df_list, ignore_index=True)
-        
-        # Sort by date
-        combined_df.sort_values(by='DATE', inplace=True)
-        
-        # Ensure all final columns exist, fill with NaN if not, and set order
-        for col in final_columns_order:
-            if col not in combined_df.columns:
-                combined_df[col] = np.nan
-        combined_df = combined_df[final_columns_order]
+    with instrumentation.stage("write") as stage:
+        for station_id, df_list in all_station_data.items():
+            if not df_list:
+                continue
 
-        # Convert DATE to string for JSON serialization
+            print(f"  Saving data for station: {station_id}")
+            with stage.timed("consolidate"):
+                combined_df = consolidate_station(df_list, registry, station_id, qc, stage.counters)
+            stage.add(files=1, rows=len(combined_df))
+            save_station(station_id, combined_df, output_format, parquet_dir, partition_by, compress_encodings)
+            
+    print("\nProcessing complete.")
+    peak = instrumentation.peak_memory_mb()
+    if peak is not None:
+        print(f"Peak memory (RSS): {peak:.1f} MB")
+    return report_output_sizes(output_format, size_budget)
+
+def report_registry(registry_path):
+    """Loads the station registry and prints how many stations it resolves."""
+    registry = station_registry.load(registry_path)
+    if len(registry):
+        print(f"Station registry {registry_path}: {len(registry)} stations resolved at ingest")
+    return registry
+
+def consolidate_station(df_list, registry=None, station_id=None, qc=False, counters=None):
+    """
+    Concatenates one station's yearly DataFrames, sorts by date and applies the final column order.
+    When the station is in the registry, its canonical metadata replaces that of every row.
+    qc runs the quality control checks over the station's full, sorted series and
+    appends their bitmask as the last column; counters["qc_flagged"] receives the flagged rows.
+    """
+    combined_df = pd.concat(df_list, ignore_index=True)
+    if registry is not None:
+        registry.apply(combined_df, station_id)
+    
+    # Sort by date
+    combined_df.sort_values(by='DATE', inplace=True)
+    
+    # Ensure all final columns exist, fill with NaN if not, and set order
+    for col in FINAL_COLUMNS_ORDER:
+        if col not in combined_df.columns:
+            combined_df[col] = np.nan
+    if not qc:
+        return combined_df[FINAL_COLUMNS_ORDER]
+
+    combined_df = combined_df[FINAL_COLUMNS_ORDER].copy()
+    with instrumentation.timed("qc"):
+        flagged = quality_control.apply(combined_df)
+    if counters is not None:
+        counters["qc_flagged"] += flagged
+    return combined_df
+
+def save_station(station_id, combined_df, output_format="text", parquet_dir=PARQUET_OUTPUT_DIR, partition_by="year",
+                 compress_encodings=()):
+    """Writes a consolidated station DataFrame as CSV + JSON and/or into the Parquet dataset."""
+    if output_format in ("parquet", "both"):
+        try:
+            with instrumentation.timed("parquet"):
+                columnar_store.write_station(combined_df, parquet_dir, station_id, partition_by)
+        except Exception as e:
+            instrumentation.count(errors=1)
+            print(f"Error saving Parquet data for station {station_id}: {e}")
+
+    if output_format not in ("text", "both"):
+        return
+
+    # Convert DATE to string for JSON serialization
+    with instrumentation.timed("json"):
         json_df = combined_df.copy()
         json_df['DATE'] = json_df['DATE'].dt.strftime('%Y-%m-%d')
 
+        # float32 columns are widened through their shortest repr, so JSON gets 19.333334
+        # rather than the float64 expansion 19.33333396911621
+        for col in json_df.columns[json_df.dtypes == np.float32]:
+            json_df[col] = columnar_store.widen_float32(json_df[col].to_numpy())
+
         # Replace NaN with None for JSON compatibility
         json_df = json_df.replace({np.nan: None})
 
-        # --- Save CSV ---
-        output_csv_file_path = os.path.join(OUTPUT_BASE_DIR, f"{station_id}.csv")
-        try:
+    # --- Save CSV ---
+    output_csv_file_path = os.path.join(OUTPUT_BASE_DIR, f"{station_id}.csv")
+    try:
+        with instrumentation.timed("csv"):
             combined_df.to_csv(output_csv_file_path, index=False, date_format='%Y-%m-%d')
-        except Exception as e:
-            print(f"Error saving CSV file {output_csv_file_path}: {e}")
+        instrumentation.count(bytes_written=os.path.getsize(output_csv_file_path))
+    except Exception as e:
+        instrumentation.count(errors=1)
+        print(f"Error saving CSV file {output_csv_file_path}: {e}")
 
-        # --- Save JSON ---
-        output_json_file_path = os.path.join(OUTPUT_BASE_DIR, f"{station_id}.json")
-        try:
+    # --- Save JSON ---
+    output_json_file_path = os.path.join(OUTPUT_BASE_DIR, f"{station_id}.json")
+    try:
+        with instrumentation.timed("json"):
             # Convert DataFrame to a list of dictionaries (records orient)
             records = json_df.to_dict(orient='records')
             with open(output_json_file_path, 'w', encoding='utf-8') as f:
                 json.dump(records, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            print(f"Error saving JSON file {output_json_file_path}: {e}")
-            
-    print("\nProcessing complete.")
+        instrumentation.count(bytes_written=os.path.getsize(output_json_file_path))
+        # Also removes stale .gz/.br siblings when compression is off
+        with instrumentation.timed("compress"):
+            static_compress.compress_file(output_json_file_path, compress_encodings)
+    except Exception as e:
+        instrumentation.count(errors=1)
+        print(f"Error saving JSON file {output_json_file_path}: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Convert raw GSOD CSV files into per-station CSV/JSON files.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes used to parse year directories (default: 1)")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default="text",
+                        help="text: CSV + JSON per station (default); parquet: columnar dataset; both: all outputs")
+    parser.add_argument("--parquet-dir", default=PARQUET_OUTPUT_DIR,
+                        help=f"Output directory of the Parquet dataset (default: {PARQUET_OUTPUT_DIR})")
+    parser.add_argument("--partition-by", choices=columnar_store.PARTITION_CHOICES, default="year",
+                        help="Partition the Parquet dataset by year (default) or by station")
+    parser.add_argument("--stream", action="store_true",
+                        help="Process one station at a time across all years to cap memory use")
+    parser.add_argument("--compress", choices=static_compress.COMPRESS_CHOICES, default="none",
+                        help="Write pre-compressed .gz/.br siblings of each station JSON file (brotli needs the brotli package)")
+    parser.add_argument("--size-budget", default=SIZE_BUDGET_FILE,
+                        help="Size budget file; the run fails when a JSON file exceeds its budget (default: size_budget.json)")
+    parser.add_argument("--station-registry", default=STATION_REGISTRY_FILE,
+                        help="Station registry whose canonical coordinates/name/elevation are applied at ingest (default: station_registry.json)")
+    parser.add_argument("--no-station-registry", action="store_true",
+                        help="Keep the metadata of the raw rows")
+    parser.add_argument("--no-qc", action="store_true",
+                        help="Skip the quality control checks (no QC_FLAGS column)")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.configure_from_args("process", args)
+    run = main_streaming if args.stream else main
+    violations = run(workers=args.workers, output_format=args.output_format,
+                     parquet_dir=args.parquet_dir, partition_by=args.partition_by,
+                     compress_encodings=static_compress.encodings_for(args.compress),
+                     size_budget=args.size_budget,
+                     registry_path=None if args.no_station_registry else args.station_registry,
+                     qc=not args.no_qc)
+    if violations:
+        sys.exit(1)
\ No newline at end of file
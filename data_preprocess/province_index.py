@@ -0,0 +1,129 @@
+"""
+Offline station -> province assignment.
+
+Loads a province boundary GeoJSON (the DataV/Aliyun 100000_full.json that the
+frontend displays) and answers point-in-province queries through a uniform
+grid index: every polygon part is registered in the grid cells its bounding
+box overlaps, so a query only runs the ray-casting test on the few parts whose
+box contains the point. Results follow the frontend's former
+getProvinceByGeoData: features are tested in file order, holes are excluded and
+the Aliyun names are mapped to the short names used in the app.
+"""
+import json
+import math
+
+import numpy as np
+
+PROVINCE_GEOJSON = "china_provinces.json"
+PROVINCE_SOURCE_URL = "https://geo.datav.aliyun.com/areas_v3/bound/100000_full.json"
+UNKNOWN_PROVINCE = "未知"
+DEFAULT_CELL_SIZE = 1.0  # degrees
+
+PROVINCE_NAME_MAPPING = {
+    "北京市": "北京", "上海市": "上海", "天津市": "天津", "重庆市": "重庆",
+    "黑龙江省": "黑龙江", "吉林省": "吉林", "辽宁省": "辽宁", "河北省": "河北",
+    "河南省": "河南", "山东省": "山东", "山西省": "山西", "江苏省": "江苏",
+    "浙江省": "浙江", "安徽省": "安徽", "福建省": "福建", "江西省": "江西",
+    "湖北省": "湖北", "湖南省": "湖南", "广东省": "广东", "广西壮族自治区": "广西",
+    "海南省": "海南", "四川省": "四川", "贵州省": "贵州", "云南省": "云南",
+    "陕西省": "陕西", "甘肃省": "甘肃", "青海省": "青海", "内蒙古自治区": "内蒙古",
+    "新疆维吾尔自治区": "新疆", "西藏自治区": "西藏", "宁夏回族自治区": "宁夏",
+    "台湾省": "台湾", "香港特别行政区": "香港", "澳门特别行政区": "澳门",
+}
+
+
+def map_province_name(name):
+    """Maps an Aliyun province name (e.g. 广东省) to the app's short name (广东)."""
+    return PROVINCE_NAME_MAPPING.get(name, name)
+
+
+def _ring_edges(ring):
+    """Returns (xi, yi, xj, yj) edge arrays of a ring, with j = i - 1 as in the ray-casting loop."""
+    coords = np.asarray(ring, dtype=np.float64)[:, :2]
+    xi, yi = coords[:, 0], coords[:, 1]
+    return xi, yi, np.roll(xi, 1), np.roll(yi, 1)
+
+
+def _point_in_ring(x, y, edges):
+    """Ray casting over all edges of one ring at once (same arithmetic as the JS pointInPolygon)."""
+    xi, yi, xj, yj = edges
+    crosses = (yi > y) != (yj > y)
+    if not crosses.any():
+        return False
+    xi, yi, xj, yj = xi[crosses], yi[crosses], xj[crosses], yj[crosses]
+    return bool(np.count_nonzero(x < (xj - xi) * (y - yi) / (yj - yi) + xi) & 1)
+
+
+def _geometry_polygons(geometry):
+    if not geometry:
+        return []
+    if geometry.get("type") == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry.get("type") == "MultiPolygon":
+        return geometry["coordinates"]
+    return []
+
+
+class ProvinceIndex:
+    """Grid-indexed point-in-province lookup over the features of a boundary GeoJSON."""
+
+    def __init__(self, features, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.names = []
+        self.parts = []  # (feature number, bbox, [ring edges]); outer ring first
+        self.grid = {}
+
+        for feature in features:
+            polygons = _geometry_polygons(feature.get("geometry"))
+            if not polygons:
+                continue
+            feature_number = len(self.names)
+            self.names.append(map_province_name(feature.get("properties", {}).get("name", "")))
+            for polygon in polygons:
+                if not polygon or len(polygon[0]) < 3:
+                    continue
+                rings = [_ring_edges(ring) for ring in polygon if len(ring) >= 3]
+                xs, ys = rings[0][0], rings[0][1]
+                bbox = (xs.min(), ys.min(), xs.max(), ys.max())
+                part_number = len(self.parts)
+                self.parts.append((feature_number, bbox, rings))
+                for cell in self._cells(bbox):
+                    self.grid.setdefault(cell, []).append(part_number)
+
+    @classmethod
+    def from_geojson(cls, path, cell_size=DEFAULT_CELL_SIZE):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f).get("features", []), cell_size)
+
+    def _cell(self, x, y):
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def _cells(self, bbox):
+        min_cx, min_cy = self._cell(bbox[0], bbox[1])
+        max_cx, max_cy = self._cell(bbox[2], bbox[3])
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                yield cx, cy
+
+    def lookup(self, lat, lng):
+        """Returns the province containing (lat, lng), or UNKNOWN_PROVINCE."""
+        if lat is None or lng is None or not (math.isfinite(lat) and math.isfinite(lng)):
+            return UNKNOWN_PROVINCE
+        x, y = lng, lat  # GeoJSON uses [lng, lat]
+        # Parts are registered in feature order, so the first hit is the first containing feature
+        for part_number in self.grid.get(self._cell(x, y), ()):
+            feature_number, (min_x, min_y, max_x, max_y), rings = self.parts[part_number]
+            if not (min_x <= x <= max_x and min_y <= y <= max_y):
+                continue
+            if _point_in_ring(x, y, rings[0]) and not any(_point_in_ring(x, y, hole) for hole in rings[1:]):
+                return self.names[feature_number]
+        return UNKNOWN_PROVINCE
+
+    def lookup_many(self, lats, lngs):
+        """Looks up many points; each distinct coordinate pair is tested only once."""
+        coords = np.column_stack([np.asarray(lats, dtype=np.float64), np.asarray(lngs, dtype=np.float64)])
+        if len(coords) == 0:
+            return np.array([], dtype=object)
+        unique_coords, inverse = np.unique(coords, axis=0, return_inverse=True)
+        names = np.array([self.lookup(lat, lng) for lat, lng in unique_coords], dtype=object)
+        return names[inverse.reshape(-1)]
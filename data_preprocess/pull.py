@@ -1,34 +1,102 @@
-import requests
-import bs4
+import asyncio
 import os
-from urllib.parse import urljoin, urlparse
+import re
+import json
+import html
+import hashlib
+from datetime import datetime, timezone
+from email.utils import formatdate
+from urllib.parse import urlparse
 import time
-import multiprocessing # 导入 multiprocessing 模块
+import argparse
+import instrumentation
 
 BASE_URL = "https://www.ncei.noaa.gov/data/global-summary-of-the-day/access/"
 DOWNLOAD_DIR = "noaa_gsod_data" # 下载文件将存储在此文件夹
+INDEX_DIRNAME = ".http_index" # 每个年份目录下保存 ETag/Last-Modified/Content-Length 索引的子目录
+PART_SUFFIX = ".part" # 未下载完成的临时文件后缀
+LISTING_CACHE_DIR = ".listing_cache" # 目录索引页链接的本地缓存
+LISTING_TTL = 24 * 3600 # 当前年份目录列表的缓存有效期 (秒)，过期后发送条件请求重新验证
+LISTING_FINAL_GRACE = 90 * 24 * 3600 # 年末之后仍可能补录数据的时间 (秒)，此后获取的往年列表视为不再变化
+# 下载请求要求服务器不压缩响应：Content-Length/Content-Range 与 Range 续传偏移都按传输的字节计算，
+# 解压后的大小与之不符 (requests/aiohttp 默认发送 Accept-Encoding: gzip, deflate 并自动解压)
+DOWNLOAD_HEADERS = {'Accept-Encoding': 'identity'}
 
-def get_links_from_url(url, content_type_check=None):
+# 只匹配 <a ... href="..."> 中的链接，无需构建完整的DOM
+HREF_PATTERN = re.compile(rb"""<a\s[^>]*?href\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+
+def extract_links(html_bytes, content_type_check=None):
     """
-    从给定的URL获取链接。
-    content_type_check: 一个函数，用于检查链接是否是我们想要的类型 (例如，是目录还是特定文件类型)。
+    从目录索引页的HTML中提取链接
+    近年的索引页有一万多个链接，这里用正则直接扫描 <a href>，不构建DOM
     """
     links = []
+    for match in HREF_PATTERN.finditer(html_bytes):
+        raw = match.group(1) or match.group(2) or match.group(3) or b''
+        links.append(html.unescape(raw.decode('utf-8', errors='replace')))
+    return filter_links(links, content_type_check)
+
+def filter_links(links, content_type_check=None):
+    """忽略父目录链接、查询参数或页面内锚点，并按 content_type_check 筛选"""
+    selected = []
+    for href in links:
+        if href == "../" or href.startswith("?") or href.startswith("#") or not href:
+            continue
+        if content_type_check is None or content_type_check(href):
+            selected.append(href)
+    return selected
+
+def listing_cache_path(url):
+    """目录列表缓存文件路径 (以URL的哈希为键)"""
+    return os.path.join(LISTING_CACHE_DIR, hashlib.sha1(url.encode('utf-8')).hexdigest() + ".json")
+
+def load_listing_cache(url):
+    """读取目录列表缓存，不存在或损坏时返回 None"""
     try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()  # 如果请求失败则引发HTTPError
-        soup = bs4.BeautifulSoup(response.content, 'html.parser')
-        for a_tag in soup.find_all('a', href=True):
-            href = a_tag['href']
-            # 忽略父目录链接、查询参数或页面内锚点
-            if href == "../" or href.startswith("?") or href.startswith("#") or not href:
-                continue
-            if content_type_check is None or content_type_check(href):
-                links.append(href)
-    except requests.exceptions.RequestException as e:
-        # 在多进程环境中，考虑使用更集中的日志记录方式，但对于此脚本，打印到控制台可能足够
-        print(f"获取链接时出错 {url}: {e}")
-    return links
+        with open(listing_cache_path(url), 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return entry if entry.get('url') == url else None
+
+def save_listing_cache(url, links, headers):
+    """原子写入目录列表缓存，headers 为响应头或上一次的缓存条目 (用于保留校验值)"""
+    os.makedirs(LISTING_CACHE_DIR, exist_ok=True)
+    entry = {
+        'url': url,
+        'fetched_at': time.time(),
+        'etag': headers.get('ETag', headers.get('etag')),
+        'last_modified': headers.get('Last-Modified', headers.get('last_modified')),
+        'links': links
+    }
+    cache_path = listing_cache_path(url)
+    with open(cache_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(entry, f)
+    os.replace(cache_path + ".tmp", cache_path)
+
+def listing_is_fresh(url, entry, ttl=LISTING_TTL, grace=LISTING_FINAL_GRACE):
+    """
+    判断缓存的目录列表是否仍然有效
+    年份目录在该年结束后还会补录数据，只有在年末加 grace 秒之后获取的列表才永久有效；
+    其他列表 (根目录、当前年份、补录期内获取的往年列表) 在 ttl 秒内有效，过期后发送条件请求重新验证
+    """
+    fetched_at = entry.get('fetched_at', 0)
+    year_str = urlparse(url).path.rstrip('/').rsplit('/', 1)[-1]
+    if year_str.isdigit() and int(year_str) < datetime.now(timezone.utc).year:
+        year_end = datetime(int(year_str) + 1, 1, 1, tzinfo=timezone.utc).timestamp()
+        if fetched_at >= year_end + grace:
+            return True
+    return time.time() - fetched_at < ttl
+
+def listing_conditional_headers(entry):
+    """由缓存条目构造 If-None-Match/If-Modified-Since 请求头"""
+    headers = {}
+    if entry is not None:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+    return headers
 
 def is_year_directory(href):
     """检查链接是否为年份目录 (例如 '1929/')"""
@@ -38,91 +106,159 @@ def is_csv_file(href):
     """检查链接是否为.csv文件"""
     return href.lower().endswith('.csv')
 
-def download_file(file_url, local_path):
-    """下载文件并保存到本地路径 (此函数将被多进程调用)"""
-    try:
-        # 确保目标目录存在
-        # os.makedirs 在多进程中与 exist_ok=True 一起使用是安全的
-        os.makedirs(os.path.dirname(local_path), exist_ok=True)
-
-        if os.path.exists(local_path):
-            print(f"文件已存在，跳过: {local_path} (进程: {os.getpid()})")
-            return
-
-        print(f"准备下载: {file_url} (进程: {os.getpid()})")
-        #response = requests.get(file_url, stream=True, timeout=60)
-        session = requests.Session()
-        response = session.get(file_url, stream=True, timeout=60)
-        response.raise_for_status()
-        with open(local_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        print(f"成功下载到: {local_path} (进程: {os.getpid()})")
-        #time.sleep(0.2) # 稍微减少延时，因为现在是并行下载，但仍保留以示友好
-    except requests.exceptions.RequestException as e:
-        print(f"下载文件时出错 {file_url}: {e} (进程: {os.getpid()})")
-    except IOError as e:
-        print(f"保存文件时出错 {local_path}: {e} (进程: {os.getpid()})")
-    except Exception as e:
-        print(f"下载/保存 {file_url} 时发生未知错误: {e} (进程: {os.getpid()})")
-
-
-def main():
-    """主执行函数"""
-    if not os.path.exists(DOWNLOAD_DIR):
-        os.makedirs(DOWNLOAD_DIR)
-        print(f"创建下载目录: {DOWNLOAD_DIR}")
-
-    print(f"开始从 {BASE_URL} 获取年份目录...")
-    year_directories = get_links_from_url(BASE_URL, is_year_directory)
-
-    if not year_directories:
-        print("未找到年份目录。")
-        return
-
-    print(f"找到年份目录: {len(year_directories)}")
-
-    all_download_tasks = [] # 用于存储所有下载任务 (file_url, local_path)
-
-    for year_dir_name in year_directories:
-        year_url = urljoin(BASE_URL, year_dir_name)
-        year_str = year_dir_name.strip('/')
-        print(f"\n正在收集年份 {year_str} 的文件列表 (URL: {year_url})")
-
-        csv_files = get_links_from_url(year_url, is_csv_file)
-
-        if not csv_files:
-            print(f"年份 {year_str} 未找到 .csv 文件。")
+def filter_year_directories(year_directories, start_year=None, end_year=None):
+    """按年份范围 (含两端) 过滤年份目录链接，例如 '2020/'"""
+    selected = []
+    for href in year_directories:
+        year = int(href.strip('/'))
+        if start_year is not None and year < start_year:
             continue
+        if end_year is not None and year > end_year:
+            continue
+        selected.append(href)
+    return selected
+
+def load_station_allowlist(path):
+    """读取站点白名单文件：每行一个站点ID (可带 .csv 后缀)，忽略空行和 # 注释"""
+    stations = set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            station = line.split('#', 1)[0].strip()
+            if station:
+                stations.add(station[:-4] if station.lower().endswith('.csv') else station)
+    return stations
+
+def make_csv_filter(station_prefixes=None, station_allowlist=None):
+    """
+    返回用于筛选年份目录中CSV链接的函数
+    文件名即站点ID (例如 58362099999.csv)，按站点ID前缀和白名单过滤
+    """
+    prefixes = tuple(station_prefixes) if station_prefixes else None
+
+    def check(href):
+        if not is_csv_file(href):
+            return False
+        station_id = os.path.basename(urlparse(href).path)[:-4]
+        if prefixes is not None and not station_id.startswith(prefixes):
+            return False
+        if station_allowlist is not None and station_id not in station_allowlist:
+            return False
+        return True
+
+    return check
+
+def add_selection_arguments(parser):
+    """为下载脚本添加年份范围与站点筛选参数 (pull.py/pull2.py/async_pull.py 共用)"""
+    parser.add_argument("--start-year", type=int, default=None, help="起始年份 (含)")
+    parser.add_argument("--end-year", type=int, default=None, help="结束年份 (含)")
+    parser.add_argument("--station-prefix", action="append", default=None,
+                        help="站点ID前缀，可重复指定，例如中国站点 (WMO区站号 50xxx-59xxx) 使用 --station-prefix 5")
+    parser.add_argument("--station-list", default=None,
+                        help="站点白名单文件，每行一个站点ID")
+
+def selection_from_args(args):
+    """由命令行参数得到 (起始年份, 结束年份, CSV链接筛选函数)"""
+    allowlist = load_station_allowlist(args.station_list) if args.station_list else None
+    return args.start_year, args.end_year, make_csv_filter(args.station_prefix, allowlist)
+
+def index_path_for(local_path):
+    """本地文件对应的下载索引路径"""
+    return os.path.join(os.path.dirname(local_path), INDEX_DIRNAME, os.path.basename(local_path) + ".json")
 
-        print(f"在年份 {year_str} 中找到 {len(csv_files)} 个 .csv 文件。")
+def load_download_index(local_path):
+    """读取本地文件的下载索引 (url/etag/last_modified/content_length/complete)，不存在时返回空字典"""
+    try:
+        with open(index_path_for(local_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_download_index(local_path, entry):
+    """原子写入下载索引"""
+    index_path = index_path_for(local_path)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, index_path)
 
-        for csv_file_name in csv_files:
-            file_download_url = urljoin(year_url, csv_file_name)
-            actual_file_name = os.path.basename(urlparse(csv_file_name).path)
-            local_file_path = os.path.join(DOWNLOAD_DIR, year_str, actual_file_name)
-            all_download_tasks.append((file_download_url, local_file_path))
+def build_request_headers(local_path, entry):
+    """
+    根据本地文件状态构造请求头，返回 (headers, 续传起始字节)
+    - 文件已完整存在: 使用 If-None-Match/If-Modified-Since 条件请求
+    - 存在 .part 临时文件且有校验值: 使用 Range + If-Range 续传
+    始终包含 Accept-Encoding: identity，使写入的字节数与 Content-Length 和续传偏移一致
+    """
+    headers = dict(DOWNLOAD_HEADERS)
+    if os.path.exists(local_path):
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        elif not entry:
+            # 索引建立之前下载的文件，用本地修改时间作为条件
+            headers['If-Modified-Since'] = formatdate(os.path.getmtime(local_path), usegmt=True)
+        return headers, 0
 
-    if not all_download_tasks:
-        print("未找到任何需要下载的文件。")
-        return
+    part_path = local_path + PART_SUFFIX
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    validator = entry.get('etag') or entry.get('last_modified')
+    if offset > 0 and validator:
+        # If-Range: 服务器上的文件变化时返回完整的 200 响应，避免拼接不同版本
+        headers['Range'] = f"bytes={offset}-"
+        headers['If-Range'] = validator
+        return headers, offset
+    return headers, 0
 
-    print(f"\n总共收集到 {len(all_download_tasks)} 个文件准备下载。")
+def response_index_entry(file_url, status_code, headers, previous=None):
+    """由响应头生成下载索引，206 响应时保留之前记录的完整长度"""
+    content_length = headers.get('Content-Length')
+    if status_code == 206:
+        content_range = headers.get('Content-Range', '')
+        total = content_range.rsplit('/', 1)[-1] if '/' in content_range else '*'
+        content_length = total if total != '*' else (previous or {}).get('content_length')
+    return {
+        'url': file_url,
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+        'content_length': int(content_length) if content_length is not None else None,
+        'complete': False
+    }
 
-    # 设置进程数，可以根据CPU核心数调整，但也要考虑服务器的承受能力
-    # os.cpu_count() 通常是一个不错的起点，但如果文件非常多或服务器有限制，可能需要减少
-    num_processes = os.cpu_count() * 2 
-    # 您可以根据实际情况调整这个数字，例如 num_processes = 4 或 10
-    print(f"将使用 {num_processes} 个进程进行下载...")
+def finalize_download(local_path, entry):
+    """校验 .part 文件长度，完整时原子重命名为目标文件并更新索引；不完整时保留 .part 以便续传"""
+    part_path = local_path + PART_SUFFIX
+    size = os.path.getsize(part_path)
+    if entry['content_length'] is not None and size != entry['content_length']:
+        raise IOError(f"下载不完整: 已接收 {size} 字节，预期 {entry['content_length']} 字节")
+    os.replace(part_path, local_path)
+    entry['complete'] = True
+    save_download_index(local_path, entry)
+
+def main(start_year=None, end_year=None, csv_filter=is_csv_file, base_url=BASE_URL, download_dir=DOWNLOAD_DIR):
+    """
+    主执行函数：列出并下载选中的年份与站点
+    下载由 async_pull 的异步下载器完成 (原先的多进程下载已合并到其中)，
+    并发请求数沿用原先的进程数 (CPU核心数 × 2)
+    """
+    import async_pull # async_pull 从本模块导入共用函数，在此处导入以避免循环导入
 
-    # 使用进程池执行下载任务
-    # starmap 会将 all_download_tasks 中的每个元组解包作为参数传递给 download_file
-    with multiprocessing.Pool(processes=num_processes) as pool:
-        pool.starmap(download_file, all_download_tasks)
+    concurrency = os.cpu_count() * 2
+    print(f"将使用 {concurrency} 个并发请求进行下载...")
+    with instrumentation.stage("download") as stage:
+        stats = asyncio.run(async_pull.download_all(base_url, download_dir, pool_size=concurrency,
+                                                    concurrency=concurrency, start_year=start_year,
+                                                    end_year=end_year, csv_filter=csv_filter))
+        # files: 传输了新数据的文件数，bytes: 传输的字节数，errors: 出错的文件数
+        stage.add(files=stats['downloaded'] + stats['resumed'], bytes=stats['bytes'], errors=stats['failed'])
 
-    print("\n所有文件下载尝试完成。")
+    print(f"\n所有文件下载尝试完成。{async_pull.format_stats(stats)}")
 
 if __name__ == "__main__":
-    # 在Windows上使用 multiprocessing 时，建议添加此行，特别是当脚本可能被冻结成可执行文件时
-    multiprocessing.freeze_support()
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="并发下载NOAA GSOD数据")
+    add_selection_arguments(parser)
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.configure_from_args("pull", args)
+    start_year, end_year, csv_filter = selection_from_args(args)
+    main(start_year, end_year, csv_filter)
@@ -0,0 +1,171 @@
+"""
+Vectorized quality control of processed GSOD station series.
+
+Runs on one station's consolidated, date-sorted series (metric units, i.e. the
+output of process.py) and flags implausible values without removing them:
+
+    range     value outside the gross physical limits of RANGE_LIMITS
+    spike     leave-one-out z-score against the centered SPIKE_WINDOW
+              observations around it above SPIKE_Z
+    flatline  value repeated unchanged for FLATLINE_RUN or more consecutive
+              observations (stuck sensor)
+
+The result is one unsigned integer per row (QC_COLUMN) holding a bit for every
+(variable, check) pair, so consumers can drop exactly the values that failed:
+
+    failed(flags, "TEMP")  -> rows whose TEMP failed any check
+
+Every check is a handful of whole-array numpy operations over all checked
+variables at once; there is no per-row Python code.
+"""
+import numpy as np
+
+QC_COLUMN = "QC_FLAGS"
+QC_DTYPE = np.uint32
+CHECKS = ("range", "spike", "flatline")
+# STP is not checked: GSOD drops the thousands digit of station pressures of
+# 1000 hPa and more (1013.2 is stored as 013.2), so its values are ambiguous
+VARIABLES = ("TEMP", "DEWP", "SLP", "VISIB", "WDSP", "MAX", "MIN", "PRCP", "SNDP")
+# Derived columns fail when any of their inputs fails
+DERIVED_FROM = {"HMD": ("TEMP", "DEWP")}
+
+# Gross limits in the units written by process.py (degC, hPa, m, m/s, mm)
+RANGE_LIMITS = {
+    "TEMP": (-60.0, 55.0),
+    "MAX": (-60.0, 55.0),
+    "MIN": (-65.0, 50.0),
+    "DEWP": (-70.0, 40.0),
+    "SLP": (850.0, 1090.0),
+    "VISIB": (0.0, 161000.0),
+    "WDSP": (0.0, 75.0),
+    "PRCP": (0.0, 1500.0),
+    "SNDP": (0.0, 3000.0),
+}
+# Spikes and flat lines are only meaningful for continuous variables; PRCP,
+# SNDP and WDSP legitimately jump and stay at 0 for long runs
+SERIES_VARIABLES = ("TEMP", "DEWP", "SLP", "MAX", "MIN")
+SPIKE_WINDOW = 31  # observations, centered
+SPIKE_MIN_PERIODS = 15  # other observations required in the window
+SPIKE_Z = 6.0
+FLATLINE_RUN = 7
+
+
+def bit(variable, check):
+    """The flag bit of one (variable, check) pair."""
+    return 1 << (len(CHECKS) * VARIABLES.index(variable) + CHECKS.index(check))
+
+
+def variable_mask(variable):
+    """All flag bits that invalidate a variable (including the inputs of derived variables)."""
+    mask = 0
+    for source in DERIVED_FROM.get(variable, (variable,)):
+        for check in CHECKS:
+            mask |= bit(source, check)
+    return mask
+
+
+def failed(flags, variable):
+    """Boolean array: rows whose value of variable failed a check."""
+    return (np.asarray(flags).astype(np.int64) & variable_mask(variable)) != 0
+
+
+def _matrix(df, variables):
+    """float64 (rows x variables) matrix of the columns present in df, and the variables it holds."""
+    present = [variable for variable in variables if variable in df.columns]
+    if not present:
+        return np.empty((len(df), 0)), present
+    return np.column_stack([df[variable].to_numpy(dtype=np.float64, na_value=np.nan) for variable in present]), present
+
+
+def range_failures(values, low, high):
+    """Boolean matrix: values outside [low, high] (per column); NaN never fails."""
+    with np.errstate(invalid="ignore"):
+        return (values < low) | (values > high)
+
+
+def spike_failures(values, window=SPIKE_WINDOW, min_periods=SPIKE_MIN_PERIODS, z=SPIKE_Z):
+    """
+    Boolean matrix: values whose distance from the mean of the other values in the
+    centered window exceeds z standard deviations of those values. Window sums
+    come from cumulative sums, so the cost is O(rows) per column.
+    """
+    n = len(values)
+    if n <= min_periods:
+        return np.zeros(values.shape, dtype=bool)
+    valid = ~np.isnan(values)
+    # Anomalies against the station mean keep the sums of squares well conditioned
+    with np.errstate(invalid="ignore"):
+        centered = np.where(valid, values - np.nanmean(np.where(valid, values, np.nan), axis=0), 0.0)
+    zero = np.zeros((1, values.shape[1]))
+    cum_sum = np.concatenate([zero, np.cumsum(centered, axis=0)])
+    cum_sq = np.concatenate([zero, np.cumsum(centered * centered, axis=0)])
+    cum_count = np.concatenate([zero, np.cumsum(valid, axis=0)])
+
+    half = window // 2
+    rows = np.arange(n)
+    low = np.clip(rows - half, 0, n)
+    high = np.clip(rows + half + 1, 0, n)
+    # Window statistics without the value itself (leave-one-out)
+    count = cum_count[high] - cum_count[low] - valid
+    total = cum_sum[high] - cum_sum[low] - centered
+    squares = cum_sq[high] - cum_sq[low] - centered * centered
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        variance = (squares - count * mean * mean) / (count - 1)
+        score = np.abs(centered - mean) / np.sqrt(variance)
+        return valid & (count >= min_periods) & (variance > 1e-12) & (score > z)
+
+
+def flatline_failures(values, run=FLATLINE_RUN):
+    """Boolean matrix: values in runs of at least `run` identical consecutive values (NaN breaks a run)."""
+    n = len(values)
+    if n < run:
+        return np.zeros(values.shape, dtype=bool)
+    starts = np.ones(values.shape, dtype=bool)
+    starts[1:] = values[1:] != values[:-1]  # NaN != NaN, so missing values start new runs
+    run_ids = np.cumsum(starts, axis=0) - 1
+    result = np.zeros(values.shape, dtype=bool)
+    for column in range(values.shape[1]):
+        lengths = np.bincount(run_ids[:, column])
+        result[:, column] = (lengths[run_ids[:, column]] >= run) & ~np.isnan(values[:, column])
+    return result
+
+
+def compute_flags(df):
+    """Runs all checks on one station's date-sorted DataFrame and returns the QC_DTYPE flags per row."""
+    flags = np.zeros(len(df), dtype=np.int64)
+
+    values, present = _matrix(df, list(RANGE_LIMITS))
+    low = np.array([RANGE_LIMITS[variable][0] for variable in present])
+    high = np.array([RANGE_LIMITS[variable][1] for variable in present])
+    out_of_range = range_failures(values, low, high)
+    for column, variable in enumerate(present):
+        flags[out_of_range[:, column]] |= bit(variable, "range")
+
+    series_columns = [column for column, variable in enumerate(present) if variable in SERIES_VARIABLES]
+    if series_columns:
+        # Out-of-range values are left out so they do not distort their neighbours' window statistics
+        series = np.where(out_of_range[:, series_columns], np.nan, values[:, series_columns])
+        for check, failures in (("spike", spike_failures(series)), ("flatline", flatline_failures(series))):
+            for column, source in enumerate(series_columns):
+                flags[failures[:, column]] |= bit(present[source], check)
+    return flags.astype(QC_DTYPE)
+
+
+def apply(df):
+    """Adds QC_COLUMN to df (in place, in its current row order) and returns the number of flagged rows."""
+    flags = compute_flags(df)
+    df[QC_COLUMN] = flags
+    return int(np.count_nonzero(flags))
+
+
+def summarize(flags):
+    """{variable: {check: flagged rows}} for the (variable, check) pairs that flagged anything."""
+    flags = np.asarray(flags).astype(np.int64)
+    summary = {}
+    for variable in VARIABLES:
+        for check in CHECKS:
+            count = int(np.count_nonzero(flags & bit(variable, check)))
+            if count:
+                summary.setdefault(variable, {})[check] = count
+    return summary
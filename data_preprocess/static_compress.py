@@ -0,0 +1,155 @@
+"""
+Pre-compressed siblings and size budgets for static output files.
+
+compress_file() writes <file>.gz (and <file>.br when brotli is installed) next
+to an artifact so a static host can serve them directly (e.g. nginx
+gzip_static / brotli_static). The source file is streamed in chunks, so no
+full uncompressed copy is held in memory. size_report() prints the raw and
+compressed sizes of a run's artifacts and checks them against a budget file.
+
+Budget file format (JSON): glob patterns relative to the working directory,
+mapped to the maximum size per file for any of "raw", "gzip" or "brotli":
+
+    {"weather_data.json": {"raw": 100000000, "gzip": 20000000},
+     "processed_cn_gsod/*.json": {"gzip": 5000000}}
+"""
+import os
+import gzip
+import json
+import fnmatch
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; fall back to the cffi binding, then to gzip only
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+ENCODINGS = {"gzip": ".gz", "brotli": ".br"}
+COMPRESS_CHOICES = ("none", "gzip", "brotli", "all")
+SIZE_BUDGET_FILE = "size_budget.json"
+CHUNK_SIZE = 1024 * 1024
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+REPORT_ROWS = 20
+
+
+def encodings_for(choice):
+    """Maps a --compress choice to the list of encodings that can actually be written."""
+    if choice in (None, "none"):
+        return []
+    wanted = ["gzip", "brotli"] if choice == "all" else [choice]
+    if "brotli" in wanted and brotli is None:
+        print("Warning: brotli is not installed (pip install brotli); .br files are skipped")
+        wanted.remove("brotli")
+    return wanted
+
+
+def _compress_gzip(path, target):
+    with open(path, "rb") as src, open(target, "wb") as raw:
+        # mtime=0 keeps the output byte-identical for identical input
+        with gzip.GzipFile(filename="", mode="wb", fileobj=raw, compresslevel=GZIP_LEVEL, mtime=0) as dst:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                dst.write(chunk)
+
+
+def _compress_brotli(path, target):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    process = getattr(compressor, "process", None) or compressor.compress
+    with open(path, "rb") as src, open(target, "wb") as dst:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+            dst.write(process(chunk))
+        dst.write(compressor.finish())
+
+
+def compress_file(path, encodings):
+    """
+    Writes the requested compressed siblings of path (atomically) and removes
+    siblings of encodings that were not requested, so a stale .gz/.br is never
+    served next to a newer file. Returns {encoding: compressed size}.
+    """
+    sizes = {}
+    for encoding, suffix in ENCODINGS.items():
+        target = path + suffix
+        if encoding not in encodings:
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        tmp_path = target + ".tmp"
+        if encoding == "gzip":
+            _compress_gzip(path, tmp_path)
+        else:
+            _compress_brotli(path, tmp_path)
+        os.replace(tmp_path, target)
+        sizes[encoding] = os.path.getsize(target)
+    return sizes
+
+
+def remove_file(path):
+    """Removes an artifact together with any compressed siblings it has."""
+    for target in [path] + [path + suffix for suffix in ENCODINGS.values()]:
+        if os.path.exists(target):
+            os.remove(target)
+
+
+def load_budget(path=SIZE_BUDGET_FILE):
+    """Returns [(pattern, {variant: max_bytes})] from a budget file, or [] when it does not exist."""
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return list(json.load(f).items())
+
+
+def _artifact_sizes(path):
+    sizes = {"raw": os.path.getsize(path)}
+    for encoding, suffix in ENCODINGS.items():
+        if os.path.exists(path + suffix):
+            sizes[encoding] = os.path.getsize(path + suffix)
+    return sizes
+
+
+def _format_size(size):
+    return "-" if size is None else f"{size / 1024:.1f} KB"
+
+
+def size_report(paths, budget=None, title="Size budget report"):
+    """
+    Prints raw/gzip/brotli sizes of the given artifacts (the largest REPORT_ROWS
+    when there are more) and checks each one against the first matching budget
+    pattern. Returns the list of violation messages; empty means within budget.
+    """
+    budget = budget or []
+    rows = []
+    violations = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        sizes = _artifact_sizes(path)
+        rel_path = os.path.relpath(path).replace(os.sep, "/")
+        for pattern, limits in budget:
+            if fnmatch.fnmatch(rel_path, pattern):
+                for variant, max_bytes in limits.items():
+                    if variant in sizes and sizes[variant] > max_bytes:
+                        violations.append(f"{rel_path}: {variant} {sizes[variant]} bytes > budget {max_bytes} ({pattern})")
+                break
+        rows.append((rel_path, sizes))
+
+    print(f"\n{title}:")
+    rows.sort(key=lambda row: row[1]["raw"], reverse=True)
+    for rel_path, sizes in rows[:REPORT_ROWS]:
+        print(f"  {rel_path:<50} raw {_format_size(sizes['raw']):>12}  "
+              f"gzip {_format_size(sizes.get('gzip')):>12}  brotli {_format_size(sizes.get('brotli')):>12}")
+    if len(rows) > REPORT_ROWS:
+        print(f"  ... {len(rows) - REPORT_ROWS} more files")
+    totals = {variant: sum(sizes.get(variant, 0) for _, sizes in rows) for variant in ("raw", "gzip", "brotli")}
+    print(f"  Total ({len(rows)} files): raw {_format_size(totals['raw'])}, "
+          f"gzip {_format_size(totals['gzip'])}, brotli {_format_size(totals['brotli'])}")
+
+    if violations:
+        print("Size budget exceeded:")
+        for message in violations:
+            print(f"  {message}")
+    elif budget:
+        print("All artifacts are within the size budget.")
+    return violations
@@ -0,0 +1,212 @@
+"""
+Persistent station metadata registry.
+
+One JSON file, keyed by station ID, holds the canonical metadata of stations
+whose raw GSOD rows cannot be trusted as they are (coordinates of (0, 0),
+missing coordinates, ...) together with where each value came from:
+
+    {"format_version": 1,
+     "stations": {
+        "50845099999": {"name": "NAME LOCATION UNKN, CH", "latitude": 43.95, "longitude": 116.07,
+                        "elevation": null, "source": "override",
+                        "provenance": "updateloss.py corrections table", "updated": "2025-06-01"}}}
+
+process.py joins against the registry when it ingests a station: every
+non-null field replaces the value of all of that station's rows, so a
+corrected station is resolved once instead of having its processed files
+rewritten afterwards. process_weather_data.py reads process.py's output and
+does not join again. "source" is "override" for manual
+corrections and "observed" for entries recorded from the data (--observe);
+observed entries never replace overrides.
+"""
+import os
+import csv
+import json
+import argparse
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+REGISTRY_FILE = "station_registry.json"
+REGISTRY_VERSION = 1
+SOURCES = ("override", "observed")
+# Registry field -> column of the processed station data
+COLUMNS = {"name": "NAME", "latitude": "LATITUDE", "longitude": "LONGITUDE", "elevation": "ELEVATION"}
+# Columns of the corrections table used by updateloss.py
+CORRECTION_COLUMNS = ["文件名", "站点名", "修正纬度", "修正经度"]
+
+_cache = {}
+
+
+class StationRegistry:
+    """Station ID -> canonical metadata entry."""
+
+    def __init__(self, stations=None, path=None):
+        self.stations = dict(stations or {})
+        self.path = path
+
+    def __len__(self):
+        return len(self.stations)
+
+    def __contains__(self, station_id):
+        return str(station_id) in self.stations
+
+    def get(self, station_id):
+        """Returns the station's entry, or None when the station is not registered."""
+        return self.stations.get(str(station_id))
+
+    def set(self, station_id, latitude=None, longitude=None, name=None, elevation=None,
+            source="override", provenance=None):
+        """Adds or replaces an entry; an observed entry never replaces an override."""
+        if source not in SOURCES:
+            raise ValueError(f"Unknown source: {source}")
+        station_id = str(station_id)
+        current = self.stations.get(station_id)
+        if source == "observed" and current is not None and current["source"] == "override":
+            return False
+        self.stations[station_id] = {
+            "name": name,
+            "latitude": None if latitude is None else float(latitude),
+            "longitude": None if longitude is None else float(longitude),
+            "elevation": None if elevation is None else float(elevation),
+            "source": source,
+            "provenance": provenance,
+            "updated": date.today().isoformat(),
+        }
+        return True
+
+    def apply(self, df, station_id):
+        """
+        Replaces the metadata columns of one station's rows (in place) with the
+        registered values; returns True when the station is registered.
+        """
+        entry = self.get(station_id)
+        if entry is None:
+            return False
+        for field, column in COLUMNS.items():
+            value = entry.get(field)
+            if value is None or column not in df.columns:
+                continue
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8), [value])
+            else:
+                df[column] = np.full(len(df), value, dtype=df[column].dtype if field != "name" else object)
+        return True
+
+    def corrections(self):
+        """The override entries as updateloss.py corrections ({filename, name, latitude, longitude})."""
+        return [
+            {"filename": f"{station_id}.csv", "name": entry["name"] or "",
+             "latitude": entry["latitude"], "longitude": entry["longitude"]}
+            for station_id, entry in self.stations.items()
+            if entry["source"] == "override" and entry["latitude"] is not None and entry["longitude"] is not None
+        ]
+
+    def save(self, path=None):
+        """Writes the registry atomically, sorted by station ID and one station per line (diff friendly)."""
+        path = path or self.path or REGISTRY_FILE
+        lines = [f"  {json.dumps(station_id)}: {json.dumps(entry, ensure_ascii=False)}"
+                 for station_id, entry in sorted(self.stations.items())]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(f'{{"format_version": {REGISTRY_VERSION},\n "stations": {{\n')
+            f.write(",\n".join(lines))
+            f.write("\n}}\n")
+        os.replace(tmp_path, path)
+        self.path = path
+
+
+def load(path=REGISTRY_FILE):
+    """
+    Loads a registry file; a missing file (or path None) gives an empty registry.
+    Loaded registries are cached per process by path and modification time, so
+    worker functions can call load() for every task.
+    """
+    if not path or not os.path.exists(path):
+        return StationRegistry(path=path)
+    key = (os.path.abspath(path), os.stat(path).st_mtime_ns)
+    registry = _cache.get(key)
+    if registry is None:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format_version") != REGISTRY_VERSION:
+            raise ValueError(f"Unsupported station registry version in {path}: {data.get('format_version')}")
+        registry = _cache[key] = StationRegistry(data["stations"], path)
+    return registry
+
+
+def import_corrections(registry, rows, provenance):
+    """Adds corrections table rows (文件名,站点名,修正纬度,修正经度) as overrides; returns the count added."""
+    added = 0
+    for row in rows:
+        station_id, _ = os.path.splitext(row["文件名"].strip())
+        registry.set(station_id, row["修正纬度"], row["修正经度"], (row["站点名"] or "").strip() or None,
+                     source="override", provenance=provenance)
+        added += 1
+    return added
+
+
+def observe_directory(registry, directory):
+    """
+    Records the first-row metadata of every per-station CSV in directory as an
+    observed entry (stations with an override keep it); returns the count added.
+    Rows with (0, 0) or missing coordinates are not recorded.
+    """
+    added = 0
+    for filename in sorted(os.listdir(directory)):
+        if not filename.lower().endswith(".csv"):
+            continue
+        with open(os.path.join(directory, filename), "r", encoding="utf-8", newline="") as f:
+            row = next(csv.DictReader(f, skipinitialspace=True), None)
+        try:
+            latitude, longitude = float(row["LATITUDE"]), float(row["LONGITUDE"])
+        except (TypeError, KeyError, ValueError):
+            continue
+        if (latitude == 0.0 and longitude == 0.0) or np.isnan(latitude) or np.isnan(longitude):
+            continue
+        elevation = row.get("ELEVATION")
+        added += registry.set(row["STATION"] or filename[:-4], latitude, longitude, row.get("NAME") or None,
+                              float(elevation) if elevation else None, source="observed",
+                              provenance=f"first row of {filename}")
+    return added
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the station metadata registry used at ingest.")
+    parser.add_argument("--registry", default=REGISTRY_FILE, help=f"Registry file (default: {REGISTRY_FILE})")
+    parser.add_argument("--import-corrections", metavar="CSV",
+                        help=f"Add the rows of a corrections table ({','.join(CORRECTION_COLUMNS)}) as overrides")
+    parser.add_argument("--observe", metavar="DIR",
+                        help="Record the first-row metadata of the per-station CSV files in DIR as observed entries")
+    parser.add_argument("--set", nargs=3, metavar=("STATION", "LAT", "LON"), help="Add or replace one override")
+    parser.add_argument("--name", default=None, help="Station name for --set")
+    parser.add_argument("--elevation", type=float, default=None, help="Elevation for --set")
+    parser.add_argument("--provenance", default=None, help="Provenance recorded with --set / --import-corrections")
+    parser.add_argument("--show", metavar="STATION", help="Print one station's entry")
+    args = parser.parse_args()
+
+    registry = load(args.registry)
+    changed = False
+    if args.import_corrections:
+        with open(args.import_corrections, "r", encoding="utf-8-sig", newline="") as f:
+            count = import_corrections(registry, csv.DictReader(f, skipinitialspace=True),
+                                       args.provenance or os.path.basename(args.import_corrections))
+        print(f"Imported {count} overrides from {args.import_corrections}")
+        changed = True
+    if args.observe:
+        print(f"Recorded {observe_directory(registry, args.observe)} observed stations from {args.observe}")
+        changed = True
+    if args.set:
+        station_id, latitude, longitude = args.set
+        registry.set(station_id, float(latitude), float(longitude), args.name, args.elevation,
+                     source="override", provenance=args.provenance or "manual")
+        changed = True
+    if changed:
+        registry.save(args.registry)
+    if args.show:
+        print(json.dumps(registry.get(args.show), ensure_ascii=False, indent=2))
+
+    sources = [entry["source"] for entry in registry.stations.values()]
+    print(f"{args.registry}: {len(registry)} stations "
+          f"({sources.count('override')} overrides, {sources.count('observed')} observed)")
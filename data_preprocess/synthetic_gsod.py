@@ -0,0 +1,219 @@
+"""
+Synthetic GSOD daily CSV files for benchmarks and fixtures.
+
+generate_gsod() writes <output_dir>/<year>/<station>.csv with the layout of the
+NOAA GSOD access/ files: every field quoted, fixed-width numeric fields, the
+*_ATTRIBUTES observation counts, the 9999.9 / 999.9 / 99.99 missing-value
+sentinels, PRCP flag letters and six-digit FRSHTT strings. Stations are spread
+over the China bounding box; a share of them gets (0, 0) coordinates, BOGUS
+names or coordinates outside the box, so checkrange.py and updateloss.py have
+the same kind of work as with the real data. Output is deterministic for a
+given seed.
+"""
+import os
+import csv
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_OUTPUT_DIR = "cn_gsod"
+MANIFEST_FILE = "_manifest.json"
+DEFAULT_STATIONS = 100
+DEFAULT_YEARS = 5
+DEFAULT_START_YEAR = 2015
+
+COLUMNS = [
+    "STATION", "DATE", "LATITUDE", "LONGITUDE", "ELEVATION", "NAME",
+    "TEMP", "TEMP_ATTRIBUTES", "DEWP", "DEWP_ATTRIBUTES", "SLP", "SLP_ATTRIBUTES",
+    "STP", "STP_ATTRIBUTES", "VISIB", "VISIB_ATTRIBUTES", "WDSP", "WDSP_ATTRIBUTES",
+    "MXSPD", "GUST", "MAX", "MAX_ATTRIBUTES", "MIN", "MIN_ATTRIBUTES",
+    "PRCP", "PRCP_ATTRIBUTES", "SNDP", "FRSHTT",
+]
+# Missing-value sentinel and field width of each numeric column, as in the GSOD files
+SENTINELS = {
+    "TEMP": ("9999.9", 6), "DEWP": ("9999.9", 6), "SLP": ("9999.9", 6), "STP": ("9999.9", 6),
+    "VISIB": ("999.9", 5), "WDSP": ("999.9", 5), "MXSPD": ("999.9", 5), "GUST": ("999.9", 5),
+    "MAX": ("9999.9", 6), "MIN": ("9999.9", 6), "PRCP": ("99.99", 5), "SNDP": ("999.9", 5),
+}
+PRCP_FLAGS = np.array(list("ABCDEFGHI"))
+CHINA_BOUNDS = (18.0, 53.0, 74.0, 134.0)  # min lat, max lat, min lon, max lon
+
+
+def station_id(number):
+    """USAF + WBAN style identifier (e.g. 50000099999), unique for number < 50000."""
+    return f"{500000 + 10 * number:06d}99999"
+
+
+def build_stations(count, rng, zero_rate=0.02, bogus_rate=0.01, outside_rate=0.02):
+    """Returns a DataFrame of station metadata, including the deliberately broken stations."""
+    min_lat, max_lat, min_lon, max_lon = CHINA_BOUNDS
+    lat = np.round(rng.uniform(min_lat, max_lat, count), 4)
+    lon = np.round(rng.uniform(min_lon, max_lon, count), 4)
+    elevation = np.round(rng.gamma(1.5, 600.0, count), 1)
+    names = np.array([f"SYNTHETIC STATION {number}, CH" for number in range(count)], dtype=object)
+    kind = rng.choice(["ok", "zero", "bogus", "outside"], size=count,
+                      p=[1 - zero_rate - bogus_rate - outside_rate, zero_rate, bogus_rate, outside_rate])
+    lat[kind == "zero"] = 0.0
+    lon[kind == "zero"] = 0.0
+    names[kind == "bogus"] = "BOGUS CHINESE, CH"
+    outside = kind == "outside"
+    lat[outside] = np.round(rng.uniform(-40.0, 0.0, outside.sum()), 4)
+    lon[outside] = np.round(rng.uniform(-170.0, -20.0, outside.sum()), 4)
+    return pd.DataFrame({
+        "STATION": [station_id(number) for number in range(count)],
+        "LATITUDE": lat, "LONGITUDE": lon, "ELEVATION": elevation, "NAME": names, "KIND": kind,
+    })
+
+
+def _fixed(values, width, decimals, sentinel, missing):
+    """Formats values right-aligned to the GSOD field width, with the sentinel where missing."""
+    text = pd.Series(np.round(values, decimals)).map(f"{{:{width}.{decimals}f}}".format)
+    text[missing] = sentinel.rjust(width)
+    return text.to_numpy()
+
+
+def _counts(rng, days, missing):
+    counts = rng.integers(4, 25, days).astype(str)
+    counts = np.char.rjust(counts, 3)
+    counts[missing] = "  0"
+    return counts
+
+
+def station_year_frame(station, year, rng, missing_rate=0.05, gap_rate=0.02):
+    """One station-year of daily rows (some days dropped, as stations miss reports)."""
+    dates = pd.date_range(f"{year}-01-01", f"{year}-12-31", freq="D")
+    dates = dates[rng.random(len(dates)) >= gap_rate]
+    days = len(dates)
+    day_of_year = dates.dayofyear.to_numpy()
+
+    # Seasonal temperature cycle (deg F) that gets colder to the north and at altitude
+    lat = abs(station.LATITUDE)
+    mean_temp = 80.0 - 0.9 * (lat - 18.0) - station.ELEVATION * 0.0036
+    amplitude = 10.0 + 0.5 * (lat - 18.0)
+    temp = mean_temp - amplitude * np.cos(2 * np.pi * (day_of_year - 15) / 365.25) + rng.normal(0, 4, days)
+    dewp = temp - rng.gamma(2.0, 4.0, days)
+    max_temp = temp + rng.gamma(3.0, 2.0, days)
+    min_temp = temp - rng.gamma(3.0, 2.0, days)
+    slp = 1013.0 + rng.normal(0, 8, days)
+    stp = slp - station.ELEVATION * 0.11
+    visib = np.clip(rng.normal(8, 3, days), 0.1, 30)
+    wdsp = rng.gamma(2.0, 2.5, days)
+    mxspd = wdsp + rng.gamma(2.0, 2.0, days)
+    gust = mxspd + rng.gamma(2.0, 3.0, days)
+    wet = rng.random(days) < 0.3
+    prcp = np.where(wet, rng.gamma(0.8, 0.3, days), 0.0)
+    sndp = np.where(temp < 30, rng.gamma(2.0, 2.0, days), 0.0)
+
+    def missing(share=missing_rate):
+        return rng.random(days) < share
+
+    temp_missing, dewp_missing = missing(missing_rate / 5), missing()
+    slp_missing, stp_missing = missing(3 * missing_rate), missing(3 * missing_rate)
+    visib_missing, wdsp_missing = missing(), missing()
+    fields = {
+        "STATION": station.STATION,
+        "DATE": dates.strftime("%Y-%m-%d"),
+        "LATITUDE": f"{station.LATITUDE:g}",
+        "LONGITUDE": f"{station.LONGITUDE:g}",
+        "ELEVATION": f"{station.ELEVATION:.1f}",
+        "NAME": station.NAME,
+        "TEMP": _fixed(temp, 6, 1, "9999.9", temp_missing),
+        "TEMP_ATTRIBUTES": _counts(rng, days, temp_missing),
+        "DEWP": _fixed(dewp, 6, 1, "9999.9", dewp_missing),
+        "DEWP_ATTRIBUTES": _counts(rng, days, dewp_missing),
+        "SLP": _fixed(slp, 6, 1, "9999.9", slp_missing),
+        "SLP_ATTRIBUTES": _counts(rng, days, slp_missing),
+        "STP": _fixed(np.mod(stp, 1000.0), 6, 1, "9999.9", stp_missing),
+        "STP_ATTRIBUTES": _counts(rng, days, stp_missing),
+        "VISIB": _fixed(visib, 5, 1, "999.9", visib_missing),
+        "VISIB_ATTRIBUTES": _counts(rng, days, visib_missing),
+        "WDSP": _fixed(wdsp, 5, 1, "999.9", wdsp_missing),
+        "WDSP_ATTRIBUTES": _counts(rng, days, wdsp_missing),
+        "MXSPD": _fixed(mxspd, 5, 1, "999.9", missing()),
+        "GUST": _fixed(gust, 5, 1, "999.9", missing(0.5)),
+        "MAX": _fixed(max_temp, 6, 1, "9999.9", missing()),
+        "MAX_ATTRIBUTES": np.where(rng.random(days) < 0.2, "*", " "),
+        "MIN": _fixed(min_temp, 6, 1, "9999.9", missing()),
+        "MIN_ATTRIBUTES": np.where(rng.random(days) < 0.2, "*", " "),
+        "PRCP": _fixed(prcp, 5, 2, "99.99", missing(2 * missing_rate)),
+        "PRCP_ATTRIBUTES": PRCP_FLAGS[rng.integers(0, len(PRCP_FLAGS), days)],
+        "SNDP": _fixed(sndp, 5, 1, "999.9", sndp == 0.0),
+        "FRSHTT": _frshtt(rng, days, wet, temp),
+    }
+    return pd.DataFrame(fields, columns=COLUMNS)
+
+
+def _frshtt(rng, days, wet, temp):
+    """Fog, Rain, Snow, Hail, Thunder, Tornado flags as a six-digit string."""
+    flags = np.zeros((days, 6), dtype=np.int8)
+    flags[:, 0] = rng.random(days) < 0.08
+    flags[:, 1] = wet & (temp >= 32)
+    flags[:, 2] = wet & (temp < 32)
+    flags[:, 3] = rng.random(days) < 0.002
+    flags[:, 4] = wet & (rng.random(days) < 0.1)
+    flags[:, 5] = rng.random(days) < 0.0005
+    return np.array(["".join(row) for row in flags.astype(str)])
+
+
+def generate_gsod(output_dir=DEFAULT_OUTPUT_DIR, stations=DEFAULT_STATIONS, years=DEFAULT_YEARS,
+                  start_year=DEFAULT_START_YEAR, seed=0, missing_rate=0.05, gap_rate=0.02):
+    """
+    Writes stations x years CSV files under output_dir and a manifest with the
+    station metadata, row counts and the stations that carry broken coordinates
+    or names. Returns the manifest.
+    """
+    rng = np.random.default_rng(seed)
+    station_table = build_stations(stations, rng)
+    rows = {}
+    total_bytes = 0
+    for year in range(start_year, start_year + years):
+        year_dir = os.path.join(output_dir, str(year))
+        os.makedirs(year_dir, exist_ok=True)
+        for station in station_table.itertuples(index=False):
+            df = station_year_frame(station, year, rng, missing_rate, gap_rate)
+            file_path = os.path.join(year_dir, f"{station.STATION}.csv")
+            df.to_csv(file_path, index=False, quoting=csv.QUOTE_ALL)
+            total_bytes += os.path.getsize(file_path)
+            rows[station.STATION] = rows.get(station.STATION, 0) + len(df)
+
+    manifest = {
+        "config": {"stations": stations, "years": years, "start_year": start_year, "seed": seed,
+                   "missing_rate": missing_rate, "gap_rate": gap_rate},
+        "files": stations * years,
+        "rows": sum(rows.values()),
+        "bytes": total_bytes,
+        "station_rows": rows,
+        "zero_coordinates": [
+            {"station": s.STATION, "name": s.NAME,
+             "latitude": round(float(rng.uniform(CHINA_BOUNDS[0], CHINA_BOUNDS[1])), 2),
+             "longitude": round(float(rng.uniform(CHINA_BOUNDS[2], CHINA_BOUNDS[3])), 2)}
+            for s in station_table[station_table["KIND"] == "zero"].itertuples(index=False)
+        ],
+        "bogus": station_table.loc[station_table["KIND"] == "bogus", "STATION"].tolist(),
+        "outside": station_table.loc[station_table["KIND"] == "outside", "STATION"].tolist(),
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic GSOD daily CSV files (NOAA access/ layout).")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR,
+                        help=f"Directory that receives <year>/<station>.csv (default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument("--stations", type=int, default=DEFAULT_STATIONS, help="Number of stations")
+    parser.add_argument("--years", type=int, default=DEFAULT_YEARS, help="Number of years per station")
+    parser.add_argument("--start-year", type=int, default=DEFAULT_START_YEAR, help="First year")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (same seed, same files)")
+    parser.add_argument("--missing-rate", type=float, default=0.05,
+                        help="Share of values replaced by the missing-value sentinels")
+    parser.add_argument("--gap-rate", type=float, default=0.02, help="Share of days without a report")
+    args = parser.parse_args()
+
+    manifest = generate_gsod(args.output_dir, args.stations, args.years, args.start_year, args.seed,
+                             args.missing_rate, args.gap_rate)
+    print(f"Wrote {manifest['files']} files, {manifest['rows']} rows, {manifest['bytes'] / 1024 / 1024:.1f} MB "
+          f"to {args.output_dir} ({len(manifest['zero_coordinates'])} stations at (0, 0), "
+          f"{len(manifest['bogus'])} BOGUS, {len(manifest['outside'])} outside China)")
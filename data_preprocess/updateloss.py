@@ -1,7 +1,17 @@
 import os
-import pandas as pd
+import re
+import csv
 import io
 import json
+import time
+import shutil
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import columnar_store
+import instrumentation
+import province_index
+import static_compress
+import station_registry
 
 # --- Configuration ---
 DIRECTORY_PATH = "processed_cn_gsod"  # Directory containing the CSV files
@@ -12,306 +22,348 @@ LON_COL_CANDIDATES_CSV = ['LONGITUDE', 'LON', 'lon', '经度', 'Longitude']
 LAT_KEY_CANDIDATES_JSON = ['latitude', 'lat', 'Latitude', 'LAT']
 LON_KEY_CANDIDATES_JSON = ['longitude', 'lon', 'Longitude', 'LON']
 
+# --- Batch correction engine ---
+WEATHER_DATA_FILE = "weather_data.json"  # Output of process_weather_data.py, patched in the same pass
+DEFAULT_WORKERS = 8
+CORRECTION_COLUMNS = ['文件名', '站点名', '修正纬度', '修正经度']  # filename, station name, latitude, longitude
+# Keys of the first record in the per-station JSON written by process.py (a list of row objects)
+LAT_KEY_CANDIDATES_RECORD = ['LATITUDE'] + LAT_KEY_CANDIDATES_JSON
+LON_KEY_CANDIDATES_RECORD = ['LONGITUDE'] + LON_KEY_CANDIDATES_JSON
+JSON_NUMBER_PATTERN = r'(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?|null|NaN)'
+JSON_HEAD_CHUNK = 64 * 1024
+# Station registry (repository root); its overrides are the default corrections
+STATION_REGISTRY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, station_registry.REGISTRY_FILE)
 
-# --- Helper function to find column/key ---
-def find_key_or_column(data_object, candidates):
-    """
-    Finds the first matching candidate key in a dictionary or column in a DataFrame.
-    For DataFrame, it checks data_object.columns.
-    For dict, it checks data_object.keys().
-    """
-    if isinstance(data_object, pd.DataFrame):
-        collection = data_object.columns
-    elif isinstance(data_object, dict):
-        collection = data_object.keys()
-    else:
-        return None
 
+# --- Helper function to find column/key ---
+def find_key_or_column(keys, candidates):
+    """Returns the first candidate present in keys (a dict or the header of a CSV file), or None."""
     for key_name in candidates:
-        if key_name in collection:
+        if key_name in keys:
             return key_name
     return None
 
-# --- Main update function ---
-def update_csv_and_json_coordinates(directory, csv_filename, new_lat, new_lon, station_name_for_log="N/A"):
+
+# --- Batch correction engine ---
+def load_corrections(source):
     """
-    Updates the latitude and longitude in the first row of a given CSV file
-    and its corresponding JSON file if it exists.
+    Parses a corrections table (CSV text or a file-like object with the columns
+    文件名,站点名,修正纬度,修正经度) into a list of {filename, name, latitude, longitude}.
+    Rows with a missing filename or unparseable coordinates are reported and skipped;
+    when a file is listed more than once, the last row wins so every file is written once.
     """
-    csv_file_path = os.path.join(directory, csv_filename)
-    base_filename, _ = os.path.splitext(csv_filename)
-    json_filename = base_filename + ".json"
-    json_file_path = os.path.join(directory, json_filename)
-
-    print(f"\nProcessing CSV: {csv_filename} (Station: \"{station_name_for_log}\")")
-    csv_updated = False
-    json_updated = False
-
-    # --- Update CSV ---
-    if not os.path.exists(csv_file_path):
-        print(f"  ERROR (CSV): File '{csv_filename}' not found in '{directory}'. Skipping CSV update.")
-    else:
+    reader = csv.DictReader(io.StringIO(source) if isinstance(source, str) else source, skipinitialspace=True)
+    missing = [column for column in CORRECTION_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"Corrections table is missing the columns: {missing}")
+
+    corrections = {}
+    for line_number, row in enumerate(reader, start=2):
+        filename = (row['文件名'] or '').strip()
         try:
-            df = pd.read_csv(csv_file_path, encoding='utf-8', skipinitialspace=True)
-            if df.empty:
-                print(f"  ERROR (CSV): File '{csv_filename}' is empty. Skipping CSV update.")
-            else:
-                lat_col_actual = find_key_or_column(df, LAT_COL_CANDIDATES_CSV)
-                lon_col_actual = find_key_or_column(df, LON_COL_CANDIDATES_CSV)
-
-                if not lat_col_actual:
-                    print(f"  ERROR (CSV): Latitude column not found in '{csv_filename}'. Searched for: {LAT_COL_CANDIDATES_CSV}. Skipping CSV update.")
-                elif not lon_col_actual:
-                    print(f"  ERROR (CSV): Longitude column not found in '{csv_filename}'. Searched for: {LON_COL_CANDIDATES_CSV}. Skipping CSV update.")
-                else:
-                    try:
-                        current_lat_csv = df.loc[0, lat_col_actual]
-                        current_lon_csv = df.loc[0, lon_col_actual]
-                        df.loc[0, lat_col_actual] = float(new_lat)
-                        df.loc[0, lon_col_actual] = float(new_lon)
-                        df.to_csv(csv_file_path, index=False, encoding='utf-8')
-                        print(f"  SUCCESS (CSV): Updated '{csv_filename}'. Old (Lat,Lon): ({current_lat_csv},{current_lon_csv}) -> New (Lat,Lon): ({new_lat},{new_lon}).")
-                        csv_updated = True
-                    except ValueError:
-                        print(f"  ERROR (CSV): Invalid new latitude '{new_lat}' or longitude '{new_lon}' for '{csv_filename}'. Must be numbers. Skipping CSV update.")
-                    except KeyError:
-                        print(f"  ERROR (CSV): Could not access row 0 for lat/lon columns in '{csv_filename}'. File might be structured differently or too short. Skipping CSV update.")
-        except pd.errors.EmptyDataError:
-            print(f"  ERROR (CSV): File '{csv_filename}' is empty or malformed (pandas EmptyDataError). Skipping CSV update.")
-        except Exception as e:
-            print(f"  ERROR (CSV): An unexpected error occurred while processing '{csv_filename}': {e}. Skipping CSV update.")
-
-    # --- Update JSON (only if CSV was successfully updated or if we proceed regardless) ---
-    # Let's attempt JSON update even if CSV failed, but report separately.
-    # Or, only if csv_updated: if csv_updated:
-    
-    print(f"Processing JSON: {json_filename}")
-    if not os.path.exists(json_file_path):
-        print(f"  INFO (JSON): File '{json_filename}' not found. No JSON update performed.")
-    else:
+            latitude, longitude = float(row['修正纬度']), float(row['修正经度'])
+        except (TypeError, ValueError):
+            latitude = longitude = None
+        if not filename or latitude is None:
+            print(f"ERROR: Invalid corrections row {line_number} (Filename: {filename or None}, "
+                  f"Lat: {row['修正纬度']}, Lon: {row['修正经度']}). Skipping.")
+            continue
+        if filename in corrections:
+            print(f"WARNING: '{filename}' is listed more than once; using the row on line {line_number}.")
+        corrections[filename] = {'filename': filename, 'name': (row['站点名'] or '').strip(),
+                                 'latitude': latitude, 'longitude': longitude}
+    return list(corrections.values())
+
+
+def _refresh_compressed_siblings(path):
+    """Re-creates the .gz/.br siblings a rewritten file already had, so they never go stale."""
+    encodings = [encoding for encoding, suffix in static_compress.ENCODINGS.items() if os.path.exists(path + suffix)]
+    if encodings:
+        static_compress.compress_file(path, encodings)
+
+
+def _rewrite_atomically(path, head, src):
+    """Writes head followed by the rest of src to path via a temporary file; returns the bytes written."""
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as dst:
+            dst.write(head)
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _refresh_compressed_siblings(path)
+    return os.path.getsize(path)
+
+
+def _read_csv_record(f):
+    """Reads one CSV record (which may span lines inside quotes) and returns its raw text."""
+    text = f.readline()
+    while text.count('"') % 2 and text:
+        line = f.readline()
+        if not line:
+            break
+        text += line
+    return text
+
+
+def patch_csv_first_row(csv_file_path, new_lat, new_lon):
+    """
+    Sets the latitude/longitude of the first data row of a station CSV without
+    parsing the rest of the file: the header and row 0 are parsed, row 0 is
+    re-serialized and the remaining rows are copied through unchanged.
+    Returns (old_lat, old_lon, bytes_written).
+    """
+    with open(csv_file_path, 'r', encoding='utf-8', newline='') as f:
+        header_text = _read_csv_record(f)
+        row_text = _read_csv_record(f)
+        if not row_text.strip():
+            raise ValueError("file has no data rows")
+        header = [column.strip() for column in next(csv.reader([header_text]))]
+        row = next(csv.reader([row_text]))
+        lat_col = find_key_or_column(header, LAT_COL_CANDIDATES_CSV)
+        lon_col = find_key_or_column(header, LON_COL_CANDIDATES_CSV)
+        if not lat_col or not lon_col:
+            raise KeyError(f"latitude/longitude columns not found (searched {LAT_COL_CANDIDATES_CSV} / {LON_COL_CANDIDATES_CSV})")
+        lat_index, lon_index = header.index(lat_col), header.index(lon_col)
+        if max(lat_index, lon_index) >= len(row):
+            raise KeyError("row 0 is shorter than the header")
+        old_lat, old_lon = row[lat_index], row[lon_index]
+        row[lat_index], row[lon_index] = repr(float(new_lat)), repr(float(new_lon))
+
+        line_ending = '\r\n' if row_text.endswith('\r\n') else '\n'
+        new_row = io.StringIO()
+        csv.writer(new_row, lineterminator=line_ending).writerow(row)
+        return old_lat, old_lon, _rewrite_atomically(csv_file_path, header_text + new_row.getvalue(), f)
+
+
+def _patch_json_key(text, candidates, value):
+    """Replaces the value of the first candidate key found in text; returns (text, old value or None)."""
+    for key in candidates:
+        pattern = re.compile(r'("' + re.escape(key) + r'"\s*:\s*)' + JSON_NUMBER_PATTERN)
+        match = pattern.search(text)
+        if match:
+            return text[:match.start(2)] + repr(float(value)) + text[match.end(2):], match.group(2)
+    return text, None
+
+
+def patch_json_first_record(json_file_path, new_lat, new_lon):
+    """
+    Sets the latitude/longitude of the first record of a station JSON file. Only
+    the text up to the end of the first object is searched and patched; the
+    rest of the file is copied through unchanged. Returns (old_lat, old_lon, bytes_written).
+    """
+    with open(json_file_path, 'r', encoding='utf-8', newline='') as f:
+        head = ''
+        while '}' not in head:
+            chunk = f.read(JSON_HEAD_CHUNK)
+            if not chunk:
+                break
+            head += chunk
+        end = head.find('}')
+        if not head.lstrip().startswith(('[', '{')) or end < 0:
+            raise ValueError("not a JSON object or list of objects")
+        first, remainder = head[:end], head[end:]
+        first, old_lat = _patch_json_key(first, LAT_KEY_CANDIDATES_RECORD, new_lat)
+        first, old_lon = _patch_json_key(first, LON_KEY_CANDIDATES_RECORD, new_lon)
+        if old_lat is None or old_lon is None:
+            raise KeyError(f"latitude/longitude keys not found in the first record "
+                           f"(searched {LAT_KEY_CANDIDATES_RECORD} / {LON_KEY_CANDIDATES_RECORD})")
+        return old_lat, old_lon, _rewrite_atomically(json_file_path, first + remainder, f)
+
+
+def correct_station_files(directory, correction):
+    """
+    Applies one correction to the station's CSV and JSON files. Never raises:
+    returns {filename, csv, json, old, bytes_written, errors} where csv/json are
+    "updated", "missing" or "error".
+    """
+    filename = correction['filename']
+    result = {'filename': filename, 'name': correction['name'], 'csv': 'missing', 'json': 'missing',
+              'old': None, 'bytes_written': 0, 'errors': []}
+    base_filename, _ = os.path.splitext(filename)
+    targets = [('csv', os.path.join(directory, filename), patch_csv_first_row),
+               ('json', os.path.join(directory, base_filename + '.json'), patch_json_first_record)]
+    for kind, path, patch in targets:
+        if not os.path.exists(path):
+            continue
         try:
-            with open(json_file_path, 'r', encoding='utf-8') as f:
-                json_data = json.load(f)
-
-            if not isinstance(json_data, dict):
-                print(f"  ERROR (JSON): File '{json_filename}' does not contain a valid JSON object at the root. Skipping JSON update.")
-            else:
-                lat_key_actual = find_key_or_column(json_data, LAT_KEY_CANDIDATES_JSON)
-                lon_key_actual = find_key_or_column(json_data, LON_KEY_CANDIDATES_JSON)
-
-                updated_json_coords = False
-                if lat_key_actual:
-                    current_lat_json = json_data.get(lat_key_actual)
-                    json_data[lat_key_actual] = float(new_lat)
-                    print(f"  INFO (JSON): Updated '{lat_key_actual}' from {current_lat_json} to {new_lat} in '{json_filename}'.")
-                    updated_json_coords = True
-                else:
-                    print(f"  WARNING (JSON): Latitude key not found in '{json_filename}'. Searched for: {LAT_KEY_CANDIDATES_JSON}.")
-
-                if lon_key_actual:
-                    current_lon_json = json_data.get(lon_key_actual)
-                    json_data[lon_key_actual] = float(new_lon)
-                    print(f"  INFO (JSON): Updated '{lon_key_actual}' from {current_lon_json} to {new_lon} in '{json_filename}'.")
-                    updated_json_coords = True # Stays true if lat was also updated
-                else:
-                    print(f"  WARNING (JSON): Longitude key not found in '{json_filename}'. Searched for: {LON_KEY_CANDIDATES_JSON}.")
-                
-                if updated_json_coords: # Only save if at least one coordinate was found and updated
-                    with open(json_file_path, 'w', encoding='utf-8') as f:
-                        json.dump(json_data, f, indent=4, ensure_ascii=False)
-                    print(f"  SUCCESS (JSON): File '{json_filename}' saved with updated coordinates.")
-                    json_updated = True
-                elif not lat_key_actual and not lon_key_actual:
-                     print(f"  ERROR (JSON): Neither latitude nor longitude keys found in '{json_filename}'. No JSON update performed.")
-                else:
-                    print(f"  INFO (JSON): File '{json_filename}' not saved as only one or no coordinate keys were updated.")
-
-
-        except json.JSONDecodeError:
-            print(f"  ERROR (JSON): File '{json_filename}' is not a valid JSON file. Skipping JSON update.")
-        except ValueError:
-            print(f"  ERROR (JSON): Invalid new latitude '{new_lat}' or longitude '{new_lon}' for '{json_filename}' (conversion to float failed). Skipping JSON update.")
+            old_lat, old_lon, size = patch(path, correction['latitude'], correction['longitude'])
         except Exception as e:
-            print(f"  ERROR (JSON): An unexpected error occurred while processing '{json_filename}': {e}. Skipping JSON update.")
-            
-    return csv_updated, json_updated
+            result[kind] = 'error'
+            result['errors'].append(f"{kind.upper()} {os.path.basename(path)}: {e}")
+            continue
+        result[kind] = 'updated'
+        result['old'] = result['old'] or (old_lat, old_lon)
+        result['bytes_written'] += size
+    return result
+
+
+def correct_parquet_station(dataset_dir, correction):
+    """Parquet counterpart of correct_station_files (only the station's earliest file is rewritten)."""
+    station_id, _ = os.path.splitext(correction['filename'])
+    result = {'filename': correction['filename'], 'name': correction['name'], 'parquet': 'missing',
+              'old': None, 'bytes_written': 0, 'errors': []}
+    try:
+        result['old'] = columnar_store.update_first_row_coordinates(
+            dataset_dir, station_id, correction['latitude'], correction['longitude'])
+    except FileNotFoundError:
+        return result
+    except Exception as e:
+        result['parquet'] = 'error'
+        result['errors'].append(f"Parquet {station_id}: {e}")
+        return result
+    result['parquet'] = 'updated'
+    result['bytes_written'] = os.path.getsize(columnar_store.station_files(dataset_dir, station_id)[0])
+    return result
+
+
+def patch_weather_data(path, corrections, provinces=None):
+    """
+    Applies the corrections to the aggregated output of process_weather_data.py in
+    one load/write: the station table (v2, binary header, v2 shard index) or the
+    per-month records (v1). provinces (a ProvinceIndex) re-assigns the province
+    of corrected stations; without it the existing province field is kept.
+    Returns (number of stations patched, bytes written), or None when the file cannot be patched.
+    """
+    coordinates = {os.path.splitext(c['filename'])[0]: (c['latitude'], c['longitude']) for c in corrections}
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    index = data.get('metadata', {}).get('index') if 'data' not in data else None
+    if index:  # sharded output: weather_data.json only names the shard index
+        return patch_weather_data(os.path.join(os.path.dirname(path), index), corrections, provinces)
+
+    if 'stations' in data:
+        records = [{field: values[i] for field, values in data['stations'].items()}
+                   for i in range(len(data['stations']['station_id']))]
+        tables = [(data['stations'], i, record) for i, record in enumerate(records)]
+    elif isinstance(data.get('data'), dict):
+        tables = [(None, None, record) for month_records in data['data'].values() for record in month_records]
+    else:
+        print(f"  WARNING: '{path}' has no station table or per-month records (v1 shard index?); "
+              f"rerun process_weather_data.py to refresh it.")
+        return None
+
+    patched = set()
+    for table, i, record in tables:
+        new = coordinates.get(record['station_id'])
+        if new is None:
+            continue
+        record['lat'], record['lng'] = new
+        if provinces is not None and 'province' in record:
+            record['province'] = provinces.lookup(*new)
+        if table is not None:
+            for field in ('lat', 'lng', 'province'):
+                if field in record:
+                    table[field][i] = record[field]
+        patched.add(record['station_id'])
+    if not patched:
+        return 0, 0
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        if 'format_version' in data:  # v2 / binary header / shard index are written without indentation
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        else:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    _refresh_compressed_siblings(path)
+    return len(patched), os.path.getsize(path)
+
+
+def apply_corrections(corrections, directory=DIRECTORY_PATH, parquet_dir=None, weather_data=WEATHER_DATA_FILE,
+                      workers=DEFAULT_WORKERS, province_geojson=None):
+    """
+    Applies a corrections table of any size: every station's files are patched
+    in parallel (each file written once, atomically), then weather_data is
+    patched in the same pass when it exists. Returns the per-station results.
+    """
+    correct = correct_parquet_station if parquet_dir else correct_station_files
+    target = parquet_dir or directory
+    with instrumentation.stage("correct") as stage:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            results = list(executor.map(lambda correction: correct(target, correction), corrections))
+        seconds = time.perf_counter() - start
+        statuses = [status for result in results for key, status in result.items() if key in ('csv', 'json', 'parquet')]
+        updated = statuses.count('updated')
+        corrected = sum(result['old'] is not None for result in results)
+        bytes_written = sum(result['bytes_written'] for result in results)
+        # rows: the corrections applied (one first-row record per station, whatever the number of its files)
+        stage.add(files=updated, rows=corrected, bytes_written=bytes_written, errors=statuses.count('error'))
+
+    for result in results:
+        if result['old'] is not None:
+            print(f"  UPDATED: {result['filename']} (\"{result['name']}\") Old (Lat,Lon): "
+                  f"({result['old'][0]},{result['old'][1]})")
+        for error in result['errors']:
+            print(f"  ERROR: {error}")
+    print(f"\nRewrote {updated} files ({bytes_written / 1024 / 1024:.2f} MB) in {seconds:.2f} s "
+          f"({updated / seconds if seconds > 0 else 0:.0f} files/sec).")
+
+    if weather_data and not parquet_dir:
+        if not os.path.exists(weather_data):
+            print(f"INFO: '{weather_data}' not found; only station files were corrected.")
+        else:
+            provinces = None
+            if province_geojson and os.path.exists(province_geojson):
+                provinces = province_index.ProvinceIndex.from_geojson(province_geojson)
+            with instrumentation.stage("weather_data") as stage:
+                patched = patch_weather_data(weather_data, corrections, provinces)
+                if patched is not None:
+                    stage.add(files=1, rows=patched[0], bytes_written=patched[1])
+            if patched is not None:
+                print(f"Patched {patched[0]} stations in '{weather_data}' ({patched[1] / 1024 / 1024:.2f} MB).")
+                if provinces is None:
+                    print("  NOTE: province fields were kept; pass --province-geojson to re-assign them.")
+    return results
 
 
 # --- Main script execution ---
 if __name__ == "__main__":
-    # Paste the multi-line string data here
-    corrections_data_string = """文件名,站点名,修正纬度,修正经度
-50845099999.csv,"NAME LOCATION UNKN, CH",43.95,116.07
-50945099999.csv,"TA AN, CH",45.50,124.28
-50954099999.csv,"CHAO YUAN, CH",45.52,125.07
-52303099999.csv,"YA MAN SU, CH",41.90,100.20
-52671099999.csv,"SALT LAKE, CH",36.80,99.08
-52854099999.csv,"JIANG XI GOU, CH",36.58,100.75
-52864099999.csv,"HUANG YUAN, CH",36.68,101.25
-53376099999.csv,"BA DAO GOU, CH",40.40,115.50
-53488099999.csv,"CHU LE P U, CH",40.97,112.53
-53945099999.csv,"HUANG LONG, CH",35.58,109.83
-53985099999.csv,"SHEN CHUANG, CH",35.53,110.50
-54276099999.csv,"JING YU, CH",42.37,126.80
-54336099999.csv,"TAI AN SOUTHEAST, CH",40.50,123.08
-54338099999.csv,"PAN SHAN, CH",41.18,122.05
-54378099999.csv,"CHING ZHI, CH",41.27,119.73
-54529099999.csv,"CHAI SHANG, CH",39.73,116.95
-54614099999.csv,"HE JIAN, CH",38.43,116.08
-54625099999.csv,"QI KOU, CH",38.95,118.88
-54723099999.csv,"ZHAN CHENG, CH",37.68,118.13
-54726099999.csv,"BIN XIAN, CH",37.49,118.13
-54743099999.csv,"NAME UNKNOWN, CH",36.70,117.05
-54853099999.csv,"NANWU, CH",35.20,118.83
-54923099999.csv,"MENG YIN, CH",35.70,117.92
-56023099999.csv,"NAME LOCATION UNKN, CH",31.48,92.07
-56036099999.csv,"CANG DUO, CH",31.22,96.60
-56089099999.csv,"BAI GU SI, CH",32.93,97.02
-56138099999.csv,"QING NI DONG, CH",31.62,99.00
-56147099999.csv,"CHUN LUO SI, CH",31.75,99.90
-56237099999.csv,"BANG DA, CH",30.05,98.27
-56375099999.csv,"HAN YUAN JIE, CH",29.35,102.68
-56384099999.csv,"E BIAN, CH",29.23,102.77
-56472099999.csv,"GAN LUO, CH",28.97,102.77
-56474099999.csv,"MIAN NING, CH",28.55,102.17
-56561099999.csv,"DA CUN, CH",27.50,103.22
-56581099999.csv,"TIAN DI BA, CH",26.85,102.78
-56674099999.csv,"OGUS CHINESE, CH",26.53,101.73
-56915099999.csv,"NAME LOCATION UNKN, CH",24.45,98.60
-56916099999.csv,"NAME LOCATION UNKN, CH",24.43,98.33
-56979099999.csv,"JIE JIE, CH",23.73,103.25
-56982099999.csv,"KAI YUAN, CH",23.70,103.25
-57063099999.csv,"MIAN CHI, CH",34.77,111.77
-57093099999.csv,"NAO KAO, CH",21.48,101.57
-57128099999.csv,"YANG XIAN, CH",33.22,107.55
-57137099999.csv,"SHI QUAN, CH",33.05,108.25
-57457099999.csv,"GUAN DIAN GOU, CH",30.67,108.03
-57466099999.csv,"JIANG KOU, CH",29.28,107.88
-57477099999.csv,"SHA SHI, CH",30.32,112.25
-57525099999.csv,"XIANG GOU, CH",29.53,106.57
-57527099999.csv,"NAN CHUAN, CH",29.15,107.10
-57597099999.csv,"MA AO, CH",29.60,121.80
-57607099999.csv,"DA BA, CH",29.00,107.87
-57623099999.csv,"CHEN NAN, CH",28.97,110.32
-57632099999.csv,"CHANG PU QI, CH",28.17,113.62
-57645099999.csv,"HUA YUAN, CH",27.90,109.83
-57663099999.csv,"HAN SHOU, CH",28.90,111.97
-57666099999.csv,"MA JI TANG, CH",27.52,110.40
-57672099999.csv,"YUAN JIANG, CH",28.85,112.35
-57732099999.csv,"DE WANG, CH",26.80,109.17
-57792099999.csv,"YI CHUN, CH",27.80,114.38
-57813099999.csv,"YANG CHANG, CH",27.55,111.50
-57958099999.csv,"NAME UNKNOWN, CH",26.23,111.62
-57966099999.csv,"NING YUAN, CH",25.60,111.95
-57973099999.csv,"GUI YANG, CH",26.58,106.72
-57983099999.csv,"NAME UNKNOWN, CH",25.83,105.18
-58202099999.csv,"TSAOCHUANG, CH",32.97,117.90
-58211099999.csv,"YING SHANG, CH",32.63,116.27
-58231099999.csv,"JIA SHAN, CH",30.83,121.02
-58252099999.csv,"AN FENG, CH",32.40,119.57
-58323099999.csv,"SHIH TANG JIAO BASE, CH",31.33,121.50
-58324099999.csv,"SHAN HE, CH",30.23,118.12
-58327099999.csv,"KONG CHENG, CH",31.65,118.48
-58438099999.csv,"JING DE, CH",30.28,117.57
-58447099999.csv,"HE QIAO, CH",30.72,118.95
-58456099999.csv,"HUANG WAN, CH",29.83,121.52
-58458099999.csv,"SHAO XING, CH",30.00,120.58
-58462099999.csv,"MIN HANG, CH",31.00,121.40
-58467099999.csv,"YU YAO, CH",30.05,121.15
-58478099999.csv,"ZHI ZHI ISLAND, CH",30.85,122.87
-58654099999.csv,"JIN YUN, CH",28.65,120.05
-58655099999.csv,"YONG LIN, CH",28.37,121.38
-58713099999.csv,"HUANG SHI DU, CH",26.83,118.93
-58734099999.csv,"JIAN YANG, CH",27.33,118.12
-58736099999.csv,"XIONG MOUNTAIN, CH",27.00,117.67
-58747099999.csv,"LI MEN, CH",27.33,119.92
-58749099999.csv,"FU AN, CH",27.10,119.65
-58753099999.csv,"RUI AN, CH",27.78,120.63
-58848099999.csv,"SANYA, CH",18.23,109.52
-58854099999.csv,"XI YANG ISLAND, CH",16.83,112.33
-58864099999.csv,"TUNG YIN ISLAND, CH",26.37,120.50
-58932099999.csv,"NAME UNKNOWN ONC, CH",24.97,118.58
-58934099999.csv,"YONG CHUN, CH",25.33,118.30
-59076099999.csv,"NAME UNKNOWN ONC, CH",23.73,114.68
-59077099999.csv,"XIA SHUI XU, CH",23.42,114.93
-59086099999.csv,"XIN JIANG, CH",23.17,114.42
-59092099999.csv,"CHENG LONG, CH",22.70,114.57
-59097099999.csv,"XINFENG, CH",24.07,114.20
-59109099999.csv,"XING NING, CH",24.15,115.73
-59217099999.csv,"RONG LAO XIANG, CH",22.87,110.87
-59234099999.csv,"QIAO LI, CH",22.68,110.20
-59258099999.csv,"LIU CHEN, CH",22.35,110.17
-59277099999.csv,"LU BU, CH",23.18,112.28
-59288099999.csv,"GUANG ZHOU EAST, CH",23.12,113.32
-59297099999.csv,"BO LUO, CH",23.17,114.28
-59326099999.csv,"XIONG DI ISLAND, CH",20.88,113.20
-59473099999.csv,"HE QING, CH",22.70,110.35
-59622099999.csv,"DONG JIAO, CH",20.03,110.35
-59633099999.csv,"BAI MU, CH",19.73,110.80
-59648099999.csv,"FOU TOU, CH",19.93,110.58
-59683099999.csv,"BEI JIAN ISLAND, CH",21.05,111.30
-59745099999.csv,"XI CUN, CH",20.25,110.20
-59748099999.csv,"LIN GAO CAPE, CH",20.00,109.70
-59755099999.csv,"CHIN HO CHIN NANG, CH",19.52,110.80
-59848099999.csv,"BAI SHA, CH",19.23,109.43
-59938099999.csv,"HUANG LIU, CH",18.50,108.80
-59945099999.csv,"BAO TING, CH",18.64,109.70
-"""
+    parser = argparse.ArgumentParser(description="Apply coordinate corrections to processed station files.")
+    parser.add_argument("--parquet", default=None,
+                        help="Apply the corrections to this Parquet dataset instead of the CSV/JSON files in DIRECTORY_PATH")
+    parser.add_argument("--corrections", default=None,
+                        help="CSV file with the columns 文件名,站点名,修正纬度,修正经度 (default: the overrides of --station-registry)")
+    parser.add_argument("--station-registry", default=STATION_REGISTRY_FILE,
+                        help="Station registry whose overrides are applied when --corrections is not given (default: station_registry.json)")
+    parser.add_argument("--weather-data", default=WEATHER_DATA_FILE,
+                        help=f"Aggregated output of process_weather_data.py to patch in the same pass (default: {WEATHER_DATA_FILE}; '' to skip)")
+    parser.add_argument("--province-geojson", default=None,
+                        help=f"Province boundaries (e.g. {province_index.PROVINCE_GEOJSON}) used to re-assign the province of corrected stations")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Threads that rewrite station files in parallel (default: {DEFAULT_WORKERS})")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.configure_from_args("updateloss", args)
 
     print("--- Starting Coordinate Update Process ---")
-    print(f"IMPORTANT: This script will modify files in '{DIRECTORY_PATH}'.")
+    print(f"IMPORTANT: This script will modify files in '{args.parquet or DIRECTORY_PATH}'.")
     print("Ensure you have a backup if necessary.")
-    
+
     try:
-        # Use pandas to read the corrections data string for robustness
-        corrections_df = pd.read_csv(io.StringIO(corrections_data_string))
+        if args.corrections:
+            with open(args.corrections, 'r', encoding='utf-8-sig', newline='') as f:
+                corrections = load_corrections(f)
+        else:
+            # process.py already applies the registry at ingest; this
+            # patches files that were processed before an override was added
+            corrections = station_registry.load(args.station_registry).corrections()
     except Exception as e:
-        print(f"\nFATAL ERROR: Could not parse the corrections data string: {e}")
+        print(f"\nFATAL ERROR: Could not parse the corrections data: {e}")
         print("Please ensure the data is in the correct CSV format.")
         exit()
 
-    successful_csv_updates = 0
-    successful_json_updates = 0
-    failed_csv_updates = 0
-    failed_json_attempts = 0 # Counts files where JSON update was attempted but might have failed or keys not found
-
-    for index, row in corrections_df.iterrows():
-        try:
-            filename = row['文件名']
-            station_name = row['站点名']
-            new_lat = row['修正纬度']
-            new_lon = row['修正经度']
-        except KeyError as e:
-            print(f"\nERROR: Missing expected column {e} in corrections data row {index+2}. Skipping row: {row.to_dict()}")
-            # Since we can't get filename, we can't count it as a CSV or JSON failure specifically for a file
-            continue
-
-        if pd.isna(filename) or pd.isna(new_lat) or pd.isna(new_lon):
-            print(f"\nERROR: Missing data in corrections row {index+2} (Filename: {filename}, Lat: {new_lat}, Lon: {new_lon}). Skipping.")
-            # Similar to above, can't attribute failure to a specific file type if filename is NaN
-            continue
-            
-        csv_success, json_success = update_csv_and_json_coordinates(DIRECTORY_PATH, str(filename), new_lat, new_lon, str(station_name))
-        
-        if csv_success:
-            successful_csv_updates += 1
-        else:
-            failed_csv_updates += 1
-        
-        # For JSON, we count success if it was updated.
-        # If JSON file existed and was attempted, it's either a success or a failed attempt.
-        json_file_path = os.path.join(DIRECTORY_PATH, os.path.splitext(str(filename))[0] + ".json")
-        if os.path.exists(json_file_path): # If JSON file exists, an attempt was made or will be made
-            if json_success:
-                successful_json_updates += 1
-            else:
-                failed_json_attempts +=1 # This counts if JSON existed but wasn't successfully updated (e.g. key not found, error)
-        # If JSON file doesn't exist, it's not counted as a failed attempt, it's just 'not found'.
+    print(f"Applying {len(corrections)} corrections with {args.workers} workers ...")
+    results = apply_corrections(corrections, DIRECTORY_PATH, args.parquet, args.weather_data, args.workers,
+                                args.province_geojson)
 
     print("\n--- Update Process Summary ---")
-    print(f"Successfully updated CSV files: {successful_csv_updates}")
-    print(f"Failed to update CSV files (or file not found/empty): {failed_csv_updates}")
-    print(f"Successfully updated JSON files: {successful_json_updates}")
-    print(f"Attempted JSON updates that did not succeed (e.g., file existed but keys not found, or error): {failed_json_attempts}")
-    print("Note: JSON files not found are reported during processing but not counted as 'failed attempts' here.")
-    print("------------------------------")
\ No newline at end of file
+    for kind in (['parquet'] if args.parquet else ['csv', 'json']):
+        statuses = [result[kind] for result in results]
+        print(f"{kind.upper()} files: {statuses.count('updated')} updated, {statuses.count('error')} failed, "
+              f"{statuses.count('missing')} not found")
+    print("------------------------------")
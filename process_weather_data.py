@@ -1,76 +1,622 @@
 import os
 import json
+import hashlib
+import sys
+import argparse
+import functools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import glob
+from data_preprocess import columnar_store, instrumentation, province_index, quality_control, static_compress
 
-def process_csv_files():
+# 必要的列
+REQUIRED_COLUMNS = ['STATION', 'DATE', 'LATITUDE', 'LONGITUDE', 'NAME', 'TEMP', 'PRCP']
+# 增量构建缓存目录及版本 (部分聚合结果的结构变化时需要递增版本)
+CACHE_DIR = '.weather_cache'
+CACHE_VERSION = 2
+# weather_data.json 格式: v1 每月为完整的站点对象列表 (缩进)；v2 为站点表 + 每月平行数组 (紧凑)；
+# binary 为 JSON 头 (站点表与月份列表) + 月份×站点的 little-endian Float32 矩阵文件
+DATA_FORMATS = ('v1', 'v2', 'binary')
+BINARY_VARIABLES = ('temperature', 'precipitation')
+# v2 格式中温度/降水保留的小数位数
+COMPACT_PRECISION = 2
+# 分片输出: 索引文件 + 每年 (或每月) 一个分片，分片文件名包含内容哈希，可长期缓存
+SHARD_CHOICES = ('none', 'year', 'month')
+INDEX_FILE = 'weather_data_index.json'
+SHARD_DIR = 'weather_data'
+# 省份×月份汇总文件 (前端播放时直接读取，无需逐月重新分组统计)
+ROLLUP_FILE = 'province_rollup.json'
+ROLLUP_PRECISION = 2
+ROLLUP_FIELDS = [
+    'stationCount', 'avgTemperature', 'maxTemperature', 'minTemperature',
+    'avgPrecipitation', 'maxPrecipitation', 'minPrecipitation'
+]
+# 月度完整性: 站点月份的温度/降水有效天数低于阈值时标记 (mark，写入 incomplete 位掩码) 或丢弃 (drop)
+COMPLETENESS_POLICIES = ('mark', 'drop')
+INCOMPLETE_BITS = {'temperature': 1, 'precipitation': 2}
+# 每条记录中各数值对应的有效天数字段
+DAY_FIELDS = {'temperature': 'temperature_days', 'precipitation': 'precipitation_days'}
+# 部分聚合结果的列：每个站点每月的首行元数据，以及温度/降水的累加和与计数
+PARTIAL_COLUMNS = [
+    'station_id', 'year_month', 'lat', 'lng', 'name',
+    'TEMP_sum', 'TEMP_count', 'PRCP_sum', 'PRCP_count'
+]
+# 扩展变量聚合 (--aggregate): process.py 输出的其他变量，每个变量可选多个归约方式；
+# 部分聚合结果中每个变量有 和/计数/最小值/最大值 四列，在温度/降水的同一次分组归约中计算
+# (STP 不支持: GSOD 省略了 1000 hPa 以上气压的千位)
+AGGREGATE_VARIABLES = ('MAX', 'MIN', 'DEWP', 'HMD', 'WDSP', 'SLP', 'VISIB', 'SNDP')
+REDUCERS = ('mean', 'min', 'max', 'sum', 'count')
+VARIABLE_PARTS = ('sum', 'count', 'min', 'max')
+
+def _parse_numeric(series, allow_blank=False):
     """
-    处理所有CSV文件，按年月组织数据
-    每个站点每月的温度取平均值，降水量做加和
+    将列转换为数值，返回 (数值, 无效掩码)
+    无效掩码标记原值非空但无法转换为浮点数的行 (对应逐行循环中 float() 抛出异常的情况)
+    """
+    values = pd.to_numeric(series, errors='coerce')
+    present = series.notna()
+    if allow_blank and not pd.api.types.is_numeric_dtype(series):
+        present &= series != ''
+    invalid = present & values.isna()
+    return values.to_numpy(dtype='float64'), invalid.to_numpy()
+
+def parse_variable_specs(specs):
+    """
+    解析 --aggregate 参数 (如 ['MAX:max', 'DEWP:mean,min', 'HMD'])，返回 {变量: (归约方式, ...)}
+    只写变量名时为 mean；同一变量出现多次时合并其归约方式
+    """
+    variables = {}
+    for spec in specs or ():
+        variable, _, reducers = spec.partition(':')
+        variable = variable.strip().upper()
+        if variable not in AGGREGATE_VARIABLES:
+            raise ValueError(f"不支持聚合的变量: {variable} (可选 {', '.join(AGGREGATE_VARIABLES)})")
+        for reducer in (reducers or 'mean').split(','):
+            reducer = reducer.strip().lower()
+            if reducer not in REDUCERS:
+                raise ValueError(f"未知的归约方式: {reducer} (可选 {', '.join(REDUCERS)})")
+            if reducer not in variables.get(variable, ()):
+                variables[variable] = variables.get(variable, ()) + (reducer,)
+    return variables
+
+def variable_fields(variables):
+    """扩展变量的输出字段 [(字段名, 变量, 归约方式)]，字段名为 <变量小写>_<归约方式>，如 dewp_mean"""
+    return [(f"{variable.lower()}_{reducer}", variable, reducer)
+            for variable, reducers in (variables or {}).items() for reducer in reducers]
+
+def partial_columns(variables=None):
+    """部分聚合结果的列 (包括扩展变量的 和/计数/最小值/最大值)"""
+    return PARTIAL_COLUMNS + [f'{variable}_{part}' for variable in (variables or {}) for part in VARIABLE_PARTS]
+
+def _group_extreme(ufunc, codes, values, n_groups):
+    """按组求最小值/最大值 (ufunc 为 np.fmin/np.fmax，忽略 NaN)，没有数值的组为 NaN"""
+    result = np.full(n_groups, np.nan)
+    ufunc.at(result, codes, values)
+    return result
+
+def _ordered_group_sum(codes, values, n_groups):
+    """
+    按组求和，组内按原始行顺序从左到右依次累加
+    与 Python 内置 sum() 的浮点结果完全一致 (pandas/numpy 的分组求和会使用补偿或成对求和)
+    """
+    sums = np.zeros(n_groups, dtype='float64')
+    if len(codes) == 0:
+        return sums
+    # 稳定排序后计算每个值在组内的位置，组成 (位置 x 组) 的矩阵，逐行累加
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    positions = np.arange(len(codes)) - starts[sorted_codes]
+    matrix = np.zeros((counts.max(), n_groups), dtype='float64')
+    matrix[positions, sorted_codes] = values[order]
+    for row in matrix:
+        sums += row
+    return sums
+
+def reduce_csv_file(csv_file, counters=None, variables=None):
+    """
+    读取单个CSV文件，并用列式运算归约为站点-月份的部分聚合结果
+    文件缺少必要的列时返回 None
+    """
+    if counters is not None:
+        counters['files'] += 1
+        counters['bytes'] += os.path.getsize(csv_file)
+    return reduce_station_frame(pd.read_csv(csv_file), csv_file, counters, variables)
+
+def reduce_parquet_station(dataset_dir, station_id, counters=None, variables=None):
+    """直接从 process.py 输出的 Parquet 数据集读取一个站点 (只读必要的列与扩展变量)，并归约为部分聚合结果"""
+    columns = REQUIRED_COLUMNS + [quality_control.QC_COLUMN] + list(variables or {})
+    df = columnar_store.read_station(dataset_dir, station_id, columns=columns)
+    # float32 列取最短十进制表示对应的 float64，与读取 process.py 输出的CSV得到的数值一致
+    for column in df.columns[df.dtypes == np.float32]:
+        df[column] = columnar_store.widen_float32(df[column].to_numpy())
+    if counters is not None:
+        counters['files'] += 1
+    return reduce_station_frame(df, f"{dataset_dir}:{station_id}", counters, variables)
+
+def reduce_station_frame(df, source, counters=None, variables=None):
+    """
+    将一个站点的数据 (DataFrame) 用列式运算归约为站点-月份的部分聚合结果
+    缺少必要的列时返回 None
+    counters (见 instrumentation.new_counters) 累计读取的行数与无效行数 (日期或数值无法解析)
+    有 QC_FLAGS 列 (process.py 的质量控制) 时，未通过检查的温度/降水值不参与聚合，计入 counters['qc_flagged']
+    variables ({变量: 归约方式}，见 parse_variable_specs): 扩展变量，在同一次分组中累计 和/计数/最小值/最大值；
+    文件中没有该列或数值无法解析时视为缺失 (不计为无效行)，未通过质量控制的值同样不参与聚合
+    """
+    if counters is not None:
+        counters['rows'] += len(df)
+    if not all(col in df.columns for col in REQUIRED_COLUMNS):
+        print(f"跳过文件 {source}: 缺少必要的列")
+        return None
+
+    if df.empty:
+        return pd.DataFrame(columns=partial_columns(variables))
+
+    # 站点ID取文件第一行
+    station_id = str(df.iloc[0]['STATION'])
+
+    # 一次性解析日期，提取YYYY-MM
+    date_str = df['DATE'].astype(str)
+    valid_date = (date_str.str.len() >= 7).fillna(False).to_numpy(dtype=bool)
+
+    lat, lat_invalid = _parse_numeric(df['LATITUDE'])
+    lng, lng_invalid = _parse_numeric(df['LONGITUDE'])
+    temp, temp_invalid = _parse_numeric(df['TEMP'], allow_blank=True)
+    prcp, prcp_invalid = _parse_numeric(df['PRCP'], allow_blank=True)
+    flags = None
+    if quality_control.QC_COLUMN in df.columns:
+        flags = pd.to_numeric(df[quality_control.QC_COLUMN], errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+        temp_failed = quality_control.failed(flags, 'TEMP') & ~np.isnan(temp)
+        prcp_failed = quality_control.failed(flags, 'PRCP') & ~np.isnan(prcp)
+        temp = np.where(temp_failed, np.nan, temp)
+        prcp = np.where(prcp_failed, np.nan, prcp)
+        if counters is not None:
+            counters['qc_flagged'] += int((temp_failed | prcp_failed).sum())
+    has_temp = ~np.isnan(temp)
+    has_prcp = ~np.isnan(prcp)
+    invalid = ~valid_date | lat_invalid | lng_invalid | temp_invalid | prcp_invalid
+    if counters is not None:
+        counters['bad_rows'] += int(invalid.sum())
+
+    # 跳过无效日期、无效数值、(0,0)坐标，只保留有温度或降水数据的记录
+    mask = (
+        ~invalid
+        & ~((lat == 0.0) & (lng == 0.0))
+        & (has_temp | has_prcp)
+    )
+    if not mask.any():
+        return pd.DataFrame(columns=partial_columns(variables))
+
+    year_month = date_str[mask].str[:7].to_numpy(dtype=object)
+    codes, uniques = pd.factorize(year_month)
+    n_groups = len(uniques)
+    # 每个站点月份的元数据取该月第一条有效记录
+    first_rows = np.flatnonzero(mask)[np.unique(codes, return_index=True)[1]]
+
+    # 各列先收集到字典中，最后一次性构建 DataFrame (逐列插入的开销随扩展变量数增长)
+    columns = {
+        'station_id': station_id,
+        'year_month': uniques,
+        'lat': lat[first_rows],
+        'lng': lng[first_rows],
+        'name': [str(name).replace('"', '') for name in df['NAME'].to_numpy(dtype=object)[first_rows]],
+    }
+    for var, var_values, var_valid in (('TEMP', temp[mask], has_temp[mask]),
+                                       ('PRCP', prcp[mask], has_prcp[mask])):
+        columns[f'{var}_sum'] = _ordered_group_sum(codes[var_valid], var_values[var_valid], n_groups)
+        columns[f'{var}_count'] = np.bincount(codes[var_valid], minlength=n_groups)
+    for var in variables or {}:
+        if var in df.columns:
+            values = pd.to_numeric(df[var], errors='coerce').to_numpy(dtype='float64')[mask]
+        else:
+            values = np.full(len(codes), np.nan)
+        var_valid = ~np.isnan(values)
+        if flags is not None:
+            var_valid &= ~quality_control.failed(flags[mask], var)
+        var_codes, var_values = codes[var_valid], values[var_valid]
+        columns[f'{var}_sum'] = _ordered_group_sum(var_codes, var_values, n_groups)
+        columns[f'{var}_count'] = np.bincount(var_codes, minlength=n_groups)
+        columns[f'{var}_min'] = _group_extreme(np.fmin, var_codes, var_values, n_groups)
+        columns[f'{var}_max'] = _group_extreme(np.fmax, var_codes, var_values, n_groups)
+    return pd.DataFrame(columns)
+
+def merge_partials(partials, variables=None):
+    """
+    按文件顺序合并多个部分聚合结果
+    同一站点月份的首行元数据取最先出现的一条，累加和与计数依次相加，扩展变量的最小值/最大值取极值
+    """
+    partials = [p for p in partials if p is not None and not p.empty]
+    if not partials:
+        return pd.DataFrame(columns=partial_columns(variables))
+    combined = pd.concat(partials, ignore_index=True)
+
+    keys = combined['station_id'].astype(str) + '_' + combined['year_month'].astype(str)
+    codes, uniques = pd.factorize(keys)
+    if len(uniques) == len(combined):
+        return combined
+
+    first_rows = np.unique(codes, return_index=True)[1]
+    merged = combined.iloc[first_rows][['station_id', 'year_month', 'lat', 'lng', 'name']].reset_index(drop=True)
+    for var in ('TEMP', 'PRCP', *(variables or {})):
+        merged[f'{var}_sum'] = _ordered_group_sum(codes, combined[f'{var}_sum'].to_numpy(dtype='float64'), len(uniques))
+        merged[f'{var}_count'] = np.bincount(codes, weights=combined[f'{var}_count'], minlength=len(uniques)).astype('int64')
+    for var in variables or {}:
+        for part, ufunc in (('min', np.fmin), ('max', np.fmax)):
+            merged[f'{var}_{part}'] = _group_extreme(ufunc, codes, combined[f'{var}_{part}'].to_numpy(dtype='float64'),
+                                                     len(uniques))
+    return merged
+
+def incomplete_bits(temp_days, prcp_days, min_temperature_days=0, min_precipitation_days=0):
+    """
+    站点月份的 incomplete 位掩码 (INCOMPLETE_BITS)：有数据但有效天数低于阈值的变量置位
+    参数可以是整数或 numpy 数组 (逐元素计算)
+    """
+    temp_days = np.asarray(temp_days)
+    prcp_days = np.asarray(prcp_days)
+    return (((temp_days > 0) & (temp_days < min_temperature_days)) * INCOMPLETE_BITS['temperature']
+            | ((prcp_days > 0) & (prcp_days < min_precipitation_days)) * INCOMPLETE_BITS['precipitation'])
+
+def reduce_variable(reducer, total, count, minimum, maximum):
+    """由扩展变量的 和/计数/最小值/最大值 得到一个归约结果 (numpy 数组，逐元素)"""
+    if reducer == 'count':
+        return count
+    if reducer == 'sum':
+        return total
+    if reducer == 'min':
+        return minimum
+    if reducer == 'max':
+        return maximum
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return total / count
+
+def build_weather_data(aggregated, min_temperature_days=0, min_precipitation_days=0, policy='mark', variables=None):
+    """
+    将站点-月份聚合结果转换为按年月组织的数据点列表
+    每条记录带有温度/降水的有效天数 (temperature_days/precipitation_days，即分组归约中的计数)；
+    有效天数低于阈值时，policy 为 'mark' 写入 incomplete 位掩码 (设置了阈值时每条记录都有该字段)，
+    为 'drop' 则丢弃该数值 (两个数值都被丢弃的记录不输出)
+    variables: 扩展变量 ({变量: 归约方式})，每个归约结果为一个字段 (见 variable_fields)，没有数据时为 None
+    """
+    weather_data = {}
+
+    temp_count = aggregated['TEMP_count'].to_numpy().astype('int64')
+    prcp_count = aggregated['PRCP_count'].to_numpy().astype('int64')
+    avg_temp = aggregated['TEMP_sum'].to_numpy() / np.maximum(temp_count, 1)
+    total_prcp = aggregated['PRCP_sum'].to_numpy()
+    incomplete = incomplete_bits(temp_count, prcp_count, min_temperature_days, min_precipitation_days)
+    mark = policy == 'mark' and (min_temperature_days > 0 or min_precipitation_days > 0)
+    has_temp = temp_count > 0
+    has_prcp = prcp_count > 0
+    if policy == 'drop':
+        has_temp &= (incomplete & INCOMPLETE_BITS['temperature']) == 0
+        has_prcp &= (incomplete & INCOMPLETE_BITS['precipitation']) == 0
+    temp_count = temp_count.tolist()
+    prcp_count = prcp_count.tolist()
+    incomplete = incomplete.tolist()
+    extra_columns = []
+    for field, variable, reducer in variable_fields(variables):
+        count = aggregated[f'{variable}_count'].to_numpy().astype('int64')
+        values = reduce_variable(reducer, aggregated[f'{variable}_sum'].to_numpy(dtype='float64'), count,
+                                 aggregated[f'{variable}_min'].to_numpy(dtype='float64'),
+                                 aggregated[f'{variable}_max'].to_numpy(dtype='float64'))
+        values = values.tolist() if reducer == 'count' else np.where(count > 0, values, None).tolist()
+        extra_columns.append((field, values))
+
+    for i, (station_id, year_month, lat, lng, name) in enumerate(zip(
+            aggregated['station_id'], aggregated['year_month'],
+            aggregated['lat'].tolist(), aggregated['lng'].tolist(), aggregated['name'])):
+        if not (has_temp[i] or has_prcp[i]):
+            continue
+        if year_month not in weather_data:
+            weather_data[year_month] = []
+
+        record = {
+            'station_id': station_id,
+            'lat': lat,
+            'lng': lng,
+            'name': name,
+            'temperature': float(avg_temp[i]) if has_temp[i] else None,
+            'precipitation': float(total_prcp[i]) if has_prcp[i] else None,
+            'temperature_days': temp_count[i],
+            'precipitation_days': prcp_count[i]
+        }
+        if mark:
+            record['incomplete'] = incomplete[i]
+        for field, values in extra_columns:
+            record[field] = values[i]
+        weather_data[year_month].append(record)
+
+    return weather_data
+
+def check_province_geojson(geojson_path):
+    """
+    省份边界文件不存在时给出警告并返回 None (按 --no-province 处理，由前端按边界判断省份)，
+    否则原样返回 geojson_path (None 表示跳过省份归属)
+    """
+    if geojson_path and not os.path.exists(geojson_path):
+        print(f"警告: 省份边界文件 {geojson_path} 不存在，跳过站点省份归属 (前端将按边界判断省份)。"
+              f"可从 {province_index.PROVINCE_SOURCE_URL} 下载该文件，或使用 --no-province 关闭此警告")
+        return None
+    return geojson_path
+
+def load_province_index(geojson_path):
+    """加载省份边界并建立空间索引，geojson_path 为 None 时返回 None (输出中不写 province 字段)"""
+    if not geojson_path:
+        return None
+    index = province_index.ProvinceIndex.from_geojson(geojson_path)
+    print(f"已加载 {len(index.names)} 个省级区域边界 ({len(index.parts)} 个多边形)")
+    return index
+
+def add_province_field(weather_data, index):
+    """为每条记录写入 province 字段；相同坐标只判断一次，返回未能归属的站点数"""
+    records = [record for month_records in weather_data.values() for record in month_records]
+    provinces = index.lookup_many([record['lat'] for record in records],
+                                  [record['lng'] for record in records])
+    unknown_stations = set()
+    for record, province in zip(records, provinces):
+        record['province'] = province
+        if province == province_index.UNKNOWN_PROVINCE:
+            unknown_stations.add(record['station_id'])
+    return len(unknown_stations)
+
+def _round_or_none(value, ndigits=COMPACT_PRECISION):
+    if value is None or ndigits is None:
+        return value
+    return round(value, ndigits)
+
+def build_compact_weather_data(weather_data, ndigits=COMPACT_PRECISION):
+    """
+    转换为 v2 格式: 返回 (stations, months)
+    stations 为列式站点表 (station_id/lat/lng/name[/province] 平行数组)，同一站点在各月份的元数据相同时只出现一次；
+    months 为 {年月: {station: [站点表下标], temperature: [...], precipitation: [...],
+    temperature_days: [...], precipitation_days: [...][, incomplete: [...]][, 扩展变量字段: [...]]}}，缺失值为 null
+    ndigits: 温度/降水及扩展变量保留的小数位数 (None 表示不取整；天数与计数为整数)
+    """
+    first_record = next((records[0] for records in weather_data.values() if records), {})
+    has_province = 'province' in first_record
+    fields = ['station_id', 'lat', 'lng', 'name'] + (['province'] if has_province else [])
+    value_fields = ['temperature', 'precipitation']
+    extra_fields = [field for field in first_record if field not in fields + value_fields]
+    stations = {field: [] for field in fields}
+    station_index = {}
+    months = {}
+
+    for year_month, records in weather_data.items():
+        indices = []
+        columns = {field: [] for field in value_fields + extra_fields}
+        for record in records:
+            key = tuple(record[field] for field in fields)
+            index = station_index.get(key)
+            if index is None:
+                index = station_index[key] = len(station_index)
+                for field, value in zip(fields, key):
+                    stations[field].append(value)
+            indices.append(index)
+            for field, values in columns.items():
+                value = record[field]
+                values.append(_round_or_none(value, ndigits) if isinstance(value, float) else value)
+        months[year_month] = {'station': indices, **columns}
+
+    return stations, months
+
+def _json_dumps(data, data_format):
+    """v1 保持缩进格式，v2 不缩进"""
+    if data_format == 'v2':
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+def write_sharded_output(months, metadata, data_format, stations=None, shard_by='year',
+                         index_file=INDEX_FILE, shard_dir=SHARD_DIR):
+    """
+    写入分片输出: shard_dir 下每年 (或每月) 一个分片 {"data": {年月: ...}}，文件名为 <年份或年月>.<内容哈希>.json；
+    index_file 记录元数据、月份列表、各分片文件及其包含的月份 (v2 格式的站点表也放在索引中，由所有分片共用)
+    内容未变化的分片文件名不变；不再被索引引用的旧分片会被删除。返回索引内容
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    key_length = 4 if shard_by == 'year' else 7
+
+    shard_months = {}
+    for year_month in months:
+        shard_months.setdefault(year_month[:key_length], []).append(year_month)
+
+    shards = []
+    for key, shard_month_list in shard_months.items():
+        content = _json_dumps({'data': {year_month: months[year_month] for year_month in shard_month_list}}, data_format)
+        encoded = content.encode('utf-8')
+        digest = hashlib.sha256(encoded).hexdigest()[:12]
+        filename = f"{key}.{digest}.json"
+        shard_path = os.path.join(shard_dir, filename)
+        if not os.path.exists(shard_path):
+            tmp_path = shard_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(encoded)
+            os.replace(tmp_path, shard_path)
+        shards.append({'key': key, 'file': f"{shard_dir}/{filename}", 'months': shard_month_list,
+                       'bytes': len(encoded)})
+
+    index = {'format_version': 2 if data_format == 'v2' else 1, 'sharded_by': shard_by, 'metadata': metadata}
+    if stations is not None:
+        index['stations'] = stations
+    index['months'] = list(months)
+    index['shards'] = shards
+
+    # 索引最后写入，保证它引用的分片都已存在
+    tmp_index = index_file + '.tmp'
+    with open(tmp_index, 'w', encoding='utf-8') as f:
+        f.write(_json_dumps(index, 'v2'))
+    os.replace(tmp_index, index_file)
+
+    referenced = {os.path.basename(shard['file']) for shard in shards}
+    for filename in os.listdir(shard_dir):
+        if filename.endswith('.json') and filename not in referenced:
+            static_compress.remove_file(os.path.join(shard_dir, filename))
+    return index
+
+def build_month_station_matrices(stations, months):
+    """
+    由 v2 的站点表与月份数组构建 {变量: 月份×站点 float32 矩阵}，无数据处为 NaN
+    除温度与降水外，有效天数、incomplete 位掩码与扩展变量字段也各为一个矩阵 (天数与计数在 float32 中精确表示)
+    """
+    n_months, n_stations = len(months), len(stations['station_id'])
+    first_month = next(iter(months.values()), {})
+    variables = [variable for variable in first_month if variable != 'station'] or BINARY_VARIABLES
+    matrices = {}
+    for variable in variables:
+        matrix = np.full((n_months, n_stations), np.nan, dtype=np.float32)
+        for row, month_data in enumerate(months.values()):
+            matrix[row, month_data['station']] = np.array(month_data[variable], dtype=np.float64)
+        matrices[variable] = matrix
+    return matrices
+
+def write_binary_output(stations, months, metadata, output_file):
+    """
+    写入二进制输出: output_file 为 JSON 头 (元数据、站点表、月份列表、矩阵文件名与形状)，
+    每个变量一个 <输出文件名>.<变量>.<内容哈希>.f32 文件 (行为月份、列为站点，little-endian Float32，缺失为 NaN)
+    返回 {变量: 文件字节数}
+    """
+    base, _ = os.path.splitext(output_file)
+    matrices = build_month_station_matrices(stations, months)
+    files = {}
+    sizes = {}
+    for variable, matrix in matrices.items():
+        blob = matrix.astype('<f4').tobytes()
+        filename = f"{base}.{variable}.{hashlib.sha256(blob).hexdigest()[:12]}.f32"
+        with open(filename, 'wb') as f:
+            f.write(blob)
+        files[variable] = os.path.basename(filename)
+        sizes[variable] = len(blob)
+    # 删除旧的矩阵文件 (包括本次不再输出的变量，如取消阈值后的 incomplete)
+    for old_file in glob.glob(f"{glob.escape(base)}.*.f32"):
+        if os.path.basename(old_file) not in files.values():
+            static_compress.remove_file(old_file)
+
+    header = {
+        'format_version': 3,
+        'metadata': metadata,
+        'stations': stations,
+        'months': list(months),
+        'binary': {
+            'dtype': 'float32',
+            'byte_order': 'little',
+            'shape': [len(months), len(stations['station_id'])],
+            'files': files
+        }
+    }
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(header, f, ensure_ascii=False, separators=(',', ':'))
+    return sizes
+
+def build_province_rollup(weather_data):
+    """
+    按 省份×月份 汇总温度与降水 (平均/最大/最小) 及站点数，与前端 aggregateDataByRegion 的统计口径一致：
+    按温度显示时只统计有温度值的站点，按降水显示时只统计有降水值的站点，因此两种数据类型各有一份汇总
+    (标记为不完整的数值不统计)；所有月份在一次分组聚合中完成
+    """
+    lengths = [len(records) for records in weather_data.values()]
+    records = [record for month_records in weather_data.values() for record in month_records]
+    incomplete = np.array([record.get('incomplete', 0) for record in records], dtype=np.int64)
+    frame = pd.DataFrame({
+        'year_month': np.repeat(np.array(list(weather_data.keys()), dtype=object), lengths),
+        'province': [record['province'] for record in records],
+    })
+    # 标记为不完整的数值与前端一致，不参与统计
+    for data_type in ('temperature', 'precipitation'):
+        values = np.array([record[data_type] for record in records], dtype=np.float64)
+        frame[data_type] = np.where(incomplete & INCOMPLETE_BITS[data_type], np.nan, values)
+    provinces = sorted(frame['province'].unique())
+    frame['province'] = pd.Categorical(frame['province'], categories=provinces).codes
+
+    rollup = {'version': 1, 'provinces': provinces, 'fields': ROLLUP_FIELDS, 'data': {}}
+    for data_type in ('temperature', 'precipitation'):
+        grouped = frame[frame[data_type].notna()].groupby(['year_month', 'province'], sort=True)
+        stats = grouped.agg(
+            stationCount=('province', 'size'),
+            avgTemperature=('temperature', 'mean'), maxTemperature=('temperature', 'max'),
+            minTemperature=('temperature', 'min'), avgPrecipitation=('precipitation', 'mean'),
+            maxPrecipitation=('precipitation', 'max'), minPrecipitation=('precipitation', 'min'),
+        )
+        values = stats[ROLLUP_FIELDS[1:]].round(ROLLUP_PRECISION).astype(object)
+        values = values.where(stats[ROLLUP_FIELDS[1:]].notna(), None)
+        rows = np.column_stack([stats.index.get_level_values('province'), stats['stationCount'], values.to_numpy()])
+
+        months = {}
+        for year_month, row in zip(stats.index.get_level_values('year_month'), rows.tolist()):
+            months.setdefault(year_month, []).append(row)
+        rollup['data'][data_type] = months
+    return rollup
+
+def aggregate_with_loop(csv_files, min_temperature_days=0, min_precipitation_days=0, policy='mark',
+                        variables=None):
+    """
+    逐行循环的聚合实现 (原始版本)，保留用于与列式实现对比
+    min_temperature_days/min_precipitation_days/policy: 月度完整性阈值与处理方式 (见 build_weather_data)
+    variables: 扩展变量 ({变量: 归约方式})
+    返回 (按年月组织的数据, 站点月份组合数, 处理的文件数)
     """
-    csv_folder = './csv'
-    output_file = 'weather_data.json'
-    
     # 存储所有数据的字典，按年月组织
     weather_data = {}
     # 记录每个站点每个月的所有数据，用于计算平均值和总和
     station_month_aggregation = {}
-    
-    # 获取所有CSV文件
-    csv_files = glob.glob(os.path.join(csv_folder, '*.csv'))
-    
-    print(f"找到 {len(csv_files)} 个CSV文件")
-    
+
     processed_count = 0
-    
+
     for csv_file in csv_files:
         try:
             # 读取CSV文件
             df = pd.read_csv(csv_file)
-            
+
             # 检查必要的列是否存在
-            required_columns = ['STATION', 'DATE', 'LATITUDE', 'LONGITUDE', 'NAME', 'TEMP', 'PRCP']
-            if not all(col in df.columns for col in required_columns):
+            if not all(col in df.columns for col in REQUIRED_COLUMNS):
                 print(f"跳过文件 {csv_file}: 缺少必要的列")
                 continue
-            
+
             # 获取站点ID
             station_id = None
             if not df.empty:
                 station_id = str(df.iloc[0]['STATION'])
-            
+            if quality_control.QC_COLUMN in df.columns:
+                flags = pd.to_numeric(df[quality_control.QC_COLUMN], errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+                temp_failed = quality_control.failed(flags, 'TEMP')
+                prcp_failed = quality_control.failed(flags, 'PRCP')
+            else:
+                flags = np.zeros(len(df), dtype=np.int64)
+                temp_failed = prcp_failed = np.zeros(len(df), dtype=bool)
+
             # 处理每一行数据
-            for _, row in df.iterrows():
+            for position, (_, row) in enumerate(df.iterrows()):
                 try:
                     # 解析日期
                     date_str = str(row['DATE'])
                     if len(date_str) >= 7:  # 确保日期格式正确
                         year_month = date_str[:7]  # 提取YYYY-MM
-                        
+
                         # 验证数据有效性
                         lat = float(row['LATITUDE'])
                         lng = float(row['LONGITUDE'])
-                        
+
                         # 跳过无效坐标
                         if lat == 0.0 and lng == 0.0:
                             continue
-                            
+
                         # 处理温度和降水数据
                         temp = None
                         prcp = None
-                        
-                        if pd.notna(row['TEMP']) and row['TEMP'] != '':
+
+                        # 未通过质量控制的值不参与聚合
+                        if pd.notna(row['TEMP']) and row['TEMP'] != '' and not temp_failed[position]:
                             temp = float(row['TEMP'])
-                            
-                        if pd.notna(row['PRCP']) and row['PRCP'] != '':
+
+                        if pd.notna(row['PRCP']) and row['PRCP'] != '' and not prcp_failed[position]:
                             prcp = float(row['PRCP'])
-                        
+
                         # 只保留有温度或降水数据的记录
                         if temp is not None or prcp is not None:
                             # 创建站点月份键
                             station_month_key = f"{station_id}_{year_month}"
-                            
+
                             # 初始化聚合数据结构
                             if station_month_key not in station_month_aggregation:
                                 station_month_aggregation[station_month_key] = {
@@ -80,49 +626,68 @@ def process_csv_files():
                                     'lng': lng,
                                     'name': str(row['NAME']).replace('"', ''),
                                     'temperatures': [],
-                                    'precipitations': []
+                                    'precipitations': [],
+                                    'variables': {variable: [] for variable in variables or {}}
                                 }
-                            
+
                             # 收集温度和降水数据
                             if temp is not None:
                                 station_month_aggregation[station_month_key]['temperatures'].append(temp)
                             if prcp is not None:
                                 station_month_aggregation[station_month_key]['precipitations'].append(prcp)
-                            
+                            # 扩展变量: 缺失、无法解析或未通过质量控制的值不参与聚合
+                            for variable, values in station_month_aggregation[station_month_key]['variables'].items():
+                                try:
+                                    value = float(row[variable]) if variable in row.index else np.nan
+                                except (ValueError, TypeError):
+                                    value = np.nan
+                                if not np.isnan(value) and not quality_control.failed(flags[position], variable):
+                                    values.append(value)
+
                 except (ValueError, TypeError) as e:
                     # 跳过无效的数据行
                     continue
-            
+
             processed_count += 1
             if processed_count % 50 == 0:
                 print(f"已处理 {processed_count} 个文件...")
-                
+
         except Exception as e:
             print(f"处理文件 {csv_file} 时出错: {e}")
             continue
-    
+
     print("开始计算每个站点每月的平均温度和降水总和...")
-    
+
     # 计算每个站点每月的平均温度和降水总和
     for station_month_key, data in station_month_aggregation.items():
         year_month = data['year_month']
-        
+
         # 计算平均温度
         avg_temp = None
         if data['temperatures']:
             avg_temp = sum(data['temperatures']) / len(data['temperatures'])
-        
+
         # 计算降水总和
         total_prcp = None
         if data['precipitations']:
             total_prcp = sum(data['precipitations'])
-        
+
+        # 有效天数低于阈值时标记或丢弃
+        temp_days = len(data['temperatures'])
+        prcp_days = len(data['precipitations'])
+        incomplete = int(incomplete_bits(temp_days, prcp_days, min_temperature_days, min_precipitation_days))
+        if policy == 'drop':
+            if incomplete & INCOMPLETE_BITS['temperature']:
+                avg_temp = None
+            if incomplete & INCOMPLETE_BITS['precipitation']:
+                total_prcp = None
+
         # 只保留有温度或降水数据的记录
         if avg_temp is not None or total_prcp is not None:
             # 初始化年月数据结构
             if year_month not in weather_data:
                 weather_data[year_month] = []
-            
+
             # 添加聚合后的数据点
             data_point = {
                 'station_id': data['station_id'],
@@ -130,14 +695,322 @@ def process_csv_files():
                 'lng': data['lng'],
                 'name': data['name'],
                 'temperature': avg_temp,
-                'precipitation': total_prcp
+                'precipitation': total_prcp,
+                'temperature_days': temp_days,
+                'precipitation_days': prcp_days
             }
-            
+            if policy == 'mark' and (min_temperature_days > 0 or min_precipitation_days > 0):
+                data_point['incomplete'] = incomplete
+            for field, variable, reducer in variable_fields(variables):
+                values = data['variables'][variable]
+                if reducer == 'count':
+                    data_point[field] = len(values)
+                elif not values:
+                    data_point[field] = None
+                elif reducer == 'mean':
+                    data_point[field] = sum(values) / len(values)
+                else:
+                    data_point[field] = {'sum': sum, 'min': min, 'max': max}[reducer](values)
+
             weather_data[year_month].append(data_point)
-    
+
+    return weather_data, len(station_month_aggregation), processed_count
+
+def _reduce_source_safe(source, variables=None):
+    """
+    在工作进程中归约单个输入，返回 (部分聚合结果, 错误信息, 计数)
+    source 为CSV文件路径，或 (Parquet数据集目录, 站点ID)
+    variables: 扩展变量 ({变量: 归约方式})
+    """
+    counters = instrumentation.new_counters()
+    try:
+        if isinstance(source, tuple):
+            return reduce_parquet_station(*source, counters=counters, variables=variables), None, counters
+        return reduce_csv_file(source, counters, variables), None, counters
+    except Exception as e:
+        counters['errors'] += 1
+        return None, str(e), counters
+
+def reduce_csv_files(csv_files, workers=1, variables=None):
+    """
+    归约一组输入 (CSV文件路径或 Parquet 站点，见 _reduce_source_safe)，workers > 1 时在进程池中并行执行
+    variables: 与温度/降水在同一次分组中归约的扩展变量
+    返回与 csv_files 一一对应的 (部分聚合结果, 错误信息) 列表，以及成功处理的文件数
+    各输入的文件数、字节数、行数与无效行数计入当前的统计阶段
+    """
+    results = []
+    processed_count = 0
+    reduce_source = functools.partial(_reduce_source_safe, variables=variables)
+
+    if workers > 1 and len(csv_files) > 1:
+        print(f"使用 {workers} 个工作进程并行处理...")
+        executor = ProcessPoolExecutor(max_workers=workers)
+        chunksize = max(1, len(csv_files) // (workers * 4))
+        reduced = executor.map(reduce_source, csv_files, chunksize=chunksize)
+    else:
+        executor = None
+        reduced = map(reduce_source, csv_files)
+
+    try:
+        for csv_file, (partial, error, counters) in zip(csv_files, reduced):
+            instrumentation.count(counters)
+            results.append((partial, error))
+            if error is not None:
+                print(f"处理文件 {csv_file} 时出错: {error}")
+                continue
+            if partial is None:
+                continue
+
+            processed_count += 1
+            if processed_count % 50 == 0:
+                print(f"已处理 {processed_count} 个文件...")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return results, processed_count
+
+def aggregate_vectorized(csv_files, workers=1, variables=None):
+    """
+    列式聚合实现：每个文件一次性解析日期、用掩码过滤(0,0)坐标，
+    并通过一次分组归约得到每个站点每月的温度和与降水和 (以及扩展变量的 和/计数/最小值/最大值)
+    workers > 1 时在进程池中并行归约各文件，父进程按文件列表顺序合并，
+    结果与工作进程数及完成顺序无关
+    返回 (站点-月份聚合结果, 处理的文件数)
+    """
+    results, processed_count = reduce_csv_files(csv_files, workers=workers, variables=variables)
+
+    print("开始计算每个站点每月的平均温度和降水总和...")
+
+    return merge_partials([partial for partial, _ in results], variables), processed_count
+
+# --- 增量构建 ---
+def _file_sha256(path):
+    """计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _partial_path(cache_dir, sha256):
+    return os.path.join(cache_dir, 'partials', f'{sha256}.pkl')
+
+def load_cache(cache_dir):
+    """
+    读取增量构建缓存，返回 (清单, 上次的站点-月份聚合结果)
+    清单记录每个输入文件的 size/mtime/sha256 及其包含的年月；缓存不存在或版本不符时返回空清单
+    """
+    manifest_path = os.path.join(cache_dir, 'manifest.json')
+    aggregated_path = os.path.join(cache_dir, 'aggregated.pkl')
+    empty = {'version': CACHE_VERSION, 'files': {}}
+    if not os.path.exists(manifest_path):
+        return empty, None
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"读取缓存清单失败，将完整重建: {e}")
+        return empty, None
+    if manifest.get('version') != CACHE_VERSION:
+        print("缓存版本不匹配，将完整重建")
+        return empty, None
+    aggregated = pd.read_pickle(aggregated_path) if os.path.exists(aggregated_path) else None
+    return manifest, aggregated
+
+def save_cache(cache_dir, manifest, aggregated):
+    """保存清单与本次的聚合结果，并删除不再被引用的部分聚合缓存"""
+    os.makedirs(cache_dir, exist_ok=True)
+    aggregated_path = os.path.join(cache_dir, 'aggregated.pkl')
+    aggregated.to_pickle(aggregated_path + '.tmp')
+    os.replace(aggregated_path + '.tmp', aggregated_path)
+
+    manifest_path = os.path.join(cache_dir, 'manifest.json')
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    referenced = {f"{entry['sha256']}.pkl" for entry in manifest['files'].values() if entry['has_partial']}
+    partials_dir = os.path.join(cache_dir, 'partials')
+    for filename in os.listdir(partials_dir) if os.path.isdir(partials_dir) else []:
+        if filename not in referenced:
+            os.remove(os.path.join(partials_dir, filename))
+
+def aggregate_incremental(csv_files, cache_dir=CACHE_DIR, workers=1, variables=None):
+    """
+    增量聚合：根据清单只重新解析新增或内容变化的文件，
+    并只重新合并受影响的年月，其余年月沿用上次的聚合结果
+    输出与完整重建一致；扩展变量 (部分聚合结果的列) 变化时完整重建
+    返回 (站点-月份聚合结果, 重新处理的文件数, 新清单)
+    """
+    manifest, previous = load_cache(cache_dir)
+    variable_names = sorted(variables or {})
+    if manifest['files'] and manifest.get('variables', []) != variable_names:
+        print("扩展变量已变化，将完整重建")
+        manifest, previous = {'version': CACHE_VERSION, 'files': {}}, None
+    old_entries = manifest['files']
+    new_entries = {}
+    changed = []
+
+    for csv_file in csv_files:
+        stat = os.stat(csv_file)
+        entry = old_entries.get(csv_file)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            new_entries[csv_file] = entry
+            continue
+        sha256 = _file_sha256(csv_file)
+        if entry and entry['sha256'] == sha256:
+            # 仅修改时间变化，内容未变
+            new_entries[csv_file] = dict(entry, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            continue
+        changed.append((csv_file, stat, sha256))
+
+    current = set(csv_files)
+    removed = [path for path in old_entries if path not in current]
+    print(f"增量构建: {len(changed)} 个文件需要重新解析，{len(removed)} 个文件已删除，"
+          f"{len(new_entries)} 个文件复用缓存")
+
+    affected_months = set()
+    for path in removed:
+        affected_months.update(old_entries[path]['months'])
+
+    results, processed_count = reduce_csv_files([path for path, _, _ in changed], workers=workers,
+                                                variables=variables)
+    os.makedirs(os.path.join(cache_dir, 'partials'), exist_ok=True)
+    for (csv_file, stat, sha256), (partial, error) in zip(changed, results):
+        if csv_file in old_entries:
+            affected_months.update(old_entries[csv_file]['months'])
+        if error is not None:
+            # 出错的文件不写入清单，下次运行时重试
+            continue
+        months = sorted(partial['year_month'].unique()) if partial is not None else []
+        affected_months.update(months)
+        if partial is not None:
+            partial.to_pickle(_partial_path(cache_dir, sha256))
+        new_entries[csv_file] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': sha256,
+            'months': months,
+            'has_partial': partial is not None
+        }
+
+    new_manifest = {'version': CACHE_VERSION, 'variables': variable_names, 'files': new_entries}
+
+    if previous is None:
+        print("没有可用的上次聚合结果，从缓存的部分聚合结果完整合并...")
+        affected_months = None
+    elif not affected_months:
+        return previous, processed_count, new_manifest
+    else:
+        print(f"重新合并受影响的 {len(affected_months)} 个月份...")
+
+    # 按文件顺序读取包含受影响年月的部分聚合结果
+    partials = []
+    for csv_file in csv_files:
+        entry = new_entries.get(csv_file)
+        if entry is None or not entry['has_partial']:
+            continue
+        if affected_months is not None and affected_months.isdisjoint(entry['months']):
+            continue
+        partial = pd.read_pickle(_partial_path(cache_dir, entry['sha256']))
+        if affected_months is not None:
+            partial = partial[partial['year_month'].isin(affected_months)]
+        partials.append(partial)
+    patched = merge_partials(partials, variables)
+
+    if affected_months is None:
+        return patched, processed_count, new_manifest
+
+    kept = previous[~previous['year_month'].isin(affected_months)]
+    aggregated = pd.concat([kept, patched], ignore_index=True)
+    return aggregated, processed_count, new_manifest
+
+def process_csv_files(engine='vectorized', workers=1, incremental=False, cache_dir=CACHE_DIR, parquet_dir=None,
+                      province_geojson=province_index.PROVINCE_GEOJSON, data_format='v1', shard_by='none',
+                      compress_encodings=(), size_budget=static_compress.SIZE_BUDGET_FILE,
+                      min_temperature_days=0, min_precipitation_days=0,
+                      incomplete_policy='mark', variables=None):
+    """
+    处理所有CSV文件，按年月组织数据
+    每个站点每月的温度取平均值，降水量做加和
+    engine: 'vectorized' 使用列式分组聚合，'loop' 使用原始的逐行循环 (两者输出完全一致)
+    workers: 并行归约文件的工作进程数，仅 vectorized 引擎支持
+    incremental: 使用 cache_dir 中的文件清单和部分聚合缓存，只重新解析变化的文件
+    parquet_dir: 不读取 ./csv，改为直接读取 process.py 输出的 Parquet 数据集 (按站点顺序)
+    province_geojson: 省份边界 GeoJSON，用于为每个站点预先计算 province 字段 (None 表示跳过；文件不存在时警告并跳过)
+    data_format: 'v1' 每月为站点对象列表 (indent=2)；'v2' 为站点表 + 每月平行数组，无缩进、固定小数位数；
+                 'binary' 为 JSON 头 + 月份×站点的 Float32 矩阵文件
+    shard_by: 'none' 写入单个 weather_data.json；'year'/'month' 写入索引文件与按年/按月的分片 (前端按需加载)
+    compress_encodings: 为每个输出文件写入预压缩的 .gz/.br 文件 ('gzip'/'brotli')
+    size_budget: 体积预算文件，返回超出预算的条目 (空列表表示全部在预算内)
+    min_temperature_days/min_precipitation_days: 站点月份的温度/降水至少需要的有效天数 (0 表示不检查)
+    incomplete_policy: 低于阈值时 'mark' 保留数值并写入 incomplete 位掩码，'drop' 丢弃该数值
+    variables: 扩展变量及其归约方式 ({变量: (归约方式, ...)}，见 parse_variable_specs)，每个归约结果为每条记录
+               (v2 为每月的平行数组，binary 为一个矩阵) 的一个字段，如 dewp_mean
+    """
+    if data_format not in DATA_FORMATS:
+        raise ValueError(f"未知的输出格式: {data_format}")
+    if shard_by not in SHARD_CHOICES:
+        raise ValueError(f"未知的分片方式: {shard_by}")
+    if data_format == 'binary' and shard_by != 'none':
+        raise ValueError("binary 格式不支持分片输出")
+    province_geojson = check_province_geojson(province_geojson)
+    if incomplete_policy not in COMPLETENESS_POLICIES:
+        raise ValueError(f"未知的完整性处理方式: {incomplete_policy}")
+    completeness = {'min_temperature_days': min_temperature_days,
+                    'min_precipitation_days': min_precipitation_days,
+                    'policy': incomplete_policy}
+    variables = dict(variables or {})
+    for variable, reducers in variables.items():
+        if variable not in AGGREGATE_VARIABLES or not set(reducers) <= set(REDUCERS):
+            raise ValueError(f"不支持的扩展变量聚合: {variable} {reducers}")
+    csv_folder = './csv'
+    output_file = 'weather_data.json'
+
+    if parquet_dir is not None:
+        if engine == 'loop' or incremental:
+            raise ValueError("Parquet 输入只支持 vectorized 引擎的完整构建")
+        # 每个站点作为一个输入
+        csv_files = [(parquet_dir, station_id) for station_id in columnar_store.list_stations(parquet_dir)]
+        print(f"Parquet 数据集 {parquet_dir} 中找到 {len(csv_files)} 个站点")
+    else:
+        # 获取所有CSV文件 (排序以保证合并顺序确定)
+        csv_files = sorted(glob.glob(os.path.join(csv_folder, '*.csv')))
+        print(f"找到 {len(csv_files)} 个CSV文件")
+
+    if engine == 'loop' and (workers > 1 or incremental):
+        raise ValueError("loop 引擎不支持并行处理或增量构建")
+
+    manifest = None
+    if engine == 'loop':
+        with instrumentation.stage('aggregate') as stage:
+            weather_data, unique_stations, processed_count = aggregate_with_loop(
+                csv_files, min_temperature_days, min_precipitation_days, incomplete_policy, variables)
+            stage.add(files=len(csv_files))
+    elif engine == 'vectorized':
+        with instrumentation.stage('aggregate'):
+            if incremental:
+                aggregated, processed_count, manifest = aggregate_incremental(csv_files, cache_dir=cache_dir, workers=workers,
+                                                                              variables=variables)
+            else:
+                aggregated, processed_count = aggregate_vectorized(csv_files, workers=workers, variables=variables)
+        with instrumentation.stage('build') as stage:
+            weather_data = build_weather_data(aggregated, min_temperature_days, min_precipitation_days,
+                                              incomplete_policy, variables)
+            stage.add(rows=len(aggregated))
+        unique_stations = len(aggregated)
+    else:
+        raise ValueError(f"未知的聚合引擎: {engine}")
+
+    # 站点省份归属 (前端直接使用 province 字段，不再做多边形判断)
+    with instrumentation.stage('province'):
+        provinces = load_province_index(province_geojson)
+        unknown_province_stations = add_province_field(weather_data, provinces) if provinces is not None else None
+
     # 按年月排序
     sorted_data = dict(sorted(weather_data.items()))
-    
+
     # 生成统计信息
     stats = {
         'total_months': len(sorted_data),
@@ -146,25 +1019,162 @@ def process_csv_files():
             'end': max(sorted_data.keys()) if sorted_data else None
         },
         'total_records': sum(len(records) for records in sorted_data.values()),
-        'unique_stations': len(station_month_aggregation)
+        'unique_stations': unique_stations,
+        'completeness': completeness
     }
-    
+    if variables:
+        stats['variables'] = {field: {'variable': variable, 'reducer': reducer}
+                              for field, variable, reducer in variable_fields(variables)}
+
+    # 省份×月份汇总 (需要站点省份归属)
+    with instrumentation.stage('rollup'):
+        rollup = build_province_rollup(sorted_data) if unknown_province_stations is not None else None
+    if rollup is not None:
+        stats['province_rollup'] = ROLLUP_FILE
+
     # 保存处理后的数据
-    output_data = {
-        'metadata': stats,
-        'data': sorted_data
-    }
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(output_data, f, ensure_ascii=False, indent=2)
-    
+    with instrumentation.stage('write') as stage:
+        stations = None
+        months = sorted_data
+        if data_format in ('v2', 'binary'):
+            # 二进制矩阵本身就是 float32 精度，不再取整
+            stations, months = build_compact_weather_data(sorted_data, None if data_format == 'binary' else COMPACT_PRECISION)
+            stats['station_table_size'] = len(stations['station_id'])
+
+        artifacts = [output_file]
+        if data_format == 'binary':
+            binary_sizes = write_binary_output(stations, months, stats, output_file)
+        elif shard_by != 'none':
+            index = write_sharded_output(months, stats, data_format, stations, shard_by)
+            # weather_data.json 只声明输出布局，前端据此读取索引，无需试探索引文件是否存在
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump({'metadata': {'sharded_by': shard_by, 'index': INDEX_FILE}}, f, ensure_ascii=False)
+            artifacts = [output_file, INDEX_FILE] + [shard['file'] for shard in index['shards']]
+            output_file = INDEX_FILE
+        elif data_format == 'v2':
+            output_data = {
+                'format_version': 2,
+                'metadata': stats,
+                'stations': stations,
+                'data': months
+            }
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump(output_data, f, ensure_ascii=False, separators=(',', ':'))
+        else:
+            output_data = {
+                'metadata': stats,
+                'data': sorted_data
+            }
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump(output_data, f, ensure_ascii=False, indent=2)
+
+        # 非分片输出时移除不再被引用的旧索引 (前端只按 weather_data.json 声明的布局读取索引)
+        if shard_by == 'none' and os.path.exists(INDEX_FILE):
+            static_compress.remove_file(INDEX_FILE)
+            print(f"已删除旧的分片索引 {INDEX_FILE}")
+
+        if rollup is not None:
+            with open(ROLLUP_FILE, 'w', encoding='utf-8') as f:
+                json.dump(rollup, f, ensure_ascii=False, separators=(',', ':'))
+            artifacts.append(ROLLUP_FILE)
+
+        if data_format == 'binary':
+            base, _ = os.path.splitext(output_file)
+            artifacts += sorted(glob.glob(f"{glob.escape(base)}.*.f32"))
+        stage.add(files=len(artifacts), rows=stats['total_records'],
+                  bytes_written=sum(os.path.getsize(artifact) for artifact in artifacts))
+    # 预压缩文件 (未启用时同时删除旧的 .gz/.br，避免提供过期内容)
+    with instrumentation.stage('compress') as stage:
+        for artifact in artifacts:
+            stage.add(files=1, bytes=os.path.getsize(artifact),
+                      bytes_written=sum(static_compress.compress_file(artifact, compress_encodings).values()))
+
+    # 输出写入成功后再更新缓存，避免中断时清单与输出不一致
+    if manifest is not None:
+        save_cache(cache_dir, manifest, aggregated)
+
     print(f"\n数据处理完成！")
     print(f"总共处理了 {processed_count} 个CSV文件")
     print(f"生成了 {stats['total_months']} 个月的数据")
     print(f"总记录数: {stats['total_records']}")
     print(f"唯一站点月份组合: {stats['unique_stations']}")
     print(f"日期范围: {stats['date_range']['start']} 到 {stats['date_range']['end']}")
-    print(f"输出文件: {output_file}")
+    if min_temperature_days > 0 or min_precipitation_days > 0:
+        incomplete = {data_type: sum(1 for records in sorted_data.values() for record in records
+                                     if 0 < record[DAY_FIELDS[data_type]] < minimum)
+                      for data_type, minimum in (('temperature', min_temperature_days),
+                                                 ('precipitation', min_precipitation_days))}
+        print(f"有效天数不足的站点月份 ({'已标记' if incomplete_policy == 'mark' else '已丢弃'}): "
+              f"温度 {incomplete['temperature']} (阈值 {min_temperature_days} 天)，"
+              f"降水 {incomplete['precipitation']} (阈值 {min_precipitation_days} 天)")
+    if unknown_province_stations is not None:
+        print(f"未能归属省份的站点数: {unknown_province_stations}")
+    print(f"输出文件: {output_file} (格式 {data_format}, {os.path.getsize(output_file) / 1024:.1f} KB)")
+    if data_format == 'binary':
+        print(f"矩阵文件: " + ", ".join(f"{variable} {size / 1024:.1f} KB" for variable, size in binary_sizes.items()))
+    if shard_by != 'none':
+        shard_sizes = [shard['bytes'] for shard in index['shards']]
+        print(f"分片: {len(shard_sizes)} 个 ({SHARD_DIR}/，按{'年' if shard_by == 'year' else '月'}，"
+              f"最大 {max(shard_sizes, default=0) / 1024:.1f} KB，共 {sum(shard_sizes) / 1024:.1f} KB)")
+    if rollup is not None:
+        print(f"省份汇总文件: {ROLLUP_FILE}")
+
+    with instrumentation.stage('size_report') as stage:
+        stage.add(files=len(artifacts))
+        return static_compress.size_report(artifacts, static_compress.load_budget(size_budget), "输出文件体积")
 
 if __name__ == '__main__':
-    process_csv_files()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='将站点CSV聚合为按月组织的 weather_data.json')
+    parser.add_argument('--engine', choices=['vectorized', 'loop'], default='vectorized',
+                        help="聚合引擎: vectorized (列式分组聚合，默认) 或 loop (原始逐行循环，用于对比)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help='并行处理CSV文件的工作进程数 (默认 1，即单进程)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量构建: 只重新解析新增或内容变化的CSV文件，并只更新受影响的月份')
+    parser.add_argument('--cache-dir', default=CACHE_DIR,
+                        help=f'增量构建的清单与部分聚合缓存目录 (默认 {CACHE_DIR})')
+    parser.add_argument('--parquet-dir', default=None,
+                        help='直接读取 process.py 输出的 Parquet 数据集 (例如 processed_cn_gsod_parquet)，代替 ./csv')
+    parser.add_argument('--province-geojson', default=province_index.PROVINCE_GEOJSON,
+                        help=f'省份边界 GeoJSON，用于写入站点的 province 字段 (默认 {province_index.PROVINCE_GEOJSON})')
+    parser.add_argument('--no-province', action='store_true',
+                        help='不计算站点省份归属')
+    parser.add_argument('--data-format', choices=DATA_FORMATS, default='v1',
+                        help='weather_data.json 格式: v1 (站点对象列表，默认)、v2 (站点表 + 每月平行数组，体积更小) '
+                             '或 binary (JSON 头 + Float32 矩阵文件)')
+    parser.add_argument('--shard-by', choices=SHARD_CHOICES, default='none',
+                        help=f'none: 单个 weather_data.json (默认)；year/month: 写入 {INDEX_FILE} 与 {SHARD_DIR}/ 下按年或按月的分片')
+    parser.add_argument('--compress', choices=static_compress.COMPRESS_CHOICES, default='none',
+                        help='为输出文件写入预压缩的 .gz/.br 文件 (brotli 需要安装 brotli 包)')
+    parser.add_argument('--size-budget', default=static_compress.SIZE_BUDGET_FILE,
+                        help=f'体积预算文件，输出超出预算时以非零状态退出 (默认 {static_compress.SIZE_BUDGET_FILE})')
+    parser.add_argument('--min-temperature-days', type=int, default=0,
+                        help='站点月份的温度至少需要的有效天数，不足时按 --incomplete 处理 (默认 0，不检查)')
+    parser.add_argument('--min-precipitation-days', type=int, default=0,
+                        help='站点月份的降水至少需要的有效天数，不足时按 --incomplete 处理 (默认 0，不检查)')
+    parser.add_argument('--incomplete', choices=COMPLETENESS_POLICIES, default='mark',
+                        help='有效天数不足时: mark 保留数值并写入 incomplete 位掩码 (前端不显示，默认)；drop 丢弃该数值')
+    parser.add_argument('--aggregate', nargs='+', default=[], metavar='VAR[:归约方式,...]',
+                        help=f"额外聚合的变量 ({', '.join(AGGREGATE_VARIABLES)}) 及归约方式 ({', '.join(REDUCERS)}，"
+                             "默认 mean)，例如 --aggregate MAX:max MIN:min DEWP HMD WDSP:mean,max SLP；"
+                             "每个归约结果输出为一个字段，如 max_max、dewp_mean")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.configure_from_args('process_weather_data', args)
+    try:
+        variables = parse_variable_specs(args.aggregate)
+    except ValueError as e:
+        parser.error(str(e))
+    violations = process_csv_files(engine=args.engine, workers=args.workers,
+                      incremental=args.incremental, cache_dir=args.cache_dir,
+                      parquet_dir=args.parquet_dir,
+                      province_geojson=None if args.no_province else args.province_geojson,
+                      data_format=args.data_format, shard_by=args.shard_by,
+                      compress_encodings=static_compress.encodings_for(args.compress),
+                      size_budget=args.size_budget,
+                      min_temperature_days=args.min_temperature_days,
+                      min_precipitation_days=args.min_precipitation_days,
+                      incomplete_policy=args.incomplete,
+                      variables=variables)
+    if violations:
+        sys.exit(1)
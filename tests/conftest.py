@@ -0,0 +1,40 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_DIR = os.path.join(REPO_ROOT, "data_preprocess")
+for path in (REPO_ROOT, SCRIPT_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def run_script(script, *args, cwd):
+    """Runs a pipeline script the way it is used from the command line; fails the test on a non-zero exit."""
+    result = subprocess.run([sys.executable, os.path.join(REPO_ROOT, script), *args], cwd=cwd,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, f"{script} {' '.join(args)} failed:\n{result.stdout}\n{result.stderr}"
+    return result
+
+
+@pytest.fixture(scope="session")
+def processed_workdir(tmp_path_factory):
+    """
+    A work directory with synthetic GSOD input processed by process.py into both the
+    per-station CSV files (also reachable as ./csv, where process_weather_data.py reads
+    them) and the Parquet dataset.
+    """
+    import synthetic_gsod
+    workdir = tmp_path_factory.mktemp("pipeline")
+    synthetic_gsod.generate_gsod(str(workdir / "cn_gsod"), stations=12, years=2, start_year=2020, seed=0)
+    run_script("data_preprocess/process.py", "--output-format", "both", "--no-station-registry", cwd=workdir)
+    os.symlink("processed_cn_gsod", workdir / "csv")
+    return workdir
+
+
+def aggregate(workdir, *args):
+    """Runs process_weather_data.py in workdir and returns the bytes of the weather_data.json it wrote."""
+    run_script("process_weather_data.py", "--no-province", *args, cwd=workdir)
+    return (workdir / "weather_data.json").read_bytes()
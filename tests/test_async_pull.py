@@ -0,0 +1,114 @@
+import asyncio
+import functools
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import async_pull
+import pull
+import pull2
+
+FILES = {
+    "2020": ["54511099999.csv", "58362099999.csv", "72503014732.csv"],
+    "2021": ["54511099999.csv", "58362099999.csv", "58367099999.csv", "59287099999.csv"],
+}
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def access_server(tmp_path):
+    """Serves a fake GSOD access/ tree (directory index pages + yearly station CSV files) over HTTP."""
+    root = tmp_path / "www"
+    for year, names in FILES.items():
+        (root / "access" / year).mkdir(parents=True)
+        for name in names:
+            rows = "".join(f'"{name[:-4]}","{year}-01-{day:02d}","{day * 1.5}"\n' for day in range(1, 29))
+            (root / "access" / year / name).write_text('"STATION","DATE","TEMP"\n' + rows * 50)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield root / "access", f"http://127.0.0.1:{server.server_address[1]}/access/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_downloads_selected_files_then_revalidates(access_server, tmp_path, monkeypatch):
+    access_dir, base_url = access_server
+    monkeypatch.chdir(tmp_path)  # the listing cache is written to the working directory
+    download_dir = tmp_path / "download"
+
+    def download(**selection):
+        return asyncio.run(async_pull.download_all(base_url, str(download_dir), concurrency=2, rate_limit=0,
+                                                   **selection))
+
+    stats = download(csv_filter=pull.make_csv_filter(["5"]))
+    expected = [(year, name) for year, names in FILES.items() for name in names if name.startswith("5")]
+    assert stats["downloaded"] == len(expected) and stats["failed"] == 0
+    for year, name in expected:
+        assert (download_dir / year / name).read_bytes() == (access_dir / year / name).read_bytes()
+    assert not (download_dir / "2020" / "72503014732.csv").exists()
+    assert not list(download_dir.glob("*/*.part"))
+
+    # unchanged files are revalidated with conditional requests and not transferred again
+    stats = download(csv_filter=pull.make_csv_filter(["5"]))
+    assert stats["not_modified"] == len(expected) and stats["downloaded"] == 0 and stats["bytes"] == 0
+
+    stats = download(start_year=2021, end_year=2021)
+    assert stats["downloaded"] == 0 and stats["not_modified"] == len(FILES["2021"])
+
+
+def test_workers_do_not_outnumber_the_concurrency_limit(access_server, tmp_path, monkeypatch):
+    _, base_url = access_server
+    monkeypatch.chdir(tmp_path)
+    active = peak = 0
+    original = async_pull.AsyncDownloader.download_file
+
+    async def tracked(self, file_url, local_path):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        try:
+            await original(self, file_url, local_path)
+        finally:
+            active -= 1
+
+    monkeypatch.setattr(async_pull.AsyncDownloader, "download_file", tracked)
+    stats = asyncio.run(async_pull.download_all(base_url, str(tmp_path / "download"), concurrency=3, rate_limit=0))
+    assert stats["downloaded"] == sum(len(names) for names in FILES.values())
+    assert peak == 3
+
+
+def test_file_system_work_runs_off_the_event_loop(access_server, tmp_path, monkeypatch):
+    _, base_url = access_server
+    monkeypatch.chdir(tmp_path)
+    loop_threads = []
+
+    def off_loop(function):
+        def wrapper(*args, **kwargs):
+            loop_threads.append(threading.current_thread() is threading.main_thread())
+            return function(*args, **kwargs)
+        return wrapper
+
+    for name in ("load_download_index", "save_download_index", "build_request_headers", "finalize_download",
+                 "load_listing_cache", "save_listing_cache"):
+        monkeypatch.setattr(async_pull, name, off_loop(getattr(async_pull, name)))
+    stats = asyncio.run(async_pull.download_all(base_url, str(tmp_path / "download"), concurrency=2, rate_limit=0))
+    assert stats["downloaded"] == sum(len(names) for names in FILES.values())
+    assert loop_threads and not any(loop_threads)
+
+
+@pytest.mark.parametrize("script", [pull, pull2])
+def test_pull_scripts_are_entry_points_over_the_async_downloader(script, access_server, tmp_path, monkeypatch):
+    access_dir, base_url = access_server
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pull2, "SEQUENTIAL_RATE_LIMIT", 0)
+    script.main(start_year=2021, base_url=base_url, download_dir=str(tmp_path / "download"))
+    downloaded = sorted(path.relative_to(tmp_path / "download").as_posix()
+                        for path in (tmp_path / "download").glob("*/*.csv"))
+    assert downloaded == [f"2021/{name}" for name in FILES["2021"]]
+    assert all((tmp_path / "download" / name).read_bytes() == (access_dir / name).read_bytes() for name in downloaded)
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+import checkrange
+
+HEADER = "STATION,DATE,LATITUDE,LONGITUDE,ELEVATION,NAME,TEMP\n"
+STATIONS = {
+    "50000099999": "50000099999,2020-01-01,40.25,116.5,50.0,\"BEIJING, CH\",3.5\n",
+    "50001099999": "50001099999,2020-01-01,31.0,121.5,5.0,\"BOGUS CHINESE, CH\",8.0\n",
+    "50002099999": "50002099999,2020-01-01,0.0,0.0,12.0,\"NAME LOCATION UNKN, CH\",1.0\n",
+    "50003099999": "50003099999,2020-01-01,,,12.0,\"NO COORDINATES, CH\",1.0\n",
+    "50004099999": "50004099999,2020-01-01,-10.0,60.0,12.0,\"FAR AWAY, CH\",1.0\n",
+}
+
+
+def _snapshot(directory):
+    return {path.relative_to(directory).as_posix(): path.read_bytes()
+            for path in sorted(directory.rglob("*")) if path.is_file()}
+
+
+@pytest.fixture
+def station_dir(tmp_path):
+    directory = tmp_path / "processed_cn_gsod"
+    directory.mkdir()
+    for station, row in STATIONS.items():
+        (directory / f"{station}.csv").write_text(HEADER + row, encoding="utf-8")
+        (directory / f"{station}.json").write_text(json.dumps([{"STATION": station}]), encoding="utf-8")
+    (directory / "50001099999.json.gz").write_bytes(b"\x1f\x8b fake")
+    return directory
+
+
+def test_bulk_validator_matches_the_per_file_checks(station_dir):
+    *bulk_lists, report = checkrange.validate_directory(str(station_dir), workers=4)
+    legacy_lists = checkrange.process_files_in_directory(str(station_dir))
+    # same stations and decisions in each list; the bulk messages omit the float() error text
+    for bulk, legacy in zip(bulk_lists, legacy_lists):
+        assert sorted((entry["filename"], entry.get("propose_delete")) for entry in bulk) == \
+            sorted((entry["filename"], entry.get("propose_delete")) for entry in legacy)
+    assert report["checked"] == 5 and report["valid"] == 1
+    assert report["issues"] == {"bogus_name": 1, "invalid_coordinates": 1, "out_of_bounds": 1, "zero_coordinates": 1}
+
+
+def test_quarantine_then_undo_restores_the_tree(station_dir, tmp_path):
+    before = _snapshot(station_dir)
+    quarantine = tmp_path / "quarantine"
+    policy = dict(checkrange.load_policy(), bogus_name=checkrange.ACTION_QUARANTINE,
+                  invalid_coordinates=checkrange.ACTION_KEEP)
+    manifest_path = tmp_path / "undo.json"
+    report_path = tmp_path / "report.json"
+
+    planned = checkrange.run_batch(str(station_dir), policy, str(quarantine), dry_run=True, workers=2)
+    assert len(planned) == 3 and _snapshot(station_dir) == before and not quarantine.exists()
+
+    results = checkrange.run_batch(str(station_dir), policy, str(quarantine), workers=2,
+                                   report_path=str(report_path), undo_manifest_path=str(manifest_path))
+    assert {result["status"] for result in results} == {"done"}
+
+    report = json.loads(report_path.read_text(encoding="utf-8"))
+    flagged = {station["station"]: station for station in report["stations"]}
+    assert sorted(flagged) == ["50001099999", "50002099999", "50003099999", "50004099999"]
+    assert flagged["50001099999"]["issue"] == "bogus_name" and flagged["50001099999"]["propose_delete"]
+    assert flagged["50004099999"]["out_of_bounds"] and not flagged["50004099999"]["propose_delete"]
+
+    quarantined = {"50001099999.csv", "50001099999.json", "50001099999.json.gz"}
+    assert {path.name for path in quarantine.iterdir()} == quarantined
+    after = _snapshot(station_dir)
+    assert set(before) - set(after) == quarantined
+    assert all(after[name] == before[name] for name in after)
+
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    assert all(operation["restorable"] for operation in manifest["operations"])
+    assert checkrange.undo_batch(str(manifest_path), workers=2) == 3
+    assert _snapshot(station_dir) == before
+    assert not list(quarantine.iterdir())
+    # a second undo finds the files back in place and moves nothing
+    assert checkrange.undo_batch(str(manifest_path)) == 0
+
+
+def test_deleted_files_are_recorded_as_not_restorable(station_dir, tmp_path):
+    manifest_path = tmp_path / "undo.json"
+    checkrange.run_batch(str(station_dir), checkrange.load_policy(), str(tmp_path / "quarantine"),
+                         undo_manifest_path=str(manifest_path))
+    # default policy: BOGUS names and invalid coordinates are deleted, the rest is kept
+    assert sorted(path.name for path in station_dir.glob("*.csv")) == [
+        "50000099999.csv", "50002099999.csv", "50004099999.csv"]
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    assert {operation["action"] for operation in manifest["operations"]} == {checkrange.ACTION_DELETE}
+    assert not any(operation["restorable"] for operation in manifest["operations"])
+    assert checkrange.undo_batch(str(manifest_path)) == 0
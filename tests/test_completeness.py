@@ -0,0 +1,96 @@
+import json
+import shutil
+import subprocess
+
+import pandas as pd
+import pytest
+
+from conftest import REPO_ROOT, aggregate
+from process_weather_data import INCOMPLETE_BITS, build_weather_data, incomplete_bits, partial_columns
+
+THRESHOLDS = ("--min-temperature-days", "28", "--min-precipitation-days", "27")
+
+
+def _aggregated(rows):
+    """Station-month aggregate rows (station_id, year_month, TEMP_sum, TEMP_count, PRCP_sum, PRCP_count)."""
+    frame = pd.DataFrame(rows, columns=["station_id", "year_month", "TEMP_sum", "TEMP_count", "PRCP_sum", "PRCP_count"])
+    frame["lat"], frame["lng"], frame["name"] = 30.0, 110.0, "STATION"
+    return frame[partial_columns()]
+
+
+AGGREGATED = _aggregated([
+    ("A", "2020-01", 300.0, 30, 12.0, 30),  # complete
+    ("B", "2020-01", 100.0, 10, 12.0, 30),  # too few temperature days
+    ("C", "2020-01", 300.0, 30, 4.0, 5),  # too few precipitation days
+    ("D", "2020-01", 50.0, 5, 1.0, 2),  # both too few
+    ("E", "2020-01", 0.0, 0, 6.0, 20),  # no temperature at all: missing, not incomplete
+])
+
+
+def test_incomplete_bits():
+    assert INCOMPLETE_BITS == {"temperature": 1, "precipitation": 2}
+    bits = incomplete_bits(AGGREGATED["TEMP_count"], AGGREGATED["PRCP_count"], 20, 25)
+    assert bits.tolist() == [0, 1, 2, 3, 2]
+    assert incomplete_bits(5, 2).tolist() == 0
+
+
+def test_mark_policy_writes_the_bitmask():
+    records = build_weather_data(AGGREGATED, 20, 25, policy="mark")["2020-01"]
+    assert [record["incomplete"] for record in records] == [0, 1, 2, 3, 2]
+    assert records[1]["temperature"] == pytest.approx(10.0)  # marked, not removed
+    assert [record["temperature_days"] for record in records] == [30, 10, 30, 5, 0]
+
+
+def test_drop_policy_nulls_values_and_drops_empty_records():
+    records = {record["station_id"]: record for record in build_weather_data(AGGREGATED, 20, 25, policy="drop")["2020-01"]}
+    assert sorted(records) == ["A", "B", "C"]
+    assert records["B"]["temperature"] is None and records["B"]["precipitation"] == pytest.approx(12.0)
+    assert records["C"]["precipitation"] is None and records["C"]["temperature"] == pytest.approx(10.0)
+    assert all("incomplete" not in record for record in records.values())
+
+
+def test_no_threshold_leaves_the_field_out():
+    for policy in ("mark", "drop"):
+        records = build_weather_data(AGGREGATED, policy=policy)["2020-01"]
+        assert len(records) == 5 and all("incomplete" not in record for record in records)
+
+
+def test_marks_match_the_day_counts_of_the_output(processed_workdir):
+    data = json.loads(aggregate(processed_workdir, *THRESHOLDS))
+    assert data["metadata"]["completeness"] == {"min_temperature_days": 28, "min_precipitation_days": 27,
+                                                "policy": "mark"}
+    records = [record for month_records in data["data"].values() for record in month_records]
+    expected = incomplete_bits([r["temperature_days"] for r in records], [r["precipitation_days"] for r in records],
+                               28, 27)
+    assert [record["incomplete"] for record in records] == expected.tolist()
+    assert set(expected.tolist()) == {0, 1, 2, 3}  # the synthetic gaps exercise every combination
+
+    default = json.loads(aggregate(processed_workdir))
+    assert all("incomplete" not in record for month_records in default["data"].values() for record in month_records)
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_frontend_masking_of_marks_equals_the_drop_policy(processed_workdir, tmp_path):
+    marked = tmp_path / "marked.json"
+    marked.write_bytes(aggregate(processed_workdir, *THRESHOLDS))
+    dropped = json.loads(aggregate(processed_workdir, *THRESHOLDS, "--incomplete", "drop"))
+
+    script = f"""
+        const fs = require('fs');
+        global.window = {{}};
+        eval(fs.readFileSync({json.dumps(REPO_ROOT + '/dataLoader.js')}, 'utf8') + '; global.Loader = WeatherDataLoader;');
+        const data = JSON.parse(fs.readFileSync({json.dumps(str(marked))}, 'utf8'));
+        const loader = new Loader();
+        loader.metadata = data.metadata;
+        const result = {{}};
+        for (const [month, records] of Object.entries(data.data)) {{
+            result[month] = loader.applyCompleteness(records);
+        }}
+        process.stdout.write(JSON.stringify(result));
+    """
+    output = subprocess.run(["node", "-e", script], capture_output=True, text=True, check=True).stdout
+    masked = json.loads(output)
+    for records in masked.values():
+        for record in records:
+            del record["incomplete"]
+    assert masked == dropped["data"]
@@ -0,0 +1,12 @@
+from conftest import aggregate
+
+
+def test_vectorized_engine_matches_loop_engine(processed_workdir, tmp_path):
+    expected = aggregate(processed_workdir, "--engine", "loop")
+    assert aggregate(processed_workdir, "--engine", "vectorized") == expected
+    assert aggregate(processed_workdir, "--engine", "vectorized", "--workers", "2") == expected
+
+    cache_dir = str(tmp_path / "cache")
+    # a cold run fills the cache, the second run aggregates from it
+    assert aggregate(processed_workdir, "--incremental", "--cache-dir", cache_dir) == expected
+    assert aggregate(processed_workdir, "--incremental", "--cache-dir", cache_dir) == expected
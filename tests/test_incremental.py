@@ -0,0 +1,85 @@
+import json
+import shutil
+
+import pandas as pd
+import pytest
+
+from conftest import aggregate, run_script
+
+SPLIT_STATION = "59999099999"
+REMOVED_STATION = "59998099999"
+
+
+@pytest.fixture
+def csv_workdir(processed_workdir, tmp_path):
+    """
+    A writable copy of the processed station CSV files, plus two stations that only cover
+    a few months (so changing them leaves the other months to the cached aggregate).
+    """
+    shutil.copytree(processed_workdir / "processed_cn_gsod", tmp_path / "csv",
+                    ignore=shutil.ignore_patterns("*.json"))
+    source = pd.read_csv(next((tmp_path / "csv").glob("*.csv")), dtype={"STATION": str})
+    months = source["DATE"].str[:7]
+    for station, selected in ((SPLIT_STATION, months.isin(["2020-01", "2020-02", "2020-03"])),
+                              (REMOVED_STATION, months == "2020-04")):
+        frame = source[selected].assign(STATION=station, LATITUDE=30.5, LONGITUDE=110.25)
+        frame.to_csv(tmp_path / "csv" / f"{station}.csv", index=False)
+    return tmp_path
+
+
+def _manifest_files(workdir):
+    with open(workdir / "cache" / "manifest.json", encoding="utf-8") as f:
+        return json.load(f)["files"]
+
+
+def test_changed_removed_and_broken_files_match_a_full_rebuild(csv_workdir):
+    aggregate(csv_workdir, "--incremental", "--cache-dir", "cache")
+
+    edited = csv_workdir / "csv" / f"{SPLIT_STATION}.csv"
+    frame = pd.read_csv(edited, dtype={"STATION": str})
+    frame.loc[frame["DATE"].str.startswith("2020-02"), "TEMP"] += 3.0
+    frame.to_csv(edited, index=False)
+    (csv_workdir / "csv" / f"{REMOVED_STATION}.csv").unlink()
+    # a file that fails to parse is reported, left out of the manifest and retried next time
+    (csv_workdir / "csv" / "59997099999.csv").write_text("STATION,DATE\n1,2\n1,2,3,4\n", encoding="utf-8")
+
+    incremental = aggregate(csv_workdir, "--incremental", "--cache-dir", "cache")
+    files = _manifest_files(csv_workdir)
+    assert "./csv/59997099999.csv" not in files and f"./csv/{REMOVED_STATION}.csv" not in files
+    assert files[f"./csv/{SPLIT_STATION}.csv"]["months"] == ["2020-01", "2020-02", "2020-03"]
+
+    assert incremental == aggregate(csv_workdir)
+    months = json.loads(incremental)["data"]
+    assert all(record["station_id"] != REMOVED_STATION for record in months["2020-04"])
+    assert any(record["station_id"] == SPLIT_STATION for record in months["2020-02"])
+
+
+def test_registry_change_reingested_by_process_py_is_picked_up(processed_workdir, tmp_path):
+    (tmp_path / "cn_gsod").symlink_to(processed_workdir / "cn_gsod")
+    run_script("data_preprocess/process.py", "--no-station-registry", cwd=tmp_path)
+    (tmp_path / "csv").symlink_to("processed_cn_gsod")
+    aggregate(tmp_path, "--incremental", "--cache-dir", "cache")
+
+    station = sorted((tmp_path / "csv").glob("*.csv"))[0].stem
+    registry = tmp_path / "registry.json"
+    registry.write_text(json.dumps({"format_version": 1, "stations": {station: {
+        "name": "RENAMED, CH", "latitude": 31.0, "longitude": 111.0, "elevation": None,
+        "source": "override", "provenance": "test", "updated": "2026-01-01"}}}), encoding="utf-8")
+    # the registry is joined once, when process.py ingests the station; only that file changes
+    run_script("data_preprocess/process.py", "--station-registry", str(registry), cwd=tmp_path)
+    result = run_script("process_weather_data.py", "--no-province", "--incremental", "--cache-dir", "cache",
+                        cwd=tmp_path)
+    assert "增量构建: 1 个文件需要重新解析" in result.stdout
+    incremental = (tmp_path / "weather_data.json").read_bytes()
+    assert incremental == aggregate(tmp_path)
+    records = [record for month in json.loads(incremental)["data"].values() for record in month
+               if record["station_id"] == station]
+    assert records and all((r["name"], r["lat"], r["lng"]) == ("RENAMED, CH", 31.0, 111.0) for r in records)
+
+
+def test_variables_change_forces_a_full_rebuild(csv_workdir):
+    aggregate(csv_workdir, "--incremental", "--cache-dir", "cache")
+    extra = ("--aggregate", "DEWP:mean,min")
+    incremental = aggregate(csv_workdir, "--incremental", "--cache-dir", "cache", *extra)
+    assert incremental == aggregate(csv_workdir, *extra)
+    assert all(len(entry["months"]) for entry in _manifest_files(csv_workdir).values())
@@ -0,0 +1,138 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import aggregate, run_script
+from process_weather_data import COMPACT_PRECISION, INCOMPLETE_BITS, ROLLUP_PRECISION, build_province_rollup
+
+EXTRA = ("--aggregate", "DEWP:mean,max", "--min-temperature-days", "28")
+
+
+def _expand_v2(stations, months):
+    """The v1 records a v2 station table + per-month parallel arrays stand for (what dataLoader.js rebuilds)."""
+    data = {}
+    for year_month, columns in months.items():
+        fields = [field for field in columns if field != "station"]
+        data[year_month] = [
+            {**{field: values[index] for field, values in stations.items()},
+             **{field: columns[field][i] for field in fields}}
+            for i, index in enumerate(columns["station"])
+        ]
+    return data
+
+
+def _rounded(records):
+    return [{field: round(value, COMPACT_PRECISION) if isinstance(value, float) and field not in ("lat", "lng")
+             else value for field, value in record.items()} for record in records]
+
+
+def test_v2_expands_to_the_v1_records(processed_workdir):
+    v1 = json.loads(aggregate(processed_workdir, *EXTRA))
+    v2 = json.loads(aggregate(processed_workdir, *EXTRA, "--data-format", "v2"))
+
+    assert v2["format_version"] == 2
+    assert len(v2["stations"]["station_id"]) == v2["metadata"]["station_table_size"] < v2["metadata"]["total_records"]
+    expanded = _expand_v2(v2["stations"], v2["data"])
+    assert list(expanded) == list(v1["data"])
+    for year_month, records in v1["data"].items():
+        assert expanded[year_month] == _rounded(records)
+
+
+def _read_sharded(workdir):
+    """Follows weather_data.json -> index -> shards like dataLoader.js; returns (index, {month: data})."""
+    stub = json.loads((workdir / "weather_data.json").read_text(encoding="utf-8"))
+    assert "data" not in stub
+    index = json.loads((workdir / stub["metadata"]["index"]).read_text(encoding="utf-8"))
+    data = {}
+    for shard in index["shards"]:
+        months = json.loads((workdir / shard["file"]).read_text(encoding="utf-8"))["data"]
+        assert list(months) == shard["months"]
+        data.update(months)
+    return index, data
+
+
+def test_shards_reproduce_the_unsharded_output(processed_workdir):
+    for data_format in ("v2", "v1"):
+        single = json.loads(aggregate(processed_workdir, *EXTRA, "--data-format", data_format))
+        for shard_by, key_length in (("year", 4), ("month", 7)):
+            aggregate(processed_workdir, *EXTRA, "--data-format", data_format, "--shard-by", shard_by)
+            index, data = _read_sharded(processed_workdir)
+
+            assert index["sharded_by"] == shard_by and index["metadata"] == single["metadata"]
+            assert index.get("stations") == single.get("stations")
+            assert index["months"] == list(single["data"]) == list(data)
+            assert data == single["data"]
+            assert all(month[:key_length] == shard["key"] for shard in index["shards"] for month in shard["months"])
+            # only the shards of this index are left in the shard directory
+            files = {shard["file"].split("/")[-1] for shard in index["shards"]}
+            assert {path.name for path in (processed_workdir / "weather_data").glob("*.json")} == files
+
+    aggregate(processed_workdir)
+    assert not (processed_workdir / "weather_data_index.json").exists()
+
+
+def test_binary_matrices_decode_to_the_json_values(processed_workdir):
+    v1 = json.loads(aggregate(processed_workdir, *EXTRA))
+    header = json.loads(aggregate(processed_workdir, *EXTRA, "--data-format", "binary"))
+
+    binary = header["binary"]
+    assert header["format_version"] == 3 and header["months"] == list(v1["data"])
+    assert (binary["dtype"], binary["byte_order"]) == ("float32", "little")
+    stations = header["stations"]
+    fields = list(stations)
+    position = {key: i for i, key in enumerate(zip(*(stations[field] for field in fields)))}
+    assert binary["shape"] == [len(header["months"]), len(position)]
+    matrices = {variable: np.fromfile(processed_workdir / filename, dtype="<f4").reshape(binary["shape"])
+                for variable, filename in binary["files"].items()}
+    assert set(matrices) == {"temperature", "precipitation", "temperature_days", "precipitation_days",
+                             "incomplete", "dewp_mean", "dewp_max"}
+
+    for variable, matrix in matrices.items():
+        expected = np.full(matrix.shape, np.nan, dtype=np.float32)
+        for row, records in enumerate(v1["data"].values()):
+            for record in records:
+                value = record[variable]
+                expected[row, position[tuple(record[field] for field in fields)]] = np.nan if value is None else value
+        np.testing.assert_array_equal(matrix, expected, err_msg=variable)
+
+
+def test_province_rollup_matches_a_groupby(processed_workdir):
+    data = json.loads(aggregate(processed_workdir, *EXTRA))["data"]
+    for records in data.values():
+        for record in records:
+            record["province"] = f"省份{int(record['station_id'][:5]) % 3}"
+    rollup = build_province_rollup(data)
+
+    frame = pd.DataFrame([dict(record, year_month=month) for month, records in data.items() for record in records])
+    frame[["temperature", "precipitation"]] = frame[["temperature", "precipitation"]].astype(float)
+    assert rollup["provinces"] == sorted(frame["province"].unique())
+    # values marked incomplete are left out of both rollups, as in the frontend
+    for data_type, bit in INCOMPLETE_BITS.items():
+        frame.loc[(frame["incomplete"] & bit) != 0, data_type] = np.nan
+    for data_type in INCOMPLETE_BITS:
+        frame_type = frame[frame[data_type].notna()]
+        expected = {}
+        for (year_month, province), group in frame_type.groupby(["year_month", "province"], sort=True):
+            stats = [len(group)]
+            for column in ("temperature", "precipitation"):
+                values = group[column].dropna()
+                stats += [values.agg(how) if len(values) else None for how in ("mean", "max", "min")]
+            expected.setdefault(year_month, []).append([rollup["provinces"].index(province)] + stats)
+
+        actual = rollup["data"][data_type]
+        assert list(actual) == list(expected)
+        # the rollup keeps ROLLUP_PRECISION decimals
+        tolerance = 0.5 * 10 ** -ROLLUP_PRECISION + 1e-9
+        for year_month, rows in expected.items():
+            assert len(actual[year_month]) == len(rows)
+            for actual_row, row in zip(actual[year_month], rows):
+                assert actual_row == pytest.approx(row, abs=tolerance), (data_type, year_month)
+
+
+def test_missing_province_file_falls_back_to_no_province(processed_workdir):
+    expected = aggregate(processed_workdir)
+    result = run_script("process_weather_data.py", cwd=processed_workdir)
+    assert "china_provinces.json 不存在" in result.stdout
+    assert (processed_workdir / "weather_data.json").read_bytes() == expected
@@ -0,0 +1,27 @@
+import numpy as np
+
+import columnar_store
+from conftest import aggregate
+
+
+def test_widen_float32_matches_shortest_repr():
+    rng = np.random.default_rng(0)
+    values = np.concatenate([
+        rng.uniform(-90, 90, 20000), rng.uniform(0, 2000, 20000), rng.normal(0, 1e-3, 2000),
+        [0.0, -0.0, 35.9138, 119.8, 1e-7, 9999.9, 99.99, np.nan],
+    ]).astype(np.float32)
+    expected = values.astype(str).astype(np.float64)
+    np.testing.assert_array_equal(columnar_store.widen_float32(values), expected)
+
+
+def test_parquet_input_matches_csv_input(processed_workdir):
+    from_csv = aggregate(processed_workdir)
+    from_parquet = aggregate(processed_workdir, "--parquet-dir", "processed_cn_gsod_parquet")
+    assert from_parquet == from_csv
+
+
+def test_parquet_input_matches_csv_input_with_extra_variables(processed_workdir):
+    args = ("--aggregate", "DEWP:mean", "WDSP:mean,max")
+    from_csv = aggregate(processed_workdir, *args)
+    from_parquet = aggregate(processed_workdir, "--parquet-dir", "processed_cn_gsod_parquet", *args)
+    assert from_parquet == from_csv
@@ -0,0 +1,20 @@
+import pytest
+
+import columnar_store
+from conftest import run_script
+
+
+def _tree(directory):
+    return {path.relative_to(directory).as_posix(): path.read_bytes()
+            for path in sorted(directory.rglob("*")) if path.is_file()}
+
+
+@pytest.mark.parametrize("args", [("--workers", "2"), ("--workers", "3", "--stream")])
+def test_parallel_run_matches_the_single_worker_output(processed_workdir, tmp_path, args):
+    (tmp_path / "cn_gsod").symlink_to(processed_workdir / "cn_gsod")
+    run_script("data_preprocess/process.py", "--output-format", "both", "--no-station-registry", *args, cwd=tmp_path)
+
+    # processed_workdir was produced by the same command with the default single worker
+    for output in ("processed_cn_gsod", columnar_store.PARQUET_OUTPUT_DIR):
+        expected = _tree(processed_workdir / output)
+        assert expected and _tree(tmp_path / output) == expected, output
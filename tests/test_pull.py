@@ -0,0 +1,32 @@
+import pull
+
+
+def test_download_requests_ask_for_identity_encoding(tmp_path):
+    local_path = str(tmp_path / "2020" / "58362099999.csv")
+    headers, offset = pull.build_request_headers(local_path, {})
+    assert headers["Accept-Encoding"] == "identity" and offset == 0
+
+    (tmp_path / "2020").mkdir()
+    with open(local_path + pull.PART_SUFFIX, "wb") as f:
+        f.write(b"x" * 10)
+    headers, offset = pull.build_request_headers(local_path, {"etag": '"abc"'})
+    assert headers["Accept-Encoding"] == "identity"
+    assert headers["Range"] == "bytes=10-" and offset == 10
+
+
+def _listing_entry(fetched_at):
+    return {"url": "", "fetched_at": fetched_at, "etag": None, "last_modified": None, "links": []}
+
+
+def test_past_year_listing_is_final_only_after_the_grace_period(monkeypatch):
+    year_end = 1704067200.0  # 2024-01-01T00:00:00Z, end of 2023
+    now = year_end + 400 * 86400
+    monkeypatch.setattr(pull.time, "time", lambda: now)
+    url = pull.BASE_URL + "2023/"
+
+    # fetched in January: files for late December may still be added, so the TTL applies
+    assert not pull.listing_is_fresh(url, _listing_entry(year_end + 10 * 86400))
+    assert pull.listing_is_fresh(url, _listing_entry(year_end + pull.LISTING_FINAL_GRACE))
+    # the root listing always uses the TTL
+    assert pull.listing_is_fresh(pull.BASE_URL, _listing_entry(now - 60))
+    assert not pull.listing_is_fresh(pull.BASE_URL, _listing_entry(now - pull.LISTING_TTL - 1))
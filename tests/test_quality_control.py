@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import columnar_store
+import quality_control
+from process_weather_data import reduce_station_frame
+
+DAYS = 365
+
+
+def _temperature_series(seed=0):
+    """A year of daily temperatures: seasonal cycle plus normal noise (sd 1.5 degC)."""
+    rng = np.random.default_rng(seed)
+    days = np.arange(DAYS)
+    return 12.0 - 15.0 * np.cos(2 * np.pi * days / DAYS) + rng.normal(0, 1.5, DAYS)
+
+
+def _station_frame(**columns):
+    frame = pd.DataFrame({
+        "STATION": "50000099999",
+        "DATE": pd.date_range("2020-01-01", periods=DAYS, freq="D")[:len(next(iter(columns.values())))],
+        "LATITUDE": 40.0, "LONGITUDE": 116.0, "NAME": "STATION A",
+    })
+    for name, values in columns.items():
+        frame[name] = values
+    return frame
+
+
+def _flagged_rows(flags, variable, check):
+    return np.flatnonzero(np.asarray(flags, dtype=np.int64) & quality_control.bit(variable, check)).tolist()
+
+
+def test_planted_spike_is_flagged_and_noise_is_not():
+    temp = _temperature_series()
+    temp[200] += 25.0
+    flags = quality_control.compute_flags(_station_frame(TEMP=temp))
+    assert _flagged_rows(flags, "TEMP", "spike") == [200]
+    assert np.count_nonzero(flags) == 1
+
+
+def test_flatline_run_is_flagged_and_a_nan_breaks_the_run():
+    temp = _temperature_series()
+    run = quality_control.FLATLINE_RUN
+    temp[50:50 + run] = 12.5
+    # the same length split by a missing value: two runs shorter than FLATLINE_RUN
+    temp[150:150 + run + 1] = 20.0
+    temp[150 + run // 2] = np.nan
+    temp[250:250 + run - 1] = 8.0
+
+    flags = quality_control.compute_flags(_station_frame(TEMP=temp))
+    assert _flagged_rows(flags, "TEMP", "flatline") == list(range(50, 50 + run))
+
+
+def test_out_of_range_values_are_flagged():
+    temp = _temperature_series()
+    prcp = np.zeros(DAYS)
+    temp[10], temp[20] = 61.0, -70.0
+    prcp[30], prcp[40] = -1.0, np.nan
+
+    flags = quality_control.compute_flags(_station_frame(TEMP=temp, PRCP=prcp))
+    assert _flagged_rows(flags, "TEMP", "range") == [10, 20]
+    assert _flagged_rows(flags, "PRCP", "range") == [30]
+    # out-of-range values are excluded from the spike statistics of their neighbours, not flagged twice
+    assert _flagged_rows(flags, "TEMP", "spike") == []
+    # the derived humidity fails with its input
+    assert quality_control.failed(flags, "HMD")[[10, 20]].all()
+
+
+def test_flags_survive_the_parquet_round_trip(tmp_path):
+    frame = _station_frame(TEMP=_temperature_series()[:40])
+    highest = quality_control.bit(quality_control.VARIABLES[-1], quality_control.CHECKS[-1])
+    flags = np.zeros(len(frame), dtype=quality_control.QC_DTYPE)
+    flags[[3, 17, 39]] = [quality_control.bit("TEMP", "spike"), highest, highest | 1]
+    frame[quality_control.QC_COLUMN] = flags
+
+    columnar_store.write_station(frame, str(tmp_path), "50000099999", partition_by="station")
+    restored = columnar_store.read_station(str(tmp_path), "50000099999")
+    assert restored[quality_control.QC_COLUMN].dtype == quality_control.QC_DTYPE
+    np.testing.assert_array_equal(restored[quality_control.QC_COLUMN].to_numpy(), flags)
+
+
+def test_flagged_values_are_left_out_of_the_monthly_sums():
+    frame = _station_frame(TEMP=[10.0, 12.0, 99.0, 14.0], PRCP=[1.0, -5.0, 2.0, 3.0])
+    frame[quality_control.QC_COLUMN] = [0, quality_control.bit("PRCP", "range"), quality_control.bit("TEMP", "range"), 0]
+    counters = {"rows": 0, "bad_rows": 0, "qc_flagged": 0}
+
+    partial = reduce_station_frame(frame, "test", counters)
+    row = partial.iloc[0]
+    assert (row["TEMP_sum"], row["TEMP_count"]) == (pytest.approx(36.0), 3)
+    assert (row["PRCP_sum"], row["PRCP_count"]) == (pytest.approx(6.0), 3)
+    assert counters["qc_flagged"] == 2
@@ -0,0 +1,69 @@
+import json
+
+import pandas as pd
+import pytest
+
+import process
+import station_registry
+
+REGISTERED = "50845099999"
+UNKNOWN = "58362099999"
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = station_registry.StationRegistry(path=str(tmp_path / "registry.json"))
+    registry.set(REGISTERED, 43.95, 116.07, "NAME LOCATION UNKN, CH", source="override", provenance="test")
+    return registry
+
+
+def _station_rows(station_id, year, latitude=0.0, longitude=0.0):
+    return pd.DataFrame({
+        "STATION": station_id,
+        "DATE": [f"{year}-01-0{day}" for day in (2, 1)],
+        "LATITUDE": latitude, "LONGITUDE": longitude, "ELEVATION": 1300.0,
+        "NAME": pd.Categorical(["RAW NAME, CH"] * 2),
+        "TEMP": [-5.0, -6.5],
+    })
+
+
+def test_consolidation_joins_the_registered_station(registry):
+    frames = [_station_rows(REGISTERED, 2021), _station_rows(REGISTERED, 2020)]
+    combined = process.consolidate_station(frames, registry, REGISTERED)
+    assert combined["DATE"].tolist() == ["2020-01-01", "2020-01-02", "2021-01-01", "2021-01-02"]
+    assert (combined["LATITUDE"] == 43.95).all() and (combined["LONGITUDE"] == 116.07).all()
+    assert combined["NAME"].astype(str).eq("NAME LOCATION UNKN, CH").all()
+    # fields the entry leaves empty keep the raw values
+    assert (combined["ELEVATION"] == 1300.0).all()
+
+
+def test_unknown_station_is_left_untouched(registry):
+    frames = [_station_rows(UNKNOWN, 2020, 31.4, 121.45)]
+    expected = process.consolidate_station(frames, None, UNKNOWN)
+    pd.testing.assert_frame_equal(process.consolidate_station(frames, registry, UNKNOWN), expected)
+
+    frame = frames[0].copy()
+    assert not registry.apply(frame, UNKNOWN)
+    pd.testing.assert_frame_equal(frame, frames[0])
+    assert registry.get(UNKNOWN) is None and UNKNOWN not in registry
+
+
+def test_observed_entries_never_replace_overrides(registry):
+    assert not registry.set(REGISTERED, 1.0, 2.0, source="observed")
+    assert registry.get(REGISTERED)["latitude"] == 43.95
+    assert registry.set(UNKNOWN, 31.4, 121.45, "SHANGHAI, CH", source="observed")
+    assert registry.set(UNKNOWN, 31.2, 121.3, source="override")
+    assert registry.get(UNKNOWN)["source"] == "override"
+    with pytest.raises(ValueError):
+        registry.set(UNKNOWN, 0, 0, source="guess")
+
+
+def test_save_and_load_round_trip(registry, tmp_path):
+    registry.save()
+    loaded = station_registry.load(registry.path)
+    assert loaded.stations == registry.stations
+    assert json.loads((tmp_path / "registry.json").read_text(encoding="utf-8"))["format_version"] == 1
+    assert len(station_registry.load(None)) == 0
+    assert len(station_registry.load(str(tmp_path / "missing.json"))) == 0
+    assert loaded.corrections() == [{"filename": f"{REGISTERED}.csv", "name": "NAME LOCATION UNKN, CH",
+                                     "latitude": 43.95, "longitude": 116.07}]
@@ -0,0 +1,84 @@
+import json
+import shutil
+
+import pytest
+
+import updateloss
+
+CSV_TEXT = (
+    "STATION,DATE,LATITUDE,LONGITUDE,NAME,TEMP\n"
+    '50000099999,2020-01-01,0.0,0.0,"STATION A, CH",3.5\n'
+    '50000099999,2020-01-02,0.0,0.0,"STATION A, CH",4.25\n'
+    '50000099999,2020-01-03,0.0,0.0,"STATION A, CH",\n'
+)
+RECORDS = [
+    {"STATION": "50000099999", "DATE": f"2020-01-0{day}", "LATITUDE": 0.0, "LONGITUDE": 0.0, "TEMP": 3.5}
+    for day in (1, 2, 3)
+]
+CORRECTIONS = "文件名,站点名,修正纬度,修正经度\n50000099999.csv,STATION A,31.25,121.5\n"
+
+
+@pytest.fixture
+def station_dir(tmp_path):
+    (tmp_path / "50000099999.csv").write_text(CSV_TEXT, encoding="utf-8")
+    (tmp_path / "50000099999.json").write_text(json.dumps(RECORDS, indent=4), encoding="utf-8")
+    # a station without a correction must stay untouched
+    shutil.copy(tmp_path / "50000099999.csv", tmp_path / "50001099999.csv")
+    return tmp_path
+
+
+def _weather_data_v1():
+    record = {"station_id": "50000099999", "lat": 0.0, "lng": 0.0, "avg_temp": 3.9}
+    other = {"station_id": "50001099999", "lat": 0.0, "lng": 0.0, "avg_temp": 1.0}
+    return {"metadata": {"months": ["2020-01", "2020-02"]},
+            "data": {"2020-01": [dict(record), dict(other)], "2020-02": [dict(record), dict(other)]}}
+
+
+def test_corrections_patch_only_row_zero_and_matching_records(station_dir):
+    weather_data = station_dir / "weather_data.json"
+    weather_data.write_text(json.dumps(_weather_data_v1(), indent=2), encoding="utf-8")
+    corrections = updateloss.load_corrections(CORRECTIONS)
+
+    results = updateloss.apply_corrections(corrections, str(station_dir), weather_data=str(weather_data), workers=2)
+
+    assert [(r["csv"], r["json"], r["old"]) for r in results] == [("updated", "updated", ("0.0", "0.0"))]
+    lines = (station_dir / "50000099999.csv").read_text(encoding="utf-8").splitlines(keepends=True)
+    expected = CSV_TEXT.splitlines(keepends=True)
+    assert lines[0] == expected[0] and lines[2:] == expected[2:]
+    assert lines[1] == '50000099999,2020-01-01,31.25,121.5,"STATION A, CH",3.5\n'
+    assert (station_dir / "50001099999.csv").read_text(encoding="utf-8") == CSV_TEXT
+
+    records = json.loads((station_dir / "50000099999.json").read_text(encoding="utf-8"))
+    assert (records[0]["LATITUDE"], records[0]["LONGITUDE"]) == (31.25, 121.5)
+    assert records[1:] == RECORDS[1:]
+
+    data = json.loads(weather_data.read_text(encoding="utf-8"))
+    for month_records in data["data"].values():
+        assert (month_records[0]["lat"], month_records[0]["lng"]) == (31.25, 121.5)
+        assert (month_records[1]["lat"], month_records[1]["lng"]) == (0.0, 0.0)
+    assert not list(station_dir.glob("*.tmp"))
+
+
+def test_patch_weather_data_updates_the_v2_station_table(tmp_path):
+    path = tmp_path / "weather_data.json"
+    path.write_text(json.dumps({"format_version": 2, "stations": {
+        "station_id": ["50000099999", "50001099999"], "lat": [0.0, 0.0], "lng": [0.0, 0.0],
+        "province": ["未知", "未知"]}, "data": {}}), encoding="utf-8")
+    corrections = updateloss.load_corrections(CORRECTIONS)
+
+    assert updateloss.patch_weather_data(str(path), corrections)[0] == 1
+    stations = json.loads(path.read_text(encoding="utf-8"))["stations"]
+    assert stations["lat"] == [31.25, 0.0] and stations["lng"] == [121.5, 0.0]
+    assert stations["province"] == ["未知", "未知"]  # kept without a ProvinceIndex
+
+
+def test_interrupted_rewrite_leaves_the_original_file(station_dir, monkeypatch):
+    def fail(src, dst):
+        dst.write("partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(updateloss.shutil, "copyfileobj", fail)
+    with pytest.raises(OSError):
+        updateloss.patch_csv_first_row(str(station_dir / "50000099999.csv"), 31.25, 121.5)
+    assert (station_dir / "50000099999.csv").read_text(encoding="utf-8") == CSV_TEXT
+    assert not list(station_dir.glob("*.tmp"))
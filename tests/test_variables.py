@@ -0,0 +1,67 @@
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import REPO_ROOT
+from process_weather_data import (build_weather_data, merge_partials, parse_variable_specs, reduce_station_frame,
+                                  variable_fields)
+
+VARIABLES = {"DEWP": ("mean", "min", "max", "sum", "count"), "WDSP": ("mean", "count")}
+
+
+def _station_frame(dates, dewp):
+    return pd.DataFrame({"STATION": "50000099999", "DATE": dates, "LATITUDE": 40.0, "LONGITUDE": 116.0,
+                         "NAME": "STATION A", "TEMP": 10.0, "PRCP": 0.0, "DEWP": dewp})
+
+
+def _records(partial):
+    return {month: records[0] for month, records in build_weather_data(partial, variables=VARIABLES).items()}
+
+
+def test_parse_variable_specs():
+    assert parse_variable_specs(["max:max", "DEWP:mean,min", "HMD", " dewp : min , max "]) == {
+        "MAX": ("max",), "DEWP": ("mean", "min", "max"), "HMD": ("mean",)}
+    assert parse_variable_specs([]) == {}
+    assert [field for field, _, _ in variable_fields(VARIABLES)] == [
+        "dewp_mean", "dewp_min", "dewp_max", "dewp_sum", "dewp_count", "wdsp_mean", "wdsp_count"]
+    with pytest.raises(ValueError):
+        parse_variable_specs(["STP:mean"])
+    with pytest.raises(ValueError):
+        parse_variable_specs(["DEWP:median"])
+
+
+def test_reducers_against_hand_computed_values():
+    frame = _station_frame(["2020-01-01", "2020-01-02", "2020-01-03", "2020-01-04", "2020-02-01", "2020-02-02"],
+                           [1.0, 2.5, np.nan, -0.5, np.nan, np.nan])
+    records = _records(reduce_station_frame(frame, "test", variables=VARIABLES))
+
+    january = records["2020-01"]
+    assert january["dewp_mean"] == pytest.approx(1.0)
+    assert (january["dewp_min"], january["dewp_max"]) == (-0.5, 2.5)
+    assert january["dewp_sum"] == pytest.approx(3.0)
+    assert january["dewp_count"] == 3
+    # a month without any value: None, and 0 for count
+    february = records["2020-02"]
+    assert [february[f"dewp_{reducer}"] for reducer in ("mean", "min", "max", "sum")] == [None] * 4
+    assert february["dewp_count"] == 0
+    # a variable the file does not have counts as missing
+    assert (january["wdsp_mean"], january["wdsp_count"]) == (None, 0)
+
+
+def test_reducers_merge_partials_of_several_files():
+    first = reduce_station_frame(_station_frame(["2020-01-01", "2020-01-02"], [4.0, -2.0]), "a", variables=VARIABLES)
+    second = reduce_station_frame(_station_frame(["2020-01-03", "2020-01-04"], [7.0, np.nan]), "b", variables=VARIABLES)
+    january = _records(merge_partials([first, second], VARIABLES))["2020-01"]
+    assert (january["dewp_min"], january["dewp_max"], january["dewp_count"]) == (-2.0, 7.0, 3)
+    assert january["dewp_mean"] == pytest.approx(3.0)
+
+
+def test_invalid_spec_is_rejected_on_the_command_line(tmp_path):
+    result = subprocess.run([sys.executable, f"{REPO_ROOT}/process_weather_data.py", "--no-province",
+                             "--aggregate", "DEWP:median"], cwd=tmp_path, capture_output=True, text=True)
+    assert result.returncode == 2
+    assert "未知的归约方式: median" in result.stderr
+    assert not (tmp_path / "weather_data.json").exists()